@@ -0,0 +1,186 @@
+// Canvas renderer for the floor plan editor.
+// The canvas only covers the scrolled viewport and only the cells inside it are
+// drawn. Edits repaint just the cells they touch, once per animation frame, and
+// pointer positions are mapped to cells arithmetically rather than through one
+// DOM node per cell, so plans of 1000 x 1000 cells stay interactive.
+
+import { colorForCell } from '$lib';
+import { OPEN, type GridStore, type Selection } from '$lib/gridstore';
+
+// Units per cell in the overlay's viewBox, as used by SimulationLayer
+export const OVERLAY_CELL_UNITS = 10;
+
+// Labels smaller than this many pixels are unreadable and skipped
+const MIN_LABEL_PIXELS = 6;
+
+export interface GridSource {
+	store: GridStore;
+	selection: Selection;
+	showNumbers: boolean;
+}
+
+// Cell keys as used in the exported JSON: "X, Y" with X the column
+export function cellKey(col: number, row: number): string {
+	return `${col}, ${row}`;
+}
+
+export class GridCanvas {
+	// Scrolling viewport; attach pointer listeners here and use cellAt
+	readonly element: HTMLDivElement;
+	// Full-size SVG laid over the canvas for the simulation layer
+	readonly overlay: SVGSVGElement;
+
+	private content: HTMLDivElement;
+	private canvas: HTMLCanvasElement;
+	private context: CanvasRenderingContext2D;
+	private source: () => GridSource;
+	private viewportPixels: number;
+	private sideLength = 0;
+	private cellPixels = 1;
+	private dirty = new Set<number>();
+	private redrawAll = false;
+	private scheduled = false;
+
+	constructor(source: () => GridSource, viewportPixels = 800) {
+		this.source = source;
+		this.viewportPixels = viewportPixels;
+
+		this.element = document.createElement('div');
+		this.element.style.overflow = 'auto';
+		this.content = document.createElement('div');
+		this.content.style.position = 'relative';
+		this.canvas = document.createElement('canvas');
+		this.canvas.style.position = 'absolute';
+		this.canvas.style.left = '0';
+		this.canvas.style.top = '0';
+		this.overlay = document.createElementNS('http://www.w3.org/2000/svg', 'svg');
+		this.overlay.setAttribute('style', 'position: absolute; left: 0; top: 0; pointer-events: none;');
+		this.content.append(this.canvas, this.overlay);
+		this.element.appendChild(this.content);
+		this.context = this.canvas.getContext('2d')!;
+
+		this.element.addEventListener('scroll', () => this.invalidateAll(), { passive: true });
+	}
+
+	// Lay out for a plan of sideLength x sideLength cells drawn cellPixels wide.
+	resize(sideLength: number, cellPixels: number) {
+		this.sideLength = sideLength;
+		this.cellPixels = cellPixels;
+		const full = sideLength * cellPixels;
+		this.content.style.width = `${full}px`;
+		this.content.style.height = `${full}px`;
+		this.element.style.width = `${Math.min(full, this.viewportPixels)}px`;
+		this.element.style.height = `${Math.min(full, this.viewportPixels)}px`;
+
+		this.overlay.setAttribute('width', full.toString());
+		this.overlay.setAttribute('height', full.toString());
+		const units = sideLength * OVERLAY_CELL_UNITS;
+		this.overlay.setAttribute('viewBox', `0 0 ${units} ${units}`);
+
+		const ratio = window.devicePixelRatio || 1;
+		const width = this.element.clientWidth || Math.min(full, this.viewportPixels);
+		const height = this.element.clientHeight || Math.min(full, this.viewportPixels);
+		this.canvas.style.width = `${width}px`;
+		this.canvas.style.height = `${height}px`;
+		this.canvas.width = Math.ceil(width * ratio);
+		this.canvas.height = Math.ceil(height * ratio);
+		this.invalidateAll();
+	}
+
+	// Repaint cells, numbered row * sideLength + col, on the next animation frame.
+	invalidate(cells: ArrayLike<number>) {
+		for (let i = 0; i < cells.length; i++) {
+			this.dirty.add(cells[i]);
+		}
+		this.schedule();
+	}
+
+	// Repaint the whole viewport on the next animation frame.
+	invalidateAll() {
+		this.redrawAll = true;
+		this.schedule();
+	}
+
+	// The [col, row] under a pointer event, or null outside the grid.
+	cellAt(event: MouseEvent): [number, number] | null {
+		const rect = this.content.getBoundingClientRect();
+		const col = Math.floor((event.clientX - rect.left) / this.cellPixels);
+		const row = Math.floor((event.clientY - rect.top) / this.cellPixels);
+		if (col < 0 || col >= this.sideLength || row < 0 || row >= this.sideLength) {
+			return null;
+		}
+		return [col, row];
+	}
+
+	private schedule() {
+		if (!this.scheduled) {
+			this.scheduled = true;
+			requestAnimationFrame(() => this.flush());
+		}
+	}
+
+	private flush() {
+		this.scheduled = false;
+		const { scrollLeft, scrollTop } = this.element;
+		const size = this.cellPixels;
+		const width = this.canvas.width / (window.devicePixelRatio || 1);
+		const height = this.canvas.height / (window.devicePixelRatio || 1);
+
+		// The canvas follows the viewport; draw in grid pixel coordinates
+		this.canvas.style.transform = `translate(${scrollLeft}px, ${scrollTop}px)`;
+		const ratio = window.devicePixelRatio || 1;
+		this.context.setTransform(ratio, 0, 0, ratio, -scrollLeft * ratio, -scrollTop * ratio);
+
+		const col0 = Math.max(Math.floor(scrollLeft / size), 0);
+		const row0 = Math.max(Math.floor(scrollTop / size), 0);
+		const col1 = Math.min(Math.ceil((scrollLeft + width) / size), this.sideLength);
+		const row1 = Math.min(Math.ceil((scrollTop + height) / size), this.sideLength);
+
+		const source = this.source();
+		if (this.redrawAll) {
+			this.context.clearRect(scrollLeft, scrollTop, width, height);
+			for (let row = row0; row < row1; row++) {
+				for (let col = col0; col < col1; col++) {
+					this.paintCell(source, col, row);
+				}
+			}
+		} else {
+			for (const index of this.dirty) {
+				const row = Math.floor(index / this.sideLength);
+				const col = index % this.sideLength;
+				if (col >= col0 && col < col1 && row >= row0 && row < row1) {
+					this.paintCell(source, col, row);
+				}
+			}
+		}
+		this.dirty.clear();
+		this.redrawAll = false;
+	}
+
+	private paintCell(source: GridSource, col: number, row: number) {
+		const size = this.cellPixels;
+		const x = col * size;
+		const y = row * size;
+		const index = row * this.sideLength + col;
+		const type = source.store.types[index];
+
+		const context = this.context;
+		context.fillStyle = source.selection.has(index)
+			? 'yellow'
+			: type !== OPEN
+				? colorForCell(type)
+				: 'white';
+		context.fillRect(x, y, size, size);
+		context.lineWidth = 1;
+		context.strokeStyle = 'black';
+		context.strokeRect(x + 0.5, y + 0.5, size - 1, size - 1);
+
+		const fontPixels = size * 0.3;
+		if (source.showNumbers && fontPixels >= MIN_LABEL_PIXELS) {
+			context.fillStyle = type !== OPEN ? 'white' : 'black';
+			context.font = `${fontPixels}px sans-serif`;
+			context.textBaseline = 'alphabetic';
+			context.fillText(cellKey(col, row), x + size * 0.1, y + size * 0.6, size * 0.9);
+		}
+	}
+}
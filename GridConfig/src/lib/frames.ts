@@ -0,0 +1,230 @@
+// Decoder and renderer for the binary frames streamed by Model/server.py.
+// The layout is documented in Model/frames.py; every section is 4-byte aligned,
+// so the arrays below are views into the message rather than copies.
+
+const FRAME_MAGIC = 'ABMF';
+const FLAG_KEYFRAME = 1;
+
+export interface SimFrame {
+	keyframe: boolean;
+	step: number;
+	width: number;
+	height: number;
+	// Model coordinates: x is the grid row, y is the grid column
+	agentIds: Uint32Array;
+	agentX: Uint16Array;
+	agentY: Uint16Array;
+	removed: Uint32Array;
+	noiseCells: Uint32Array;
+	noiseValues: Float32Array;
+	passageCells: Uint32Array;
+	passageValues: Uint32Array;
+}
+
+export function decodeFrame(buffer: ArrayBuffer): SimFrame {
+	const view = new DataView(buffer);
+	const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+	if (magic !== FRAME_MAGIC) {
+		throw new Error(`Not a simulation frame: ${magic}`);
+	}
+
+	let offset = 16;
+	const count = () => {
+		const n = view.getUint32(offset, true);
+		offset += 4;
+		return n;
+	};
+	const take = <T>(ctor: { new (b: ArrayBuffer, o: number, n: number): T; BYTES_PER_ELEMENT: number }, n: number) => {
+		const array = new ctor(buffer, offset, n);
+		offset += n * ctor.BYTES_PER_ELEMENT;
+		return array;
+	};
+
+	const agents = count();
+	const agentIds = take(Uint32Array, agents);
+	const agentX = take(Uint16Array, agents);
+	const agentY = take(Uint16Array, agents);
+	const removed = take(Uint32Array, count());
+	const noise = count();
+	const noiseCells = take(Uint32Array, noise);
+	const noiseValues = take(Float32Array, noise);
+	const passages = count();
+	const passageCells = take(Uint32Array, passages);
+	const passageValues = take(Uint32Array, passages);
+
+	return {
+		keyframe: (view.getUint8(5) & FLAG_KEYFRAME) !== 0,
+		step: view.getUint32(12, true),
+		width: view.getUint16(8, true),
+		height: view.getUint16(10, true),
+		agentIds,
+		agentX,
+		agentY,
+		removed,
+		noiseCells,
+		noiseValues,
+		passageCells,
+		passageValues
+	};
+}
+
+export type SimOverlay = 'none' | 'noise' | 'passages';
+
+const SVG_NS = 'http://www.w3.org/2000/svg';
+
+// Keeps the streamed state and mirrors it into an SVG <g> laid over the grid.
+// Frames are applied as they arrive, but the DOM is only touched once per
+// animation frame and only for the agents and cells that changed.
+export class SimulationLayer {
+	readonly element: SVGGElement;
+	step = 0;
+	overlay: SimOverlay = 'noise';
+
+	private cellSize: number;
+	private height = 0;
+	private agents = new Map<number, [number, number]>();
+	private noise = new Map<number, number>();
+	private passages = new Map<number, number>();
+	private maxPassages = 1;
+
+	private agentNodes = new Map<number, SVGCircleElement>();
+	private cellNodes = new Map<number, SVGRectElement>();
+	private cellLayer: SVGGElement;
+	private agentLayer: SVGGElement;
+	private dirtyAgents = new Set<number>();
+	private dirtyCells = new Set<number>();
+	private redrawAllCells = false;
+	private scheduled = false;
+
+	constructor(cellSize: number) {
+		this.cellSize = cellSize;
+		this.element = document.createElementNS(SVG_NS, 'g');
+		this.element.setAttribute('style', 'pointer-events: none;');
+		this.cellLayer = document.createElementNS(SVG_NS, 'g');
+		this.agentLayer = document.createElementNS(SVG_NS, 'g');
+		this.element.append(this.cellLayer, this.agentLayer);
+	}
+
+	apply(frame: SimFrame) {
+		this.step = frame.step;
+		this.height = frame.height;
+
+		if (frame.keyframe) {
+			for (const id of this.agents.keys()) this.dirtyAgents.add(id);
+			for (const cell of this.noise.keys()) this.dirtyCells.add(cell);
+			for (const cell of this.passages.keys()) this.dirtyCells.add(cell);
+			this.agents.clear();
+			this.noise.clear();
+			this.passages.clear();
+			this.maxPassages = 1;
+		}
+
+		for (let i = 0; i < frame.agentIds.length; i++) {
+			this.agents.set(frame.agentIds[i], [frame.agentX[i], frame.agentY[i]]);
+			this.dirtyAgents.add(frame.agentIds[i]);
+		}
+		for (const id of frame.removed) {
+			this.agents.delete(id);
+			this.dirtyAgents.add(id);
+		}
+		for (let i = 0; i < frame.noiseCells.length; i++) {
+			this.noise.set(frame.noiseCells[i], frame.noiseValues[i]);
+			this.dirtyCells.add(frame.noiseCells[i]);
+		}
+		for (let i = 0; i < frame.passageCells.length; i++) {
+			this.passages.set(frame.passageCells[i], frame.passageValues[i]);
+			this.dirtyCells.add(frame.passageCells[i]);
+			if (frame.passageValues[i] > this.maxPassages) {
+				// The colour scale changed, so every heat cell needs repainting
+				this.maxPassages = frame.passageValues[i];
+				this.redrawAllCells = true;
+			}
+		}
+
+		if (!this.scheduled) {
+			this.scheduled = true;
+			requestAnimationFrame(() => this.flush());
+		}
+	}
+
+	setOverlay(overlay: SimOverlay) {
+		this.overlay = overlay;
+		this.redrawAllCells = true;
+		this.flush();
+	}
+
+	clear() {
+		this.agents.clear();
+		this.noise.clear();
+		this.passages.clear();
+		this.agentNodes.clear();
+		this.cellNodes.clear();
+		this.dirtyAgents.clear();
+		this.dirtyCells.clear();
+		this.cellLayer.replaceChildren();
+		this.agentLayer.replaceChildren();
+	}
+
+	private flush() {
+		this.scheduled = false;
+		const half = this.cellSize / 2;
+
+		for (const id of this.dirtyAgents) {
+			const pos = this.agents.get(id);
+			let node = this.agentNodes.get(id);
+			if (!pos) {
+				node?.remove();
+				this.agentNodes.delete(id);
+				continue;
+			}
+			if (!node) {
+				node = document.createElementNS(SVG_NS, 'circle');
+				node.setAttribute('r', (this.cellSize * 0.3).toString());
+				node.setAttribute('fill', 'black');
+				this.agentLayer.appendChild(node);
+				this.agentNodes.set(id, node);
+			}
+			node.setAttribute('cx', (pos[1] * this.cellSize + half).toString());
+			node.setAttribute('cy', (pos[0] * this.cellSize + half).toString());
+		}
+		this.dirtyAgents.clear();
+
+		const cells = this.redrawAllCells
+			? new Set([...this.cellNodes.keys(), ...this.noise.keys(), ...this.passages.keys()])
+			: this.dirtyCells;
+		for (const cell of cells) {
+			this.paintCell(cell);
+		}
+		this.dirtyCells.clear();
+		this.redrawAllCells = false;
+	}
+
+	private paintCell(cell: number) {
+		let opacity = 0;
+		let color = 'orange';
+		if (this.overlay === 'noise') {
+			opacity = Math.min(this.noise.get(cell) ?? 0, 1) * 0.6;
+		} else if (this.overlay === 'passages') {
+			opacity = ((this.passages.get(cell) ?? 0) / this.maxPassages) * 0.7;
+			color = 'crimson';
+		}
+
+		let node = this.cellNodes.get(cell);
+		if (opacity <= 0) {
+			node?.remove();
+			this.cellNodes.delete(cell);
+			return;
+		}
+		if (!node) {
+			node = document.createElementNS(SVG_NS, 'rect');
+			node.setAttribute('width', this.cellSize.toString());
+			node.setAttribute('height', this.cellSize.toString());
+			node.setAttribute('x', ((cell % this.height) * this.cellSize).toString());
+			node.setAttribute('y', (Math.floor(cell / this.height) * this.cellSize).toString());
+			this.cellLayer.appendChild(node);
+			this.cellNodes.set(cell, node);
+		}
+		node.setAttribute('fill', color);
+		node.setAttribute('fill-opacity', opacity.toFixed(3));
+	}
+}
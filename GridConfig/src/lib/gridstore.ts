@@ -0,0 +1,377 @@
+// Editor state of a floor plan, held in typed arrays.
+// Cells are numbered row * sideLength + col, the row being the Y and the column
+// the X of the exported "X, Y" keys. Types are CellType codes with 0 for open
+// cells, as in Model/cells.py, and a capacity of 0 means the default of the
+// type. Every edit is recorded as the previous values of just the cells it
+// changed, so undo and redo cost the size of the edit rather than of the plan.
+//
+// toBinary writes the compact plan format read by Model/cells.py:
+//   header (16 bytes): magic "ABMP", schema version u8, 3 reserved bytes,
+//                      side length u32, entrance count u32
+//   types:    side * side u8, padded to 4 bytes
+//   capacity: side * side u8, padded to 4 bytes
+//   entrances: count x (entrance cell u32, exit cell u32), 0xFFFFFFFF for no exit
+// All integers are little-endian.
+
+import { CellType, SCHEMA_VERSION, hasSeats, type Cell, type FloorPlan } from '$lib';
+
+export const OPEN = 0;
+const PLAN_MAGIC = 'ABMP';
+const NO_EXIT = 0xffffffff;
+const UNDO_LIMIT = 100;
+
+type Exit = [number, number];
+
+// Previous state of the cells an edit touched
+interface Diff {
+	cells: Uint32Array;
+	types: Uint8Array;
+	capacity: Uint8Array;
+	exits: (Exit | undefined)[];
+}
+
+function padded(n: number): number {
+	return Math.ceil(n / 4) * 4;
+}
+
+export class GridStore {
+	sideLength: number;
+	types: Uint8Array;
+	capacity: Uint8Array;
+	// Entrance cell -> [x, y] of its exit
+	exits = new Map<number, Exit>();
+
+	private undoStack: Diff[] = [];
+	private redoStack: Diff[] = [];
+
+	constructor(sideLength: number) {
+		this.sideLength = sideLength;
+		this.types = new Uint8Array(sideLength * sideLength);
+		this.capacity = new Uint8Array(sideLength * sideLength);
+	}
+
+	get size(): number {
+		return this.sideLength * this.sideLength;
+	}
+
+	get canUndo(): boolean {
+		return this.undoStack.length > 0;
+	}
+
+	get canRedo(): boolean {
+		return this.redoStack.length > 0;
+	}
+
+	index(col: number, row: number): number {
+		return row * this.sideLength + col;
+	}
+
+	// [x, y] of a cell, as in the exported keys
+	coordinates(cell: number): Exit {
+		return [cell % this.sideLength, Math.floor(cell / this.sideLength)];
+	}
+
+	// Entrance cells in ascending order
+	entrances(): number[] {
+		return [...this.exits.keys()].sort((a, b) => a - b);
+	}
+
+	// Change the side length, keeping the cells that still fit. Clears the history.
+	resize(sideLength: number) {
+		if (sideLength === this.sideLength) return;
+		const types = new Uint8Array(sideLength * sideLength);
+		const capacity = new Uint8Array(sideLength * sideLength);
+		const exits = new Map<number, Exit>();
+		const keep = Math.min(sideLength, this.sideLength);
+		for (let row = 0; row < keep; row++) {
+			const from = row * this.sideLength;
+			types.set(this.types.subarray(from, from + keep), row * sideLength);
+			capacity.set(this.capacity.subarray(from, from + keep), row * sideLength);
+		}
+		for (const [cell, exit] of this.exits) {
+			const [x, y] = this.coordinates(cell);
+			if (x < sideLength && y < sideLength) exits.set(y * sideLength + x, exit);
+		}
+		this.sideLength = sideLength;
+		this.types = types;
+		this.capacity = capacity;
+		this.exits = exits;
+		this.undoStack = [];
+		this.redoStack = [];
+	}
+
+	// Cells of the rectangle spanned by two corners, both included.
+	rect(col0: number, row0: number, col1: number, row1: number): Uint32Array {
+		const last = this.sideLength - 1;
+		const c0 = Math.max(Math.min(col0, col1), 0);
+		const c1 = Math.min(Math.max(col0, col1), last);
+		const r0 = Math.max(Math.min(row0, row1), 0);
+		const r1 = Math.min(Math.max(row0, row1), last);
+		if (c0 > c1 || r0 > r1) return new Uint32Array(0);
+		const cells = new Uint32Array((c1 - c0 + 1) * (r1 - r0 + 1));
+		let n = 0;
+		for (let row = r0; row <= r1; row++) {
+			for (let col = c0; col <= c1; col++) {
+				cells[n++] = row * this.sideLength + col;
+			}
+		}
+		return cells;
+	}
+
+	// The 4-connected region of cells sharing the type of the given one.
+	region(cell: number): Uint32Array {
+		const side = this.sideLength;
+		const type = this.types[cell];
+		const seen = new Uint8Array(this.size);
+		const cells = new Uint32Array(this.size);
+		let head = 0;
+		let tail = 0;
+		cells[tail++] = cell;
+		seen[cell] = 1;
+		while (head < tail) {
+			const c = cells[head++];
+			const col = c % side;
+			const neighbours = [
+				col > 0 ? c - 1 : -1,
+				col < side - 1 ? c + 1 : -1,
+				c >= side ? c - side : -1,
+				c + side < this.size ? c + side : -1
+			];
+			for (const n of neighbours) {
+				if (n >= 0 && !seen[n] && this.types[n] === type) {
+					seen[n] = 1;
+					cells[tail++] = n;
+				}
+			}
+		}
+		return cells.slice(0, tail);
+	}
+
+	// Set the type of many cells in one undoable edit.
+	paint(cells: ArrayLike<number>, type: number) {
+		const changed = this.filter(cells, (c) => this.types[c] !== type);
+		if (!changed.length) return;
+		this.record(changed);
+		for (const c of changed) {
+			this.types[c] = type;
+			this.capacity[c] = 0;
+			if (type === CellType.Entrance) {
+				this.exits.set(c, [-1, -1]);
+			} else {
+				this.exits.delete(c);
+			}
+		}
+	}
+
+	// Fill the region around a cell with a type.
+	floodFill(cell: number, type: number) {
+		this.paint(this.region(cell), type);
+	}
+
+	// Step a cell through the types: open, Entrance, ..., Chair, open.
+	cycle(cell: number) {
+		this.paint([cell], this.types[cell] === CellType.Chair ? OPEN : this.types[cell] + 1);
+	}
+
+	// Seats at the study tables and chairs among the cells; 0 restores the default.
+	setCapacity(cells: ArrayLike<number>, seats: number) {
+		const changed = this.filter(cells, (c) => hasSeats(this.types[c]) && this.capacity[c] !== seats);
+		if (!changed.length) return;
+		this.record(changed);
+		for (const c of changed) this.capacity[c] = seats;
+	}
+
+	setExit(entrance: number, exit: Exit) {
+		if (!this.exits.has(entrance)) return;
+		this.record(Uint32Array.of(entrance));
+		this.exits.set(entrance, exit);
+	}
+
+	// Revert the last edit; returns the cells it touched.
+	undo(): Uint32Array {
+		const diff = this.undoStack.pop();
+		if (!diff) return new Uint32Array(0);
+		this.redoStack.push(this.swap(diff));
+		return diff.cells;
+	}
+
+	// Reapply the last undone edit; returns the cells it touched.
+	redo(): Uint32Array {
+		const diff = this.redoStack.pop();
+		if (!diff) return new Uint32Array(0);
+		this.undoStack.push(this.swap(diff));
+		return diff.cells;
+	}
+
+	private filter(cells: ArrayLike<number>, keep: (cell: number) => boolean): Uint32Array {
+		const out = new Uint32Array(cells.length);
+		let n = 0;
+		for (let i = 0; i < cells.length; i++) {
+			if (keep(cells[i])) out[n++] = cells[i];
+		}
+		return out.slice(0, n);
+	}
+
+	private snapshot(cells: Uint32Array): Diff {
+		const types = new Uint8Array(cells.length);
+		const capacity = new Uint8Array(cells.length);
+		const exits: (Exit | undefined)[] = new Array(cells.length);
+		for (let i = 0; i < cells.length; i++) {
+			types[i] = this.types[cells[i]];
+			capacity[i] = this.capacity[cells[i]];
+			const exit = this.exits.get(cells[i]);
+			exits[i] = exit && [exit[0], exit[1]];
+		}
+		return { cells, types, capacity, exits };
+	}
+
+	private record(cells: Uint32Array) {
+		this.undoStack.push(this.snapshot(cells));
+		if (this.undoStack.length > UNDO_LIMIT) this.undoStack.shift();
+		this.redoStack = [];
+	}
+
+	// Write a diff back and return the state it replaced
+	private swap(diff: Diff): Diff {
+		const current = this.snapshot(diff.cells);
+		for (let i = 0; i < diff.cells.length; i++) {
+			const c = diff.cells[i];
+			this.types[c] = diff.types[i];
+			this.capacity[c] = diff.capacity[i];
+			const exit = diff.exits[i];
+			if (exit) {
+				this.exits.set(c, exit);
+			} else {
+				this.exits.delete(c);
+			}
+		}
+		return current;
+	}
+
+	toPlan(): FloorPlan {
+		const data: Record<string, Cell> = {};
+		for (let c = 0; c < this.size; c++) {
+			const type = this.types[c];
+			if (type === OPEN) continue;
+			const [x, y] = this.coordinates(c);
+			if (type === CellType.Entrance) {
+				data[`${x}, ${y}`] = {
+					type: CellType.Entrance,
+					associatedExit: this.exits.get(c) ?? [-1, -1]
+				};
+			} else {
+				data[`${x}, ${y}`] = {
+					type: type as Exclude<CellType, CellType.Entrance>,
+					associatedExit: null,
+					...(this.capacity[c] ? { capacity: this.capacity[c] } : {})
+				};
+			}
+		}
+		return { schemaVersion: SCHEMA_VERSION, gridSize: this.sideLength, data };
+	}
+
+	// A plan already brought to the current schema by migratePlan
+	static fromPlan(plan: FloorPlan): GridStore {
+		const store = new GridStore(plan.gridSize);
+		for (const [key, cell] of Object.entries(plan.data)) {
+			const [x, y] = key.split(',').map(Number);
+			const c = store.index(x, y);
+			store.types[c] = cell.type;
+			if (cell.type === CellType.Entrance) {
+				store.exits.set(c, [cell.associatedExit[0], cell.associatedExit[1]]);
+			} else if (cell.capacity) {
+				store.capacity[c] = cell.capacity;
+			}
+		}
+		return store;
+	}
+
+	toBinary(): ArrayBuffer {
+		const n = this.size;
+		const entrances = this.entrances();
+		const buffer = new ArrayBuffer(16 + 2 * padded(n) + 8 * entrances.length);
+		const view = new DataView(buffer);
+		for (let i = 0; i < 4; i++) view.setUint8(i, PLAN_MAGIC.charCodeAt(i));
+		view.setUint8(4, SCHEMA_VERSION);
+		view.setUint32(8, this.sideLength, true);
+		view.setUint32(12, entrances.length, true);
+		new Uint8Array(buffer, 16, n).set(this.types);
+		new Uint8Array(buffer, 16 + padded(n), n).set(this.capacity);
+
+		let offset = 16 + 2 * padded(n);
+		for (const cell of entrances) {
+			const [x, y] = this.exits.get(cell)!;
+			const valid = x >= 0 && y >= 0 && x < this.sideLength && y < this.sideLength;
+			view.setUint32(offset, cell, true);
+			view.setUint32(offset + 4, valid ? this.index(x, y) : NO_EXIT, true);
+			offset += 8;
+		}
+		return buffer;
+	}
+
+	static fromBinary(buffer: ArrayBuffer): GridStore {
+		const view = new DataView(buffer);
+		const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+		if (magic !== PLAN_MAGIC) {
+			throw new Error(`Not a binary floor plan: ${magic}`);
+		}
+		if (view.getUint8(4) !== SCHEMA_VERSION) {
+			throw new Error(`Unsupported floor plan schema version ${view.getUint8(4)}`);
+		}
+		const store = new GridStore(view.getUint32(8, true));
+		const n = store.size;
+		store.types.set(new Uint8Array(buffer, 16, n));
+		store.capacity.set(new Uint8Array(buffer, 16 + padded(n), n));
+
+		let offset = 16 + 2 * padded(n);
+		for (let i = view.getUint32(12, true); i > 0; i--) {
+			const exit = view.getUint32(offset + 4, true);
+			store.exits.set(
+				view.getUint32(offset, true),
+				exit === NO_EXIT ? [-1, -1] : store.coordinates(exit)
+			);
+			offset += 8;
+		}
+		return store;
+	}
+}
+
+// Selected cells as a byte mask plus the list of selected cells, so adding a
+// cell, testing it and clearing the selection never allocate strings.
+export class Selection {
+	mask: Uint8Array;
+	cells: number[] = [];
+
+	constructor(size: number) {
+		this.mask = new Uint8Array(size);
+	}
+
+	has(cell: number): boolean {
+		return this.mask[cell] === 1;
+	}
+
+	// Returns whether the cell was newly selected
+	add(cell: number): boolean {
+		if (this.mask[cell]) return false;
+		this.mask[cell] = 1;
+		this.cells.push(cell);
+		return true;
+	}
+
+	addAll(cells: ArrayLike<number>) {
+		for (let i = 0; i < cells.length; i++) this.add(cells[i]);
+	}
+
+	// Deselect everything; returns the cells that were selected.
+	clear(): number[] {
+		const cells = this.cells;
+		for (const c of cells) this.mask[c] = 0;
+		this.cells = [];
+		return cells;
+	}
+
+	resize(size: number) {
+		this.mask = new Uint8Array(size);
+		this.cells = [];
+	}
+}
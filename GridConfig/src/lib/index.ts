@@ -1,13 +1,19 @@
 // place files you want to import through the `$lib` alias in this folder.
+
+// Cell type codes shared with Model/cells.py. Open cells (code 0) are left
+// out of the exported data.
+export const SCHEMA_VERSION = 2;
+
 export enum CellType {
-	Entrance,
-	Exit,
-	Wall,
-	StudyTable,
-	Chair
+	Entrance = 1,
+	Exit = 2,
+	Wall = 3,
+	StudyTable = 4,
+	Chair = 5
 }
 
 export const cellTypeKeys = Object.keys(CellType).filter((v) => isNaN(Number(v)));
+export const cellTypeValues = cellTypeKeys.map((k) => CellType[k as keyof typeof CellType]);
 
 export interface BaseCell {
 	type: CellType;
@@ -21,6 +27,11 @@ export interface EntranceCell extends BaseCell {
 export interface NonEntranceCell extends BaseCell {
 	type: Exclude<CellType, CellType.Entrance>;
 	associatedExit: null;
+	capacity?: number; // Seats at a study table or chair, the model default if left out
+}
+
+export function hasSeats(cell: CellType): boolean {
+	return cell == CellType.StudyTable || cell == CellType.Chair;
 }
 
 // Union type for all cells
@@ -40,3 +51,25 @@ export function colorForCell(cell: CellType): string {
 			return 'purple';
 	}
 }
+
+export interface FloorPlan {
+	schemaVersion?: number;
+	gridSize: number;
+	data: Record<string, Cell>;
+}
+
+// Bring a loaded floor plan up to the current schema version.
+export function migratePlan(plan: FloorPlan): FloorPlan {
+	const version = plan.schemaVersion ?? 1;
+	if (version > SCHEMA_VERSION) {
+		throw new Error(`Unsupported floor plan schema version ${version}`);
+	}
+	if (version == 1) {
+		// Version 1 numbered the types from Entrance = 0
+		for (const cell of Object.values(plan.data)) {
+			cell.type += 1;
+		}
+	}
+	plan.schemaVersion = SCHEMA_VERSION;
+	return plan;
+}
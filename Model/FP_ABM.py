@@ -3,17 +3,37 @@ Indoor Movement Model
 ===================
 A Mesa implementation of an Indoor movement model.
 Uses numpy arrays to represent vectors.
+
+Students walk in friendship groups, boids style: each student steers towards
+the friends it can see (cohesion), heads the way they head (alignment) and
+keeps its distance from everyone close by (separation). Walls block movement
+and turn students away.
+
+The population is held in arrays rather than one agent object per student.
+Every step the positions are bucketed in a uniform spatial hash with buckets
+``vision`` wide (see spatialhash.py), the pairs within ``vision`` come out of
+it in batches, and the three forces are summed per student with bincount.
+A step is a handful of array passes over the neighbour pairs, so groups of
+thousands of students stay usable.
+
+Usage:
+    python FP_ABM.py [floor_plan.json] [--population N] [--friendship-group N] [--steps N]
 """
 
+import argparse
+
 import numpy as np
-import json
-import networkx as nx
 from mesa import Model
-#from mesa.examples.basic.boid_flockers.agents import Boid
-from mesa.space import ContinuousSpace, SingleGrid
-from mesa.space import NetworkGrid
 from mesa.datacollection import DataCollector
 
+from cells import WALKABLE, CellType, read_plan
+from spatialhash import SpatialHash
+
+# Students cross at most this many cells per movement sub-step, so walls one
+# cell thick cannot be skipped over
+MAX_SUBSTEP = 0.5
+
+
 class IndoorModel(Model):
     """Overall model class. Handles agent creation, entrance selection,
        update space attractiveness, removing agents, time stepping,
@@ -39,25 +59,24 @@ class IndoorModel(Model):
         loudness=0.2,           #added by NBC
         leave_need=0.05,        #added by NBC
         seed=None,
+        floor_plan="environment.json",
     ):
         """Create a new ABM student model.
 
         Args:
             population: Number of students in the simulation (default: 100)
-            width: Width of the space (default: 100)
-            height: Height of the space (default: 100)
-            speed: How fast the students move (default: 1)
-            vision: How far each Boid can see (default: 10)
+            width: Width of the space, replaced by the floor plan's
+            height: Height of the space, replaced by the floor plan's
+            speed: How fast the students move, in cells per step (default: 1)
+            vision: How far each student can see (default: 10)
             separation: Minimum distance between students (default: 2)
             cohere: Weight of cohesion behavior (default: 0.03)
             separate: Weight of separation behavior (default: 0.015)
             match: Weight of alignment behavior (default: 0.05)
-
-
-
-
-
+            friendship_group: Students per friendship group. Groups enter
+                together and only cohere and align with each other (default: 1)
             seed: Random seed for reproducibility (default: None)
+            floor_plan: GridConfig export to walk in
         """
         super().__init__(seed=seed)
 
@@ -66,158 +85,169 @@ class IndoorModel(Model):
         self.vision = vision
         self.speed = speed
         self.separation = separation
+        self.friendship_group = max(1, friendship_group)
 
         # Set up the space
-        file_data = None
-        with open('environment.json', 'r') as f:
-            file_data = json.load(f)
-        block_data = self.parse_block_data(file_data["data"])
-        width = file_data["gridSize"]
-        height = width
-        self.space = SingleGrid(width, height, torus=True)
-
-        self.entrance_blocks = [
-            tuple(map(int, coord.split(","))) for coord, attr in self.space.items() if attr["type"] == "entrance"
-        ]
-
-        # Store "flocking" weights - Need?
+        self.attribute_grid, self.entrance_blocks, _, _ = read_plan(floor_plan)
+        self.walkable = WALKABLE[self.attribute_grid]
+        self.width, self.height = self.attribute_grid.shape
+        self.space = SpatialHash(self.width, self.height, max(vision, separation))
+        self.passages = np.zeros(self.attribute_grid.shape, dtype=np.int32)
+        self.rng = np.random.default_rng(self.random.getrandbits(64))
+
+        # Store "flocking" weights
         self.factors = {"cohere": cohere, "separate": separate, "match": match}
 
         # Create and place the student agents
         self.make_agents()
 
         # For tracking statistics
-        # Take Philip functions for movement
+        self.steps = 0
         self.average_heading = None
         self.update_average_heading()
-
-    def parse_block_data(self, block_data):
-        """
-        Parse a JSON-like string into a Python dictionary representing block data.
-
-        Args:
-            block_data (JSON): The JSON input.
-
-        Returns:
-            dict: Parsed block data.
-        """
-
-        processed_block_data = {}
-        for key, value in block_data.items():
-            # Convert string keys like "0,0" to tuple keys like (0, 0)
-            coords = tuple(map(int, key.split(',')))
-            processed_block_data[coords] = value
-
-        return processed_block_data
-
-    # def make_agents(self):
-    #     """Create and place all Boid agents randomly in the space."""
-    #     for _ in range(self.population):
-    #         # Random position
-    #         x = self.random.random() * self.space.x_max
-    #         y = self.random.random() * self.space.y_max
-    #         pos = np.array((x, y))
-
-    #         # Random initial direction
-    #         direction = np.random.random(2) * 2 - 1  # Random vector between -1 and 1
-    #         direction /= np.linalg.norm(direction)  # Normalize
-
-    #         # Create and place the Boid
-    #         boid = Boid(
-    #             model=self,
-    #             speed=self.speed,
-    #             direction=direction,
-    #             vision=self.vision,
-    #             separation=self.separation,
-    #             **self.factors,
-    #         )
-    #         self.space.place_agent(boid, pos)
+        self.datacollector = DataCollector(model_reporters={"average_heading": "average_heading"})
 
     def make_agents(self):
         """Create and place initial # of student agents at entrances of the space."""
-        for _ in range(self.population):
-            # Entrance position
+        self.groups = np.arange(self.population) // self.friendship_group
+        self.positions = np.zeros((self.population, 2))
+        self.directions = np.zeros((self.population, 2))
+
+        for group in range(int(self.groups.max(initial=-1)) + 1):
+            members = self.groups == group
+            # A group enters together, spread around the middle of the entrance
             entrance_pos = self.random.choice(self.entrance_blocks)
+            self.positions[members] = np.add(entrance_pos, 0.5) + self.rng.uniform(-0.3, 0.3, (members.sum(), 2))
 
             # Initial direction is "straight" from the entrance
-            direction = calculate_valid_direction(entrance_pos)
-
-            # Create and place the Boid
-            boid = Boid(
-                model=self,
-                speed=self.speed,
-                direction=direction,
-                vision=self.vision,
-                separation=self.separation,
-                **self.factors,
-            )
-            self.space.place_agent(boid, pos)
-
-    # def update_average_heading(self):
-    #     """Calculate the average heading (direction) of all Boids."""
-    #     if not self.agents:
-    #         self.average_heading = 0
-    #         return
-
-    #     headings = np.array([agent.direction for agent in self.agents])
-    #     mean_heading = np.mean(headings, axis=0)
-    #     self.average_heading = np.arctan2(mean_heading[1], mean_heading[0])
-
-    def calculate_valid_direction(current_pos, space, block_data):
-        """
-        Calculate a valid direction for an agent to move, avoiding walls, exits,
-        and boundaries.
+            direction = self.calculate_valid_direction(entrance_pos) + self.rng.normal(0, 0.1, (members.sum(), 2))
+            self.directions[members] = direction
 
-        entrance_pos: tuple - (x, y) coordinates of the entrance block
-        space: MultiGrid or ContinuousSpace - the simulation space
-        block_data: dict - a dictionary with block types keyed by coordinates
-        """
-        x, y = current_pos
+        self.directions /= np.maximum(np.linalg.norm(self.directions, axis=1, keepdims=True), 1e-9)
 
-        # Directions: (dx, dy) for right, up, left, down
-        directions = {
-            "right": (1, 0),
-            "up": (0, 1),
-            "left": (-1, 0),
-            "down": (0, -1)
-        }
+    def update_average_heading(self):
+        """Calculate the average heading (direction) of all students."""
+        if not self.population:
+            self.average_heading = 0
+            return
 
-        valid_directions = []
+        mean_heading = self.directions.mean(axis=0)
+        self.average_heading = np.arctan2(mean_heading[1], mean_heading[0])
 
-        # Check each adjacent block
-        for name, (dx, dy) in directions.items():
-            neighbor_pos = (x + dx, y + dy)
+    def calculate_valid_direction(self, current_pos):
+        """
+        Pick a random direction from a cell that avoids walls, exits and the
+        boundary.
 
-            # Check if neighbor position is within the bounds of the space
-            if space.out_of_bounds(neighbor_pos):
-                continue
+        Args:
+            current_pos (tuple): (x, y) cell, usually an entrance.
 
-            if warn_if_agent_has_position_already == 1:     # need to learn how this warning works better, mesa doc
+        Returns:
+            NDArray: The (dx, dy) step, (0, 0) if every neighbour is blocked.
+        """
+        x, y = current_pos
+        valid_directions = []
+        for dx, dy in ((1, 0), (0, 1), (-1, 0), (0, -1)):
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < self.width and 0 <= ny < self.height):
                 continue
-
-            # Check if neighbor is a wall or other restricted type
-            block_type = block_data.get(neighbor_pos, {}).get("type", "empty")
-            if block_type not in ["wall", "exit"]:
+            if self.attribute_grid[nx, ny] not in (CellType.WALL, CellType.EXIT):
                 valid_directions.append((dx, dy))
 
-        # Avoid cases where no valid directions are found
         if not valid_directions:
-            return np.array([0, 0])  # No movement (stay in place)
-
-        # Chooses a random valid movement (FIX THIS)
-        #   - We want the agent to move towards friends if they see them
-        #   - Agent movement might not necessarily be random (usually towards exit if passing through)
-        direction = space.random.choice(valid_directions)
-        return np.array(direction)
+            return np.array([0.0, 0.0])
+        return np.array(self.random.choice(valid_directions), dtype=np.float64)
+
+    def _free(self, positions):
+        """Whether each position is inside the plan on a walkable cell."""
+        cells = np.floor(positions).astype(np.int64)
+        inside = ((cells[:, 0] >= 0) & (cells[:, 0] < self.width)
+                  & (cells[:, 1] >= 0) & (cells[:, 1] < self.height))
+        free = np.zeros(len(positions), dtype=bool)
+        free[inside] = self.walkable[cells[inside, 0], cells[inside, 1]]
+        return free
+
+    def steer(self):
+        """Turn every student by its cohesion, separation and alignment forces."""
+        n = self.population
+        friends = np.zeros(n)
+        crowd = np.zeros(n)
+        cohere_vector = np.zeros((n, 2))
+        separation_vector = np.zeros((n, 2))
+        match_vector = np.zeros((n, 2))
+
+        self.space.rebuild(self.positions)
+        for i, j, delta, distance in self.space.pairs(max(self.vision, self.separation)):
+            friend = (self.groups[i] == self.groups[j]) & (distance < self.vision)
+            near = distance < self.separation
+            fi, ni = i[friend], i[near]
+            friends += np.bincount(fi, minlength=n)
+            crowd += np.bincount(ni, minlength=n)
+            for axis in range(2):
+                cohere_vector[:, axis] += np.bincount(fi, delta[friend, axis], minlength=n)
+                match_vector[:, axis] += np.bincount(fi, self.directions[j[friend], axis], minlength=n)
+                separation_vector[:, axis] -= np.bincount(ni, delta[near, axis], minlength=n)
+
+        friends = np.maximum(friends, 1)[:, None]
+        crowd = np.maximum(crowd, 1)[:, None]
+        self.directions += (cohere_vector * self.factors["cohere"] / friends
+                            + match_vector * self.factors["match"] / friends
+                            + separation_vector * self.factors["separate"] / crowd)
+        norm = np.linalg.norm(self.directions, axis=1, keepdims=True)
+        self.directions = np.where(norm > 1e-9, self.directions / np.maximum(norm, 1e-9), self.directions)
+
+    def move(self):
+        """
+        Move every student ``speed`` cells along its direction. A student
+        blocked by a wall slides along it and turns away from it.
+        """
+        substeps = max(1, int(np.ceil(self.speed / MAX_SUBSTEP)))
+        for _ in range(substeps):
+            step = self.directions * (self.speed / substeps)
+            target = self.positions + step
+            ok = self._free(target)
+
+            # Blocked students try each axis on its own and bounce off the other
+            blocked = np.flatnonzero(~ok)
+            along_x = self.positions[blocked] + step[blocked] * (1, 0)
+            along_y = self.positions[blocked] + step[blocked] * (0, 1)
+            x_ok = self._free(along_x)
+            y_ok = self._free(along_y) & ~x_ok
+            target[blocked] = np.where(x_ok[:, None], along_x, np.where(y_ok[:, None], along_y,
+                                                                          self.positions[blocked]))
+            self.directions[blocked[x_ok], 1] *= -1
+            self.directions[blocked[y_ok], 0] *= -1
+            self.directions[blocked[~x_ok & ~y_ok]] *= -1
+            self.positions = target
+
+        cells = np.floor(self.positions).astype(np.int64)
+        np.add.at(self.passages, (cells[:, 0], cells[:, 1]), 1)
 
     def step(self):
-        # Get the agent's current position
-        current_pos = self.pos
-
-        # Calculate a valid direction based on surroundings
-        valid_direction = calculate_valid_direction(current_pos, self.model.space, self.model.block_data)
-
-        # Move the agent
-        new_pos = (current_pos[0] + valid_direction[0], current_pos[1] + valid_direction[1]) # x and y movement in one step??
-        if not self.model.space.out_of_bounds(new_pos) and not self.model.space.get_cell_list_contents([new_pos]):
-            self.model.space.move_agent(self, new_pos)
+        self.steer()
+        self.move()
+        self.update_average_heading()
+        self.datacollector.collect(self)
+        self.steps += 1
+
+
+if __name__ == "__main__":
+    import time
+
+    parser = argparse.ArgumentParser(description="Run the friendship-group movement model.")
+    parser.add_argument("floor_plan", nargs="?", default="environment.json")
+    parser.add_argument("--population", type=int, default=1000)
+    parser.add_argument("--friendship-group", type=int, default=4)
+    parser.add_argument("--vision", type=float, default=10)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    model = IndoorModel(population=args.population, friendship_group=args.friendship_group, vision=args.vision,
+                        seed=args.seed, floor_plan=args.floor_plan)
+    for _ in range(args.steps):
+        model.step()
+    elapsed = time.perf_counter() - started
+    print(f"{args.population} students, {args.steps} steps in {elapsed:.2f} s "
+          f"({elapsed / args.steps * 1e3:.1f} ms per step), average heading {model.average_heading:.2f} rad")
@@ -0,0 +1,286 @@
+"""
+Wall-aware noise propagation precomputed per floor plan.
+
+The free-space Gaussian of ``IndoorModel.add_noise`` passes straight through
+walls. Acoustics instead lets sound spread only through walkable cells: the
+floor is split into square source regions, and for one source cell in each
+region a flood fill over the walkable cells (8-connected, diagonal steps
+cost sqrt(2) and may not cut wall corners) gives the distance sound travels
+to every other cell. The response of a region is the Gaussian of that
+distance, so in an open room it matches the free-space stamp and behind a
+wall it falls off with the way around.
+
+Sound travels at most ``limit`` cells before it falls below ``epsilon``, so
+each response is stored as a square patch of side 2 * ceil(limit) + 1 centred
+on its source cell, and the flood fill only runs inside that window. Memory
+and build time grow with the number of regions, not with regions x cells.
+
+The responses depend only on the floor plan, so they are built once and
+cached as .npz files keyed by a hash of the grid and the parameters.
+Optionally the patches are stored as a rank-k factorization, which shrinks
+them from regions x patch cells to (regions + patch cells) x k values. At run
+time all noise sources of a step are summed per region and the patches of the
+regions that sound are added at their windows.
+
+Usage:
+    python acoustics.py floor_plan.json [--region N] [--rank K] [--cache-dir DIR]
+"""
+
+import argparse
+import hashlib
+import os
+
+import numpy as np
+from numpy.typing import NDArray
+
+from cells import WALKABLE
+from noise import NOISE_EPSILON
+
+# Bump when the layout of the cached files changes
+_CACHE_FORMAT = 2
+
+_STEPS = [(1, 0, 1.0), (-1, 0, 1.0), (0, 1, 1.0), (0, -1, 1.0),
+          (1, 1, np.sqrt(2)), (1, -1, np.sqrt(2)), (-1, 1, np.sqrt(2)), (-1, -1, np.sqrt(2))]
+
+
+def _shift(array, dx, dy, fill):
+    """``out[..., x, y] = array[..., x - dx, y - dy]``, with ``fill`` shifted in at the edges."""
+    out = np.full_like(array, fill)
+    width, height = array.shape[-2:]
+    out[..., max(dx, 0):width + min(dx, 0), max(dy, 0):height + min(dy, 0)] = \
+        array[..., max(-dx, 0):width - max(dx, 0), max(-dy, 0):height - max(dy, 0)]
+    return out
+
+
+def geodesic_distances(walkable: NDArray, sources: NDArray, limit: float, batch=256) -> NDArray:
+    """
+    Travel distances from each source through walkable cells, within the
+    window of cells a path no longer than ``limit`` can reach.
+
+    Args:
+        walkable (NDArray): Bool grid.
+        sources (NDArray): (S, 2) source cells.
+        limit (float): Distances beyond this are left at infinity.
+        batch (int): Sources solved together.
+
+    Returns:
+        NDArray: float32 array (S, 2 * reach + 1, 2 * reach + 1) with
+        ``reach = ceil(limit)``; entry [s, i, j] is the distance to cell
+        ``sources[s] + (i - reach, j - reach)``, infinity off the grid.
+    """
+    reach = int(np.ceil(limit))
+    side = 2 * reach + 1
+    padded = np.pad(walkable, reach, constant_values=False)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, (side, side))
+
+    out = np.empty((len(sources), side, side), dtype=np.float32)
+    for start in range(0, len(sources), batch):
+        chunk = sources[start:start + batch]
+        local = windows[chunk[:, 0], chunk[:, 1]]
+
+        # A step may enter a cell if it is walkable and, for diagonals, both
+        # cells it passes between are too. Every step costs at least 1, so no
+        # path within the limit leaves the window
+        allowed = []
+        for dx, dy, _ in _STEPS:
+            mask = local.copy()
+            if dx and dy:
+                mask &= _shift(local, dx, 0, False) & _shift(local, 0, dy, False)
+            allowed.append(mask)
+
+        dist = np.full(local.shape, np.inf, dtype=np.float32)
+        dist[:, reach, reach] = 0.0
+
+        # Relax until nothing improves; each round extends paths by one step
+        for _ in range(reach + 1):
+            relaxed = dist
+            for (dx, dy, cost), mask in zip(_STEPS, allowed):
+                relaxed = np.minimum(relaxed, np.where(mask, _shift(dist, dx, dy, np.inf) + cost, np.inf))
+            relaxed[relaxed > limit] = np.inf
+            if np.array_equal(relaxed, dist):
+                break
+            dist = relaxed
+        out[start:start + len(chunk)] = dist
+    return out
+
+
+class Acoustics:
+    """
+    Precomputed noise responses of a floor plan.
+
+    Args:
+        attribute_grid (NDArray): Cell types, as loaded by ``parse_block_data``.
+        region (int): Side length of the square source regions in cells;
+            1 gives every cell its own response.
+        loudness (float): Loudness whose spread (3 * loudness cells) the
+            responses use; sources of other loudness are scaled in amplitude.
+        epsilon (float): Responses below this are dropped.
+        rank (int | None): Keep a rank-``rank`` factorization of the
+            patches instead of the patches themselves. Small ranks blur
+            the responses near walls; check the error on the plan at hand.
+    """
+
+    def __init__(self, attribute_grid, region=3, loudness=2.0, epsilon=NOISE_EPSILON, rank=None):
+        grid = np.asarray(attribute_grid, dtype=np.uint8)
+        self.shape = grid.shape
+        self.region = region
+        self.loudness = loudness
+        self.epsilon = epsilon
+        self.rank = rank
+        self.key = self.cache_key(grid, region, loudness, epsilon, rank)
+
+        walkable = WALKABLE[grid]
+        width, height = self.shape
+
+        # Regions are the blocks of the coarse grid holding a walkable cell;
+        # each is heard from its walkable cell closest to the block centre
+        blocks = (np.arange(width)[:, np.newaxis] // region) * (-(-height // region)) \
+            + np.arange(height)[np.newaxis, :] // region
+        cells = np.argwhere(walkable)
+        centre = (cells // region) * region + (region - 1) / 2
+        offset = ((cells - centre) ** 2).sum(axis=1)
+        block_of = blocks[cells[:, 0], cells[:, 1]]
+        order = np.lexsort((offset, block_of))
+        first = order[np.r_[True, block_of[order][1:] != block_of[order][:-1]]]
+        self.sources = cells[first]
+
+        lookup = np.full(blocks.max() + 1, -1, dtype=np.int32)
+        lookup[block_of[first]] = np.arange(len(first))
+        self.region_of = np.where(walkable, lookup[blocks], -1).ravel()
+
+        sigma = 3 * loudness
+        limit = sigma * np.sqrt(2 * np.log(1 / epsilon))
+        dist = geodesic_distances(walkable, self.sources, limit)
+        self.reach = (dist.shape[-1] - 1) // 2
+        patches = np.exp(-dist ** 2 / (2 * sigma ** 2))
+        patches[patches < epsilon] = 0.0
+
+        if rank is None:
+            self.patches = patches.astype(np.float32)
+            self.factors = None
+        else:
+            u, s, vt = np.linalg.svd(patches.reshape(len(patches), -1), full_matrices=False)
+            self.patches = None
+            self.factors = ((u[:, :rank] * s[:rank]).astype(np.float32),
+                            vt[:rank].reshape(rank, *patches.shape[1:]).astype(np.float32))
+
+    @staticmethod
+    def cache_key(grid, region, loudness, epsilon, rank) -> str:
+        digest = hashlib.sha1(np.ascontiguousarray(grid, dtype=np.uint8).tobytes())
+        digest.update(repr((grid.shape, region, loudness, epsilon, rank, _CACHE_FORMAT)).encode())
+        return digest.hexdigest()
+
+    @property
+    def nbytes(self) -> int:
+        stored = [self.patches] if self.factors is None else list(self.factors)
+        return sum(a.nbytes for a in stored) + self.sources.nbytes + self.region_of.nbytes
+
+    def response(self, cells: NDArray, amplitudes: NDArray) -> NDArray:
+        """
+        Noise from many sources at once.
+
+        Args:
+            cells (NDArray): (N, 2) source cells.
+            amplitudes (NDArray): (N,) peak loudness of each source.
+
+        Returns:
+            NDArray: float32 (width, height) noise added by all sources.
+        """
+        cells = np.asarray(cells, dtype=np.intp).reshape(-1, 2)
+        regions = self.region_of[cells[:, 0] * self.shape[1] + cells[:, 1]]
+        heard = regions >= 0
+        weights = np.bincount(regions[heard], weights=np.asarray(amplitudes, dtype=float)[heard],
+                              minlength=len(self.sources)).astype(np.float32)
+        sounding = np.flatnonzero(weights)
+
+        if self.factors is None:
+            patches = self.patches[sounding]
+        else:
+            coefficients, basis = self.factors
+            patches = np.maximum(np.tensordot(coefficients[sounding], basis, axes=1), 0.0)
+
+        # Add every patch at its window on a canvas padded by the reach, then crop
+        reach = self.reach
+        side = 2 * reach + 1
+        canvas_height = self.shape[1] + 2 * reach
+        rows = self.sources[sounding, 0, np.newaxis, np.newaxis] + np.arange(side)[:, np.newaxis]
+        columns = self.sources[sounding, 1, np.newaxis, np.newaxis] + np.arange(side)[np.newaxis, :]
+        canvas = np.bincount((rows * canvas_height + columns).ravel(),
+                             weights=(weights[sounding, np.newaxis, np.newaxis] * patches).ravel(),
+                             minlength=(self.shape[0] + 2 * reach) * canvas_height)
+        canvas = canvas.reshape(-1, canvas_height)
+        return canvas[reach:reach + self.shape[0], reach:reach + self.shape[1]].astype(np.float32)
+
+    def save(self, path):
+        arrays = {"key": np.array(self.key), "params": np.array([self.region, self.loudness, self.epsilon]),
+                  "sources": self.sources, "region_of": self.region_of}
+        if self.factors is None:
+            arrays["patches"] = self.patches
+        else:
+            arrays["coefficients"], arrays["basis"] = self.factors
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path, shape) -> "Acoustics":
+        acoustics = cls.__new__(cls)
+        with np.load(path) as data:
+            acoustics.key = str(data["key"])
+            region, loudness, epsilon = data["params"]
+            acoustics.region, acoustics.loudness, acoustics.epsilon = int(region), float(loudness), float(epsilon)
+            acoustics.shape = tuple(shape)
+            acoustics.sources = data["sources"]
+            acoustics.region_of = data["region_of"]
+            if "patches" in data.files:
+                acoustics.patches, acoustics.factors, acoustics.rank = data["patches"], None, None
+            else:
+                acoustics.patches = None
+                acoustics.factors = (data["coefficients"], data["basis"])
+                acoustics.rank = acoustics.factors[0].shape[1]
+            stored = acoustics.patches if acoustics.factors is None else acoustics.factors[1]
+            acoustics.reach = (stored.shape[-1] - 1) // 2
+        return acoustics
+
+    @classmethod
+    def cached(cls, attribute_grid, cache_dir=None, **kwargs) -> "Acoustics":
+        """
+        Load the responses for this floor plan from ``cache_dir``, building
+        and storing them there on a miss.
+
+        Args:
+            attribute_grid (NDArray): Cell types.
+            cache_dir (str | None): Defaults to ``~/.cache/indoor-abm``.
+            **kwargs: Parameters as for ``Acoustics``.
+        """
+        cache_dir = cache_dir or os.path.join(os.path.expanduser("~"), ".cache", "indoor-abm")
+        grid = np.asarray(attribute_grid, dtype=np.uint8)
+        params = {"region": 3, "loudness": 2.0, "epsilon": NOISE_EPSILON, "rank": None, **kwargs}
+        path = os.path.join(cache_dir, f"acoustics-{cls.cache_key(grid, **params)}.npz")
+        if os.path.exists(path):
+            return cls.load(path, grid.shape)
+
+        acoustics = cls(grid, **params)
+        os.makedirs(cache_dir, exist_ok=True)
+        acoustics.save(path)
+        return acoustics
+
+
+if __name__ == "__main__":
+    import time
+
+    from cells import read_plan
+
+    parser = argparse.ArgumentParser(description="Precompute the noise responses of a floor plan.")
+    parser.add_argument("floor_plan")
+    parser.add_argument("--region", type=int, default=3)
+    parser.add_argument("--rank", type=int, default=None)
+    parser.add_argument("--cache-dir", default=None)
+    args = parser.parse_args()
+
+    grid = read_plan(args.floor_plan)[0]
+    started = time.perf_counter()
+    acoustics = Acoustics.cached(grid, args.cache_dir, region=args.region, rank=args.rank)
+    print(f"{len(acoustics.sources)} source regions, {acoustics.nbytes / 1e6:.1f} MB, "
+          f"{time.perf_counter() - started:.2f} s")
@@ -0,0 +1,200 @@
+"""
+Static analysis of a floor plan, run once at load time.
+
+Agents walk between 4-neighbouring walkable cells, so two cells are connected
+exactly when they share a connected component of the walkable mask. The
+components are labelled with vectorized hooking and pointer jumping: every
+cell starts as its own tree, each round every edge between two trees hangs
+the tree with the larger root under the smaller one, and pointer jumping
+(``label = label[label]``) then points every cell straight at its root.
+Whole trees merge per round, so even long winding corridors take a few
+dozen rounds rather than one per cell.
+
+From the labels the analysis
+    - checks that each entrance's exit is a walkable cell in the entrance's
+      component, and repairs the pair with the nearest reachable exit, or
+      drops it if there is none,
+    - marks the targets no entrance can reach, so the look tables can leave
+      them out, and
+    - groups the exits by component, so an agent is only ever sent to an exit
+      it can reach.
+At run time ``connected`` answers whether a path exists with two array
+lookups, and impossible path queries are skipped.
+
+Usage:
+    python analysis.py floor_plan.json [--strict]
+"""
+
+import argparse
+from dataclasses import dataclass, field
+
+import numpy as np
+from numpy.typing import NDArray
+
+from cells import IS_TARGET, WALKABLE, CellType
+
+
+def label_components(walkable: NDArray) -> tuple[NDArray, int]:
+    """
+    Label the 4-connected components of a walkable mask.
+
+    Args:
+        walkable (NDArray): Bool grid.
+
+    Returns:
+        tuple: int32 grid of component labels numbered from 0, -1 for
+        cells that are not walkable, and the number of components.
+    """
+    width, height = walkable.shape
+    flat = walkable.ravel()
+
+    # Neighbour pairs that are both walkable
+    index = np.arange(flat.size).reshape(width, height)
+    a = np.concatenate([index[1:, :].ravel(), index[:, 1:].ravel()])
+    b = np.concatenate([index[:-1, :].ravel(), index[:, :-1].ravel()])
+    keep = flat[a] & flat[b]
+    a, b = a[keep], b[keep]
+
+    # Each cell points at a cell of its component with a smaller index; a
+    # root points at itself
+    labels = np.arange(flat.size)
+    while True:
+        # Hook the larger root of every edge joining two trees under the smaller
+        high = np.maximum(labels[a], labels[b])
+        low = np.minimum(labels[a], labels[b])
+        joined = high != low
+        if not joined.any():
+            break
+        np.minimum.at(labels, high[joined], low[joined])
+        # Pointer jumping until every cell points straight at its root
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+
+    roots, dense = np.unique(labels[flat], return_inverse=True)
+    out = np.full(flat.size, -1, dtype=np.int32)
+    out[flat] = dense
+    return out.reshape(width, height), len(roots)
+
+
+@dataclass
+class PlanAnalysis:
+    """
+    Reachability facts of a floor plan.
+
+    Attributes:
+        labels (NDArray): Component label per cell, -1 off the walkable cells.
+        component_sizes (NDArray): Cells per component.
+        spawns (list): Entrances that reach an exit.
+        exits (list): The exit paired with each of ``spawns``.
+        reachable_targets (NDArray): Bool grid of targets some entrance reaches.
+        issues (list): What was repaired or dropped, one message each.
+    """
+    labels: NDArray
+    component_sizes: NDArray
+    spawns: list
+    exits: list
+    reachable_targets: NDArray
+    issues: list = field(default_factory=list)
+    _exits_by_component: dict = field(default_factory=dict, repr=False)
+
+    def connected(self, a, b) -> bool:
+        """Whether an agent at cell ``a`` can walk to cell ``b``."""
+        label = self.labels[a]
+        return label >= 0 and label == self.labels[b]
+
+    def exits_for(self, cell) -> list:
+        """The exits reachable from ``cell``."""
+        return self._exits_by_component.get(int(self.labels[cell]), [])
+
+
+def analyze(grid: NDArray, spawns: list, exits: list, repair=True) -> PlanAnalysis:
+    """
+    Check the entrance/exit pairs and targets of a floor plan.
+
+    Args:
+        grid (NDArray): Cell types, as loaded by ``read_plan``.
+        spawns (list): Entrance cells.
+        exits (list): The exit paired with each entrance.
+        repair (bool): Replace an unreachable exit with the nearest exit the
+            entrance reaches, dropping the pair if there is none. If False,
+            any unreachable pair raises instead.
+
+    Returns:
+        PlanAnalysis: The labels and the validated pairs.
+
+    Raises:
+        ValueError: If a pair is unreachable and ``repair`` is False, or no
+            entrance reaches any exit.
+    """
+    grid = np.asarray(grid, dtype=np.uint8)
+    walkable = WALKABLE[grid]
+    labels, count = label_components(walkable)
+    sizes = np.bincount(labels[labels >= 0], minlength=count)
+    width, height = grid.shape
+
+    def label_of(cell):
+        x, y = cell
+        return int(labels[x, y]) if 0 <= x < width and 0 <= y < height else -1
+
+    # Exit cells of the plan plus every walkable paired exit are candidates
+    candidates = {tuple(map(int, cell)) for cell in np.argwhere(grid == CellType.EXIT)}
+    candidates |= {tuple(cell) for cell in exits if label_of(cell) >= 0}
+    candidates = sorted(candidates)
+
+    kept_spawns, kept_exits, issues = [], [], []
+    for spawn, exit in zip(spawns, exits):
+        spawn, exit = tuple(spawn), tuple(exit)
+        component = label_of(spawn)
+        if component >= 0 and label_of(exit) == component:
+            kept_spawns.append(spawn)
+            kept_exits.append(exit)
+            continue
+
+        reason = "is not walkable" if label_of(exit) < 0 else "cannot be reached"
+        if not repair:
+            raise ValueError(f"exit {exit} of entrance {spawn} {reason}")
+        reachable = [c for c in candidates if component >= 0 and label_of(c) == component]
+        if not reachable:
+            issues.append(f"dropped entrance {spawn}: its exit {exit} {reason} and no other exit is reachable")
+            continue
+        nearest = min(reachable, key=lambda c: abs(c[0] - spawn[0]) + abs(c[1] - spawn[1]))
+        issues.append(f"entrance {spawn}: exit {exit} {reason}, using {nearest} instead")
+        kept_spawns.append(spawn)
+        kept_exits.append(nearest)
+
+    if not kept_spawns:
+        raise ValueError("no entrance can reach an exit")
+
+    entered = np.unique([label_of(s) for s in kept_spawns])
+    reachable_targets = IS_TARGET[grid] & np.isin(labels, entered)
+    dropped = int(IS_TARGET[grid].sum() - reachable_targets.sum())
+    if dropped:
+        issues.append(f"{dropped} study tables and chairs cannot be reached from any entrance")
+
+    by_component = {}
+    for exit in kept_exits:
+        by_component.setdefault(label_of(exit), []).append(exit)
+
+    return PlanAnalysis(labels, sizes, kept_spawns, kept_exits, reachable_targets, issues, by_component)
+
+
+if __name__ == "__main__":
+    import time
+
+    from cells import read_plan
+
+    parser = argparse.ArgumentParser(description="Check the reachability of a floor plan.")
+    parser.add_argument("floor_plan")
+    parser.add_argument("--strict", action="store_true", help="fail instead of repairing unreachable exits")
+    args = parser.parse_args()
+
+    grid, spawns, exits, _ = read_plan(args.floor_plan)
+    started = time.perf_counter()
+    analysis = analyze(grid, spawns, exits, repair=not args.strict)
+    print(f"{len(analysis.component_sizes)} walkable components (largest {analysis.component_sizes.max()} cells), "
+          f"{len(analysis.spawns)}/{len(spawns)} entrances kept, {time.perf_counter() - started:.3f} s")
+    for issue in analysis.issues:
+        print(issue)
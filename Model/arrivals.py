@@ -0,0 +1,136 @@
+"""
+Continuous arrival of students into an IndoorModel.
+
+Instead of creating the whole population up front, an ArrivalScheduler owns a
+fixed pool of agent slots. Each step every entrance's arrival process says how
+many students walk in; each one takes a free slot, is reset and placed at the
+entrance. When an agent leaves through an exit its slot goes back on the free
+list, so a day-long run with millions of visits never allocates new agents.
+
+Example:
+    model = main.IndoorModel(num_agents=0, width=main.w, height=main.h)
+    model.arrivals = ArrivalScheduler(
+        model,
+        {entrance: PoissonArrivals(0.2) for entrance in main.spawn_points},
+        exits=main.exit_points,
+        capacity=500,
+    )
+"""
+
+import random
+
+import numpy as np
+
+from main import StudentAgent, cell_index
+
+
+class PoissonArrivals:
+    """
+    Poisson arrivals with a rate that may change over the day.
+
+    Args:
+        rate (float | callable): Expected arrivals per step, or a function of
+            the step number returning it.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate if callable(rate) else (lambda step: rate)
+
+    def arrivals(self, step: int, rng: np.random.Generator) -> int:
+        return int(rng.poisson(self.rate(step)))
+
+    def next_arrival(self, step: int) -> int | None:
+        # Someone may walk in on any step
+        return step
+
+
+class TimetableArrivals:
+    """
+    Arrivals replayed from a trace, such as door counter timestamps or a
+    class timetable.
+
+    Args:
+        steps (iterable of int): The step of each arrival; repeats mean
+            several students arrive together.
+    """
+
+    def __init__(self, steps):
+        self.steps = np.sort(np.asarray(list(steps), dtype=np.int64))
+
+    def arrivals(self, step: int, rng: np.random.Generator) -> int:
+        return int(np.searchsorted(self.steps, step, side="right") - np.searchsorted(self.steps, step, side="left"))
+
+    def next_arrival(self, step: int) -> int | None:
+        i = np.searchsorted(self.steps, step, side="left")
+        return int(self.steps[i]) if i < len(self.steps) else None
+
+
+class ArrivalScheduler:
+    """
+    Spawns agents from per-entrance arrival processes into preallocated slots.
+
+    Args:
+        model: The IndoorModel to feed.
+        entrances (dict): Maps each entrance cell to its arrival process.
+        exits (list): Cells an arriving agent may be sent out through.
+        capacity (int): Most agents in the building at once.
+        seed (int | None): Seed for the arrival draws.
+    """
+
+    def __init__(self, model, entrances, exits, capacity, seed=None):
+        self.model = model
+        self.entrances = dict(entrances)
+        self.exits = list(exits)
+        self.rng = np.random.default_rng(seed)
+
+        # The exits each entrance can reach (see analysis.py)
+        self.reachable_exits = {
+            entrance: [e for e in self.exits if model.analysis.connected(entrance, e)] or self.exits
+            for entrance in self.entrances
+        }
+
+        self.slots = []
+        for slot in range(capacity):
+            agent = StudentAgent(model.next_id(), model)
+            agent.slot = slot
+            self.slots.append(agent)
+        self.free = list(reversed(range(capacity)))
+
+        self.arrived = 0
+        self.turned_away = 0
+
+    def step(self):
+        """Bring in this step's arrivals."""
+        step = self.model.schedule.steps
+        for entrance, process in self.entrances.items():
+            for _ in range(process.arrivals(step, self.rng)):
+                if not self.free:
+                    self.turned_away += 1
+                    continue
+                self.spawn(entrance)
+
+    def next_arrival(self, step: int) -> int | None:
+        """The earliest step from ``step`` on at which anyone may arrive, or None."""
+        upcoming = [s for s in (p.next_arrival(step) for p in self.entrances.values()) if s is not None]
+        return min(upcoming, default=None)
+
+    def spawn(self, entrance):
+        """Place an agent from a free slot at ``entrance``."""
+        agent = self.slots[self.free.pop()]
+        agent.reset()
+        agent.destination_stack.append(cell_index(random.choice(self.reachable_exits[entrance])))
+
+        self.model.place_agent(agent, entrance)
+        self.arrived += 1
+        return agent
+
+    def release(self, agent):
+        """Return the slot of an agent that has left."""
+        slot = getattr(agent, "slot", None)
+        if slot is not None:
+            self.free.append(slot)
+
+    @property
+    def occupancy(self) -> int:
+        """Number of agents currently in the building."""
+        return len(self.slots) - len(self.free)
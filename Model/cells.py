@@ -0,0 +1,202 @@
+"""
+The cell-type schema shared by the models and GridConfig.
+
+Every floor plan is held as a uint8 grid of CellType codes. The lookup
+tables below are indexed by code, so ``WALKABLE[grid]`` turns a whole plan
+into a mask and ``WALKABLE[grid[x, y]]`` answers for one cell with a single
+array index. CellMasks bundles those per-cell masks for a loaded plan.
+
+GridConfig exports carry ``schemaVersion``. Version 1 files have no such
+field and number the types Entrance=0 .. Chair=4, with open cells left out;
+``read_plan`` shifts them to the current codes. Study tables and chairs may
+carry a ``capacity`` field overriding MAX_STUDENTS for that cell.
+
+GridConfig also exports a compact binary plan (.abmp), which ``read_plan``
+and ``read_capacity`` recognise by its magic. Integers are little-endian and
+cells are numbered ``y * side + x``:
+
+    header (16 bytes)  magic "ABMP", schema version u8, 3 reserved bytes,
+                       side length u32, entrance count u32
+    types              side * side u8 CellType codes, padded to 4 bytes
+    capacity           side * side u8 seats, 0 for the type default, padded
+    entrances          count x (entrance cell u32, exit cell u32),
+                       0xFFFFFFFF for an entrance without an exit
+"""
+
+import json
+import struct
+from dataclasses import dataclass
+from enum import IntEnum
+
+import numpy as np
+from numpy.typing import NDArray
+
+SCHEMA_VERSION = 2
+
+# Students that fit at one study table or chair, unless the plan says otherwise
+MAX_STUDENTS = 2
+
+
+class CellType(IntEnum):
+    OPEN = 0
+    ENTRANCE = 1
+    EXIT = 2
+    WALL = 3
+    STUDY_TABLE = 4
+    CHAIR = 5
+
+
+# Lookup tables, indexed by CellType code
+WALKABLE = np.array([True, True, True, False, True, True])
+IS_TARGET = np.array([False, False, False, False, True, True])
+IS_WORK = np.array([False, False, False, False, True, False])
+IS_SOCIAL = np.array([False, False, False, False, False, True])
+CAPACITY = np.where(IS_TARGET, MAX_STUDENTS, 0).astype(np.uint8)
+
+PLAN_MAGIC = b"ABMP"
+_NO_EXIT = 0xFFFFFFFF
+
+# Version 1 code -> current code
+_V1_CODES = np.array([CellType.ENTRANCE, CellType.EXIT, CellType.WALL, CellType.STUDY_TABLE, CellType.CHAIR],
+                     dtype=np.uint8)
+
+
+def translate(code: int, version: int) -> int:
+    """
+    Convert a cell type code from a file of the given schema version.
+
+    Raises:
+        ValueError: If the version or code is unknown.
+    """
+    if version == SCHEMA_VERSION:
+        if code not in CellType._value2member_map_:
+            raise ValueError(f"unknown cell type {code}")
+        return code
+    if version == 1:
+        if not 0 <= code < len(_V1_CODES):
+            raise ValueError(f"unknown version 1 cell type {code}")
+        return int(_V1_CODES[code])
+    raise ValueError(f"unsupported floor plan schema version {version}")
+
+
+def _is_binary(file_name: str) -> bool:
+    with open(file_name, 'rb') as f:
+        return f.read(len(PLAN_MAGIC)) == PLAN_MAGIC
+
+
+def read_binary_plan(file_name: str) -> tuple[NDArray, NDArray, list[tuple[int, int]], list[tuple[int, int]], int]:
+    """
+    Read a binary GridConfig export.
+
+    Args:
+        file_name (str): Path to the .abmp file.
+
+    Returns:
+        tuple: The uint8 grid of CellType codes indexed ``[y, x]``, the uint8
+        capacity grid (0 for the type default), the spawn cells, the exit
+        paired with each spawn, and the side length.
+    """
+    with open(file_name, 'rb') as f:
+        data = f.read()
+
+    if data[:4] != PLAN_MAGIC:
+        raise ValueError(f"{file_name} is not a binary floor plan")
+    version, size, count = data[4], *struct.unpack_from("<II", data, 8)
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"unsupported floor plan schema version {version}")
+
+    cells = size * size
+    padded = -(-cells // 4) * 4
+    grid = np.frombuffer(data, dtype=np.uint8, count=cells, offset=16).reshape(size, size).copy()
+    capacity = np.frombuffer(data, dtype=np.uint8, count=cells, offset=16 + padded).reshape(size, size).copy()
+    pairs = np.frombuffer(data, dtype="<u4", count=2 * count, offset=16 + 2 * padded).reshape(count, 2)
+    if not np.isin(grid, list(CellType._value2member_map_)).all():
+        raise ValueError(f"unknown cell type in {file_name}")
+
+    spawns = [divmod(int(cell), size) for cell in pairs[:, 0]]
+    exits = [(-1, -1) if exit == _NO_EXIT else divmod(int(exit), size) for exit in pairs[:, 1]]
+    return grid, capacity, spawns, exits, size
+
+
+def read_plan(file_name: str) -> tuple[NDArray, list[tuple[int, int]], list[tuple[int, int]], int]:
+    """
+    Read a GridConfig export, JSON of any schema version or binary.
+
+    Args:
+        file_name (str): Path to the export.
+
+    Returns:
+        tuple: The uint8 grid of CellType codes indexed ``[y, x]``, the spawn
+        cells, the exit paired with each spawn, and the side length.
+    """
+    if _is_binary(file_name):
+        grid, _, spawns, exits, size = read_binary_plan(file_name)
+        return grid, spawns, exits, size
+
+    with open(file_name, 'r') as f:
+        block_data = json.load(f)
+
+    version = block_data.get("schemaVersion", 1)
+    size = block_data["gridSize"]
+    grid = np.full((size, size), CellType.OPEN, dtype=np.uint8)
+    spawns = []
+    exits = []
+    for key, value in block_data["data"].items():
+        x, y = tuple(map(int, key.split(',')))
+        grid[y, x] = translate(value["type"], version)
+        if value["associatedExit"] is not None:
+            ex, ey = value["associatedExit"]
+            spawns.append((y, x))
+            exits.append((ey, ex))
+
+    return grid, spawns, exits, size
+
+
+def read_capacity(file_name: str, grid: NDArray) -> NDArray:
+    """
+    Read the seats per cell of a floor plan.
+
+    Args:
+        file_name (str): Path to the GridConfig export.
+        grid (NDArray): Its cell types, as returned by ``read_plan``.
+
+    Returns:
+        NDArray: uint8 grid, the default CAPACITY of each cell type except
+        where a cell gives its own ``capacity``.
+    """
+    if _is_binary(file_name):
+        seats = read_binary_plan(file_name)[1]
+        if (seats > 0).any() and not IS_TARGET[grid[seats > 0]].all():
+            raise ValueError(f"{file_name} has a capacity on a cell that is not a study table or chair")
+        return np.where(seats > 0, seats, CAPACITY[grid]).astype(np.uint8)
+
+    with open(file_name, 'r') as f:
+        block_data = json.load(f)
+
+    capacity = CAPACITY[grid]
+    for key, value in block_data["data"].items():
+        if value.get("capacity") is not None:
+            x, y = tuple(map(int, key.split(',')))
+            if not IS_TARGET[grid[y, x]]:
+                raise ValueError(f"cell {key} has a capacity but is not a study table or chair")
+            capacity[y, x] = value["capacity"]
+    return capacity
+
+
+@dataclass
+class CellMasks:
+    """Per-cell masks of a floor plan, each shaped like the grid."""
+    walkable: NDArray
+    is_target: NDArray
+    is_work: NDArray
+    is_social: NDArray
+    capacity: NDArray
+
+    @classmethod
+    def from_grid(cls, grid: NDArray, capacity: NDArray | None = None) -> "CellMasks":
+        """Masks of ``grid``, with per-cell ``capacity`` from ``read_capacity`` if given."""
+        grid = np.asarray(grid, dtype=np.uint8)
+        if capacity is None:
+            capacity = CAPACITY[grid]
+        return cls(WALKABLE[grid], IS_TARGET[grid], IS_WORK[grid], IS_SOCIAL[grid],
+                   np.asarray(capacity, dtype=np.uint8))
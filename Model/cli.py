@@ -0,0 +1,305 @@
+"""
+Command-line entry point for batch runs.
+
+Subcommands:
+
+    run           simulate a floor plan and write its passage heatmap
+    sweep         run replicates for several agent counts and aggregate them
+    bench         time start-up, the first step and the steps per second
+    compile-plan  precompute a plan's masks, reachability and routing table
+
+Only the standard library is imported up front. numpy and the models are
+imported by the subcommands that use them, mesa and networkx only for
+``--model mesa``, and matplotlib only to write a PNG, always with the Agg
+backend so batch jobs never need a display. With ``--backend auto`` the
+kernels only use numba for runs long enough to win back the half second its
+import and compilation take; shorter runs step with numpy from the start.
+
+JSON and binary plans are compiled on first use and cached as .npz files
+under ~/.cache/indoor-abm, keyed by a hash of the plan file. Later runs load
+the grid, the repaired entrances and exits, and the routing table from the
+cache instead of parsing, checking and routing the plan again. A compiled
+plan written by ``compile-plan`` can be passed anywhere a plan is expected.
+
+Usage:
+    python cli.py run floor_plan.json [--model kernel|mesa] [--agents N] [--steps N] [--output heatmap.png]
+    python cli.py sweep floor_plan.json --agents 50 100 200 [--replicates R] [--output-dir DIR]
+    python cli.py bench floor_plan.json [--agents N] [--steps N]
+    python cli.py compile-plan floor_plan.json [--output plan.npz]
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import sys
+import time
+
+_STARTED = time.perf_counter()
+
+# Bump when the arrays stored in compiled plans change
+_PLAN_FORMAT = 1
+
+# Agent-steps from which numba's faster steps make up for its start-up cost
+_NUMBA_PAYOFF = 2_000_000
+
+
+def compile_plan(path: str) -> dict:
+    """
+    Everything the models need from a floor plan, as arrays.
+
+    Args:
+        path (str): A GridConfig export, JSON or binary.
+
+    Returns:
+        dict: ``grid``, ``capacity``, the repaired ``spawns`` and ``exits``
+        as (n, 2) arrays, the component ``labels``, and the routing table's
+        ``goal_index`` and ``next_step``.
+    """
+    import numpy as np
+
+    from analysis import analyze
+    from cells import read_capacity, read_plan
+    from kernels import KernelModel
+
+    grid, spawns, exits, _ = read_plan(path)
+    capacity = read_capacity(path, grid)
+    analysis = analyze(grid, spawns, exits)
+    for issue in analysis.issues:
+        print(f"{path}: {issue}", file=sys.stderr)
+
+    # Solve the routes exactly as KernelModel would for this plan
+    routes = KernelModel(grid, analysis.spawns, analysis.exits, 0, capacity=capacity, backend="numpy",
+                         labels=analysis.labels).routes
+    return {
+        "format": np.asarray(_PLAN_FORMAT),
+        "grid": grid,
+        "capacity": capacity,
+        "spawns": np.array(analysis.spawns, dtype=np.int32).reshape(-1, 2),
+        "exits": np.array(analysis.exits, dtype=np.int32).reshape(-1, 2),
+        "labels": analysis.labels,
+        "goal_index": routes.goal_index,
+        "next_step": routes.next_step,
+    }
+
+
+def save_plan(arrays: dict, path: str):
+    """Write a compiled plan, replacing ``path`` atomically."""
+    import numpy as np
+
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(temporary, path)
+
+
+def load_plan(path: str, cache_dir=None) -> dict:
+    """
+    A compiled plan for ``path``, from the cache when the plan is unchanged.
+
+    Args:
+        path (str): A compiled .npz plan, or a JSON or binary export.
+        cache_dir (str | None): Defaults to ``~/.cache/indoor-abm``.
+    """
+    import numpy as np
+
+    if path.endswith(".npz"):
+        cached = path
+    else:
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read())
+        digest.update(f"plan format {_PLAN_FORMAT}".encode())
+        cache_dir = cache_dir or os.path.join(os.path.expanduser("~"), ".cache", "indoor-abm")
+        cached = os.path.join(cache_dir, f"plan-{digest.hexdigest()}.npz")
+        if not os.path.exists(cached):
+            os.makedirs(cache_dir, exist_ok=True)
+            save_plan(compile_plan(path), cached)
+
+    with np.load(cached) as data:
+        if int(data["format"]) != _PLAN_FORMAT:
+            raise ValueError(f"{cached} is not a version {_PLAN_FORMAT} compiled plan; compile it again")
+        return {key: data[key] for key in data.files}
+
+
+def kernel_model(plan: dict, agents: int, seed=None, backend="auto", replicates=None):
+    """A KernelModel, or an EnsembleModel with ``replicates``, on a compiled plan."""
+    from kernels import RoutingTable
+
+    routes = RoutingTable.from_arrays(plan["goal_index"], plan["next_step"])
+    args = (plan["grid"], [tuple(s) for s in plan["spawns"]], [tuple(e) for e in plan["exits"]], agents)
+    if replicates is None:
+        from kernels import KernelModel
+        return KernelModel(*args, seed=seed, backend=backend, capacity=plan["capacity"], routes=routes,
+                           labels=plan["labels"])
+
+    from ensemble import EnsembleModel
+    return EnsembleModel(*args, replicates, seed=seed, backend=backend, capacity=plan["capacity"], routes=routes,
+                         labels=plan["labels"])
+
+
+def mesa_model(plan: dict, agents: int, seed=None):
+    """The Mesa IndoorModel on a compiled plan."""
+    import main
+
+    main.install_plan(plan["grid"], [tuple(map(int, s)) for s in plan["spawns"]],
+                      [tuple(map(int, e)) for e in plan["exits"]], plan["capacity"])
+    if seed is not None:
+        main.random.seed(seed)
+    return main.IndoorModel(agents, main.w, main.h, seed=seed)
+
+
+def write_heatmap(passages, path: str, title="Agent Passage Heatmap"):
+    """Write passages as .npy, .npz or a PNG image, chosen by the extension of ``path``."""
+    import numpy as np
+
+    if path.endswith(".npy"):
+        np.save(path, passages)
+    elif path.endswith(".npz"):
+        np.savez(path, passages=passages)
+    else:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
+        fig, ax = plt.subplots()
+        image = ax.imshow(passages, cmap="viridis", interpolation="none")
+        fig.colorbar(image, ax=ax, label="Passages Count")
+        ax.set_title(title)
+        fig.savefig(path, dpi=150)
+        plt.close(fig)
+
+
+def _backend(args, agents, replicates=1):
+    """The kernel backend for a run, numpy for ``auto`` runs too short to pay for numba."""
+    if args.backend == "auto" and agents * args.steps * replicates < _NUMBA_PAYOFF:
+        return "numpy"
+    return args.backend
+
+
+def _build(args, plan):
+    if args.model == "mesa":
+        return mesa_model(plan, args.agents, args.seed)
+    return kernel_model(plan, args.agents, args.seed, _backend(args, args.agents))
+
+
+def _quiet(verbose):
+    # The Mesa agents print every action
+    return contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+
+def run(args):
+    from runner import RunController
+
+    plan = load_plan(args.floor_plan, args.cache_dir)
+    model = _build(args, plan)
+    controller = RunController(model, max_steps=args.steps)
+    with _quiet(args.verbose):
+        controller.run()
+
+    passages = model.passages
+    print(f"Stopped after {model.schedule.steps} steps ({controller.reason}): "
+          f"{int(passages.sum())} passages, {model.schedule.get_agent_count()} agents inside")
+    if args.output:
+        write_heatmap(passages, args.output)
+
+
+def sweep(args):
+    from runner import RunController
+    from stats import SweepAggregator
+
+    plan = load_plan(args.floor_plan, args.cache_dir)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    for agents in args.agents:
+        model = kernel_model(plan, agents, args.seed, _backend(args, agents, args.replicates),
+                             replicates=args.replicates)
+        RunController(model, max_steps=args.steps).run()
+
+        aggregator = SweepAggregator()
+        for passages, inside in zip(model.passages, model.inside()):
+            aggregator.add(passages=passages, total=passages.sum(), inside=inside)
+        total, inside = aggregator.stats["total"], aggregator.stats["inside"]
+        print(f"{agents} agents: {total.mean:.1f} ± {total.std:.1f} passages, "
+              f"{inside.mean:.1f} ± {inside.std:.1f} inside after {model.schedule.steps} steps")
+        if args.output_dir:
+            aggregator.save(os.path.join(args.output_dir, f"agents-{agents}.npz"))
+
+
+def bench(args):
+    plan = load_plan(args.floor_plan, args.cache_dir)
+    loaded = time.perf_counter()
+    model = _build(args, plan)
+    built = time.perf_counter()
+    with _quiet(False):
+        model.step()
+        first = time.perf_counter()
+        for _ in range(args.steps - 1):
+            model.step()
+    done = time.perf_counter()
+
+    print(f"plan loaded     {(loaded - _STARTED) * 1e3:8.1f} ms after start")
+    print(f"model built     {(built - _STARTED) * 1e3:8.1f} ms after start")
+    print(f"first step done {(first - _STARTED) * 1e3:8.1f} ms after start")
+    if args.steps > 1:
+        print(f"steps per second {(args.steps - 1) / (done - first):8.1f}")
+    heavy = [name for name in ("matplotlib", "networkx", "mesa", "numba") if name in sys.modules]
+    print(f"heavy modules imported: {', '.join(heavy) or 'none'}")
+
+
+def compile_command(args):
+    output = args.output or os.path.splitext(args.floor_plan)[0] + ".npz"
+    save_plan(compile_plan(args.floor_plan), output)
+    print(f"Wrote {output}")
+
+
+def _parser():
+    parser = argparse.ArgumentParser(description="Run the indoor models from the command line.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_plan(command):
+        command.add_argument("floor_plan", help="GridConfig export (.json or .abmp) or compiled plan (.npz)")
+        command.add_argument("--cache-dir", default=None)
+        command.add_argument("--seed", type=int, default=None)
+        command.add_argument("--backend", default="auto", choices=["auto", "numba", "numpy"],
+                             help="kernel backend")
+
+    run_parser = commands.add_parser("run", help="simulate a floor plan")
+    add_plan(run_parser)
+    run_parser.add_argument("--model", default="kernel", choices=["kernel", "mesa"])
+    run_parser.add_argument("--agents", type=int, default=20)
+    run_parser.add_argument("--steps", type=int, default=100)
+    run_parser.add_argument("--output", default=None, help="heatmap file: .png, .npy or .npz")
+    run_parser.add_argument("--verbose", action="store_true")
+    run_parser.set_defaults(handler=run)
+
+    sweep_parser = commands.add_parser("sweep", help="aggregate replicates over agent counts")
+    add_plan(sweep_parser)
+    sweep_parser.add_argument("--agents", type=int, nargs="+", default=[20])
+    sweep_parser.add_argument("--replicates", type=int, default=16)
+    sweep_parser.add_argument("--steps", type=int, default=100)
+    sweep_parser.add_argument("--output-dir", default=None, help="write one SweepAggregator file per agent count")
+    sweep_parser.set_defaults(handler=sweep)
+
+    bench_parser = commands.add_parser("bench", help="time start-up and stepping")
+    add_plan(bench_parser)
+    bench_parser.add_argument("--model", default="kernel", choices=["kernel", "mesa"])
+    bench_parser.add_argument("--agents", type=int, default=20)
+    bench_parser.add_argument("--steps", type=int, default=100)
+    bench_parser.set_defaults(handler=bench)
+
+    compile_parser = commands.add_parser("compile-plan", help="precompute a floor plan")
+    compile_parser.add_argument("floor_plan")
+    compile_parser.add_argument("--output", default=None)
+    compile_parser.set_defaults(handler=compile_command)
+    return parser
+
+
+def main(argv=None):
+    args = _parser().parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Passage grids and trajectories for chosen groups of agents.
+
+A Cohort names which agents to follow: an explicit set of IDs, a sampling
+rate, a predicate on the agent, or any combination of them. A CohortTracker
+attached to a model keeps, for each cohort, its own passages grid and the
+recent trajectory of its members. Members are collected as agents enter the
+model, so each step costs one scatter-add over the cohort's positions and
+memory grows with the cohort, not with the population.
+
+Usage:
+    model.cohorts = CohortTracker(model, [
+        Cohort("sample", rate=0.05),
+        Cohort("east", predicate=lambda agent: agent.pos[1] > 10),
+    ], trajectory_length=500)
+    ...
+    model.cohorts.passages["sample"]
+"""
+
+from collections import deque
+
+import numpy as np
+
+
+_MASK = (1 << 64) - 1
+
+
+def _unit_hash(value: int, seed: int) -> float:
+    """Map an integer to [0, 1) with the splitmix64 finalizer."""
+    z = (value * 0x9E3779B97F4A7C15 + seed) & _MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK
+    return ((z ^ (z >> 31)) >> 11) / float(1 << 53)
+
+
+class Cohort:
+    """
+    A group of agents to trace.
+
+    Membership is decided once, when an agent enters the model. Sampling by
+    ``rate`` hashes the agent's ID, so the same agents are picked in every
+    run with the same ``seed``.
+
+    Args:
+        name (str): Key of the cohort's results.
+        ids (iterable | None): Agent IDs to include.
+        rate (float | None): Share of agents to sample.
+        predicate (callable | None): Function of the agent returning whether
+            to include it.
+        seed (int): Seed for sampling by ``rate``.
+    """
+
+    def __init__(self, name, ids=None, rate=None, predicate=None, seed=0):
+        self.name = name
+        self.ids = None if ids is None else frozenset(ids)
+        self.rate = rate
+        self.predicate = predicate
+        self.seed = seed
+
+    def selects(self, agent) -> bool:
+        """Whether ``agent`` belongs to the cohort; all given criteria must hold."""
+        if self.ids is not None and agent.unique_id not in self.ids:
+            return False
+        if self.rate is not None and _unit_hash(agent.unique_id, self.seed) >= self.rate:
+            return False
+        if self.predicate is not None and not self.predicate(agent):
+            return False
+        return True
+
+
+class CohortTracker:
+    """
+    Per-cohort passages and trajectories of a running model.
+
+    The model reports agents through ``add`` when they are placed and
+    ``remove`` when they leave, and calls ``record`` at the end of each step.
+    A cohort's passages count the cells its members occupy after every step,
+    plus the exit cell they leave through.
+
+    Args:
+        model: The model to follow; agents already in its schedule are
+            checked for membership straight away.
+        cohorts (list[Cohort]): The cohorts to trace.
+        trajectory_length (int): Steps of positions kept per cohort, 0 to
+            keep no trajectories.
+    """
+
+    def __init__(self, model, cohorts, trajectory_length=0):
+        self.model = model
+        self.cohorts = {cohort.name: cohort for cohort in cohorts}
+        self.members = {name: {} for name in self.cohorts}
+        self.passages = {name: np.zeros((model.width, model.height), dtype=np.int32) for name in self.cohorts}
+        self.trajectories = {name: deque(maxlen=trajectory_length) for name in self.cohorts}
+        self.trajectory_length = trajectory_length
+
+        for agent in model.schedule.agents:
+            self.add(agent)
+
+    def add(self, agent):
+        """Check an agent entering the model against every cohort."""
+        for name, cohort in self.cohorts.items():
+            if cohort.selects(agent):
+                self.members[name][agent.unique_id] = agent
+
+    def remove(self, agent):
+        """Count the cell an agent leaves from and stop following it."""
+        for name, members in self.members.items():
+            if members.pop(agent.unique_id, None) is not None and agent.pos is not None:
+                self.passages[name][agent.pos] += 1
+
+    def record(self, steps=1):
+        """
+        Add the members' current cells to the passages, weighted by the
+        number of steps they were held for, and store the positions.
+        """
+        for name, members in self.members.items():
+            if not members:
+                continue
+            positions = np.array([agent.pos for agent in members.values()], dtype=np.intp)
+            np.add.at(self.passages[name], (positions[:, 0], positions[:, 1]), steps)
+
+            if self.trajectory_length:
+                ids = np.fromiter(members.keys(), dtype=np.uint32, count=len(members))
+                self.trajectories[name].append((self.model.schedule.steps, ids, positions.astype(np.uint16)))
+
+    def trajectory(self, name, agent_id) -> np.ndarray:
+        """
+        The kept trajectory of one member.
+
+        Returns:
+            NDArray: Rows of (step, x, y), oldest first.
+        """
+        rows = []
+        for step, ids, positions in self.trajectories[name]:
+            index = np.flatnonzero(ids == agent_id)
+            if len(index):
+                rows.append((step, *positions[index[0]]))
+        return np.array(rows, dtype=int).reshape(-1, 3)
@@ -0,0 +1,115 @@
+"""
+Ensembles of IndoorModel replicates simulated as one batch.
+
+Parameter studies need many replicates of the same floor plan. EnsembleModel
+runs R of them in one KernelModel with a leading replicate axis: positions
+(R, N, 2), noise (R, W, H) and passages (R, W, H). The routing table and cell
+masks are built once and shared, so each step costs one pass over R * N
+agents instead of R separate models.
+
+Besides the per-replicate results it keeps a running mean and variance of
+the noise field over all replicates and steps, so noise statistics come out
+of a run without storing the noise history.
+
+Usage:
+    python ensemble.py floor_plan.json [--replicates R] [--agents N] [--steps N] [--output results.npz]
+"""
+
+import argparse
+
+import numpy as np
+
+from kernels import KernelModel
+from stats import RunningStats
+
+
+class EnsembleModel(KernelModel):
+    """
+    R independent replicates of KernelModel stepped together.
+
+    Args:
+        attribute_grid (NDArray): Cell types, as loaded by ``parse_block_data``.
+        spawn_points (list): Entrance cells.
+        exit_points (list): Exit cells.
+        num_agents (int): Students per replicate.
+        replicates (int): Number of replicates.
+        seed (int | None): Seed for all random draws.
+        backend (str): "numba", "numpy" or "auto".
+        capacity (NDArray | None): Students per cell at targets.
+        routes (RoutingTable | None): A routing table already solved for the plan.
+        acoustics (Acoustics | None): Spread noise around walls, see KernelModel.
+        labels (NDArray | None): Walkable component of every cell, see KernelModel.
+    """
+
+    def __init__(self, attribute_grid, spawn_points, exit_points, num_agents, replicates,
+                 seed=None, backend="auto", capacity=None, routes=None, acoustics=None, labels=None):
+        super().__init__(attribute_grid, spawn_points, exit_points, num_agents, seed=seed, backend=backend,
+                         replicates=replicates, capacity=capacity, routes=routes, acoustics=acoustics,
+                         labels=labels)
+        self.num_agents = num_agents
+
+        # Running moments of the noise field over replicates and steps
+        self.noise_stats = RunningStats((self.width, self.height))
+
+        self.population = []
+
+    @property
+    def positions(self):
+        """Agent positions as (replicate, agent, 2); agents that left keep their exit cell."""
+        return self.pos.reshape(self.replicates, self.num_agents, 2)
+
+    def inside(self):
+        """Agents still in the building, per replicate."""
+        return self.alive.reshape(self.replicates, self.num_agents).sum(axis=1)
+
+    def step(self):
+        """Advance every replicate by one step."""
+        super().step()
+        self.population.append(self.inside())
+        self.noise_stats.update_batch(self.noise)
+
+    def results(self) -> dict:
+        """
+        Per-replicate outputs and the across-replicate summaries.
+
+        Returns:
+            dict: Arrays keyed by name, ready for ``np.savez``.
+        """
+        return {
+            "passages": self.passages,
+            "inside": self.inside(),
+            "population": np.array(self.population).reshape(-1, self.replicates),
+            "passages_mean": self.passages.mean(axis=0),
+            "passages_variance": self.passages.var(axis=0, ddof=1) if self.replicates > 1
+            else np.zeros((self.width, self.height)),
+            "noise_mean": self.noise_stats.mean,
+            "noise_variance": self.noise_stats.variance,
+        }
+
+
+if __name__ == "__main__":
+    import main
+
+    parser = argparse.ArgumentParser(description="Run many replicates of a floor plan as one batch.")
+    parser.add_argument("floor_plan")
+    parser.add_argument("--replicates", type=int, default=100)
+    parser.add_argument("--agents", type=int, default=20)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--backend", default="auto", choices=["auto", "numba", "numpy"])
+    parser.add_argument("--output", default=None, help="write the results to this .npz file")
+    args = parser.parse_args()
+
+    main.load_floor_plan(args.floor_plan)
+    model = EnsembleModel(main.attribute_grid, main.spawn_points, main.exit_points, args.agents,
+                          args.replicates, seed=args.seed, backend=args.backend,
+                          capacity=main.cell_masks.capacity, labels=main.plan_analysis.labels)
+    for _ in range(args.steps):
+        model.step()
+
+    results = model.results()
+    inside = results["inside"]
+    print(f"{args.replicates} replicates, {args.steps} steps: "
+          f"{inside.mean():.1f} +/- {inside.std():.1f} agents still inside")
+    if args.output:
+        np.savez_compressed(args.output, **results)
@@ -0,0 +1,187 @@
+"""
+Incremental frame encoding for a running IndoorModel.
+
+A frame is one little-endian binary message. Every section is 4-byte
+aligned so a browser can view it with typed arrays without copying:
+
+    header    magic "ABMF", version u8, flags u8, 2 pad bytes,
+              width u16, height u16, step u32
+    agents    count u32, ids u32[count], x u16[count], y u16[count]
+    removed   count u32, ids u32[count]
+    noise     count u32, cells u32[count], values f32[count]
+    passages  count u32, cells u32[count], values u32[count]
+
+Cells are flat indices ``x * height + y`` in model coordinates. A keyframe
+carries the full state; a delta frame only the agents that moved or spawned,
+the agents that left, and the cells whose values changed.
+"""
+
+import struct
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.typing import NDArray
+
+FRAME_MAGIC = b"ABMF"
+FRAME_VERSION = 1
+FLAG_KEYFRAME = 1
+
+_HEADER = struct.Struct("<4sBBxxHHI")
+_COUNT = struct.Struct("<I")
+
+
+@dataclass
+class Snapshot:
+    """Positions and fields of a model at the end of one step."""
+
+    step: int
+    ids: NDArray          # uint32, sorted
+    positions: NDArray    # uint16, shape (n, 2)
+    noise: NDArray        # float32, shape (width, height)
+    passages: NDArray     # uint32, shape (width, height)
+
+
+@dataclass
+class Delta:
+    """Everything that changed between two snapshots."""
+
+    step: int
+    ids: NDArray              # agents that moved or spawned
+    positions: NDArray        # their new positions
+    previous: NDArray         # their old positions, -1 for spawns
+    removed: NDArray          # agents that left the grid
+    noise_cells: NDArray
+    noise_values: NDArray
+    passage_cells: NDArray
+    passage_values: NDArray
+
+
+def take_snapshot(model) -> Snapshot:
+    """
+    Copy the observable state of a model.
+
+    Args:
+        model: An IndoorModel (or anything with ``schedule``, ``noise`` and
+            ``passages``).
+
+    Returns:
+        Snapshot: State sorted by agent id.
+    """
+    agents = [agent for agent in model.schedule.agents if agent.pos is not None]
+    ids = np.fromiter((agent.unique_id for agent in agents), dtype=np.uint32, count=len(agents))
+    positions = np.array([agent.pos for agent in agents], dtype=np.uint16).reshape(-1, 2)
+    order = np.argsort(ids)
+
+    return Snapshot(
+        step=model.schedule.steps,
+        ids=ids[order],
+        positions=positions[order],
+        noise=np.array(model.noise, dtype=np.float32),
+        passages=np.array(model.passages, dtype=np.uint32),
+    )
+
+
+def diff(reference: Snapshot, current: Snapshot, noise_epsilon: float = 0.0) -> Delta:
+    """
+    Compute the changes from ``reference`` to ``current`` and fold them into
+    ``reference``.
+
+    Noise changes at or below ``noise_epsilon`` are left out of the delta and
+    left unapplied in the reference, so small drifts accumulate until they
+    cross the threshold instead of being lost.
+
+    Args:
+        reference (Snapshot): State the receiver already has; updated in place.
+        current (Snapshot): State after the latest step.
+        noise_epsilon (float): Smallest noise change worth sending.
+
+    Returns:
+        Delta: The changes.
+    """
+    _, ref_idx, cur_idx = np.intersect1d(reference.ids, current.ids, assume_unique=True, return_indices=True)
+    moved = np.any(reference.positions[ref_idx] != current.positions[cur_idx], axis=1)
+
+    spawned = np.ones(len(current.ids), dtype=bool)
+    spawned[cur_idx] = False
+    gone = np.ones(len(reference.ids), dtype=bool)
+    gone[ref_idx] = False
+
+    changed = np.concatenate([cur_idx[moved], np.flatnonzero(spawned)])
+    previous = np.full((len(changed), 2), -1, dtype=np.int32)
+    previous[:moved.sum()] = reference.positions[ref_idx[moved]]
+
+    noise_cells = np.flatnonzero(np.abs(current.noise - reference.noise) > noise_epsilon).astype(np.uint32)
+    passage_cells = np.flatnonzero(current.passages != reference.passages).astype(np.uint32)
+
+    delta = Delta(
+        step=current.step,
+        ids=current.ids[changed],
+        positions=current.positions[changed],
+        previous=previous,
+        removed=reference.ids[gone],
+        noise_cells=noise_cells,
+        noise_values=current.noise.ravel()[noise_cells],
+        passage_cells=passage_cells,
+        passage_values=current.passages.ravel()[passage_cells],
+    )
+
+    reference.step = current.step
+    reference.ids = current.ids
+    reference.positions = current.positions
+    reference.noise.ravel()[noise_cells] = delta.noise_values
+    reference.passages = current.passages
+    return delta
+
+
+def _pack(header: bytes, *sections: tuple[NDArray, ...]) -> bytes:
+    parts = [header]
+    for arrays in sections:
+        parts.append(_COUNT.pack(len(arrays[0])))
+        parts.extend(np.ascontiguousarray(a, dtype=a.dtype.newbyteorder("<")).tobytes() for a in arrays)
+    return b"".join(parts)
+
+
+def encode_keyframe(snapshot: Snapshot) -> bytes:
+    """Encode the full state of ``snapshot`` as one frame."""
+    width, height = snapshot.noise.shape
+    noise_cells = np.flatnonzero(snapshot.noise).astype(np.uint32)
+    passage_cells = np.flatnonzero(snapshot.passages).astype(np.uint32)
+
+    return _pack(
+        _HEADER.pack(FRAME_MAGIC, FRAME_VERSION, FLAG_KEYFRAME, width, height, snapshot.step),
+        (snapshot.ids, snapshot.positions[:, 0], snapshot.positions[:, 1]),
+        (np.empty(0, dtype=np.uint32),),
+        (noise_cells, snapshot.noise.ravel()[noise_cells]),
+        (passage_cells, snapshot.passages.ravel()[passage_cells]),
+    )
+
+
+def encode_delta(delta: Delta, width: int, height: int) -> bytes:
+    """Encode ``delta`` as one frame."""
+    return _pack(
+        _HEADER.pack(FRAME_MAGIC, FRAME_VERSION, 0, width, height, delta.step),
+        (delta.ids, delta.positions[:, 0], delta.positions[:, 1]),
+        (delta.removed,),
+        (delta.noise_cells, delta.noise_values),
+        (delta.passage_cells, delta.passage_values),
+    )
+
+
+class FrameEncoder:
+    """
+    Turns successive model states into a keyframe followed by delta frames.
+    """
+
+    def __init__(self, model, noise_epsilon: float = 1e-3):
+        self.model = model
+        self.noise_epsilon = noise_epsilon
+        self.reference = take_snapshot(model)
+
+    def keyframe(self) -> bytes:
+        """Encode the state the deltas so far add up to."""
+        return encode_keyframe(self.reference)
+
+    def delta(self) -> bytes:
+        """Encode the changes since the previous call."""
+        width, height = self.reference.noise.shape
+        return encode_delta(diff(self.reference, take_snapshot(self.model), self.noise_epsilon), width, height)
@@ -0,0 +1,613 @@
+"""
+Array-backed kernels for the IndoorModel step.
+
+KernelModel keeps the whole population in flat arrays and runs the
+``StudentAgent`` step (look, move, socialize, lose focus) for everyone at
+once. Walking uses a routing table precomputed from the floor plan instead of
+a Dijkstra search per agent per step.
+
+Two backends share the state:
+
+    numba   one compiled loop over the agents in random order, as in the
+            Mesa model
+    numpy   the same rules as whole-array operations
+
+Seats at targets are claimed and granted as in seating.py: looks see the free
+seats at the start of the step and the claims are settled at its end.
+
+The numba backend is used when numba is installed. numba itself is only
+imported the first time the compiled loop runs, so the numpy backend starts
+without paying for it. ``check_equivalence`` runs both this and the Mesa
+model and compares their statistics.
+
+Usage:
+    python kernels.py floor_plan.json [--agents N] [--steps N] [--runs N]
+"""
+
+import argparse
+import contextlib
+import functools
+import importlib.util
+import io
+import time
+
+import numpy as np
+
+HAS_NUMBA = importlib.util.find_spec("numba") is not None
+
+from cells import CAPACITY, IS_SOCIAL, IS_TARGET, WALKABLE
+from noise import NOISE_EPSILON
+
+# Routing table codes: the index of the step in _OFFSETS, or one of these
+STAY = 4
+NO_PATH = 255
+_OFFSETS = np.array([(1, 0), (-1, 0), (0, 1), (0, -1), (0, 0)], dtype=np.int64)
+
+FOCUS = 50
+DISTRACTABILITY = 2
+LOUDNESS = 2
+NOISE_DECAY = 0.1
+
+
+def _jit(func):
+    if not HAS_NUMBA:
+        return func
+    compiled = None
+
+    @functools.wraps(func)
+    def run(*args):
+        nonlocal compiled
+        if compiled is None:
+            import numba
+            compiled = numba.njit(cache=True)(func)
+        return compiled(*args)
+    return run
+
+
+def look_directions():
+    """
+    The (dx, dy) step a look takes for each angle 0-359: the nearest of the
+    eight compass directions, so a line of sight visits every cell along it
+    and 45 degrees of angles map to each direction.
+
+    Returns:
+        NDArray: int64 array of shape (360, 2).
+    """
+    compass = np.array([(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)], dtype=np.int64)
+    sectors = np.floor((np.arange(360) + 22.5) / 45).astype(np.int64) % 8
+    return compass[sectors]
+
+
+def stamp_profile(loudness, epsilon=NOISE_EPSILON):
+    """
+    One axis of the free-space noise stamp. ``DenseNoiseField.stamp`` adds
+    ``loudness * profile[dx] * profile[dy]`` around the source over a square
+    window, so stamping many sources is two 1-D convolutions.
+
+    Returns:
+        NDArray: float32 weights for offsets -radius..radius.
+    """
+    sigma = 3 * loudness
+    radius = int(np.ceil(sigma * np.sqrt(2 * np.log(loudness / epsilon))))
+    offsets = np.arange(-radius, radius + 1)
+    return np.exp(-offsets ** 2 / (2 * sigma ** 2)).astype(np.float32)
+
+
+def _convolve(grids, profile):
+    """Convolve (..., width, height) grids with ``profile`` along both grid axes, zero outside."""
+    radius = len(profile) // 2
+    width, height = grids.shape[-2:]
+    pad = [(0, 0)] * (grids.ndim - 2)
+
+    padded = np.pad(grids, pad + [(radius, radius), (0, 0)])
+    rows = np.zeros(grids.shape, dtype=np.float32)
+    for k, weight in enumerate(profile):
+        rows += weight * padded[..., k:k + width, :]
+
+    padded = np.pad(rows, pad + [(0, 0), (radius, radius)])
+    out = np.zeros(grids.shape, dtype=np.float32)
+    for k, weight in enumerate(profile):
+        out += weight * padded[..., k:k + height]
+    return out
+
+
+def _distance_fields(walkable, goals):
+    """Breadth-first distances on the 4-connected walkable grid from each goal."""
+    width, height = walkable.shape
+    dist = np.full((len(goals), width, height), -1, dtype=np.int32)
+    frontier = np.zeros((len(goals), width, height), dtype=bool)
+    frontier[np.arange(len(goals)), goals[:, 0], goals[:, 1]] = True
+    dist[frontier] = 0
+
+    d = 0
+    while frontier.any():
+        d += 1
+        grown = np.zeros_like(frontier)
+        grown[:, 1:] |= frontier[:, :-1]
+        grown[:, :-1] |= frontier[:, 1:]
+        grown[:, :, 1:] |= frontier[:, :, :-1]
+        grown[:, :, :-1] |= frontier[:, :, 1:]
+        frontier = grown & walkable & (dist < 0)
+        dist[frontier] = d
+    return dist
+
+
+class RoutingTable:
+    """
+    Next step towards every goal from every cell.
+
+    Args:
+        walkable (NDArray): bool grid, False for walls.
+        goals (list): Cells agents may walk to (targets and exits).
+        batch (int): Goals solved together, bounds the temporary memory.
+    """
+
+    def __init__(self, walkable, goals, batch=64):
+        width, height = walkable.shape
+        goals = np.asarray(goals, dtype=np.int64).reshape(-1, 2)
+
+        self.goal_index = np.full(width * height, -1, dtype=np.int32)
+        self.goal_index[goals[:, 0] * height + goals[:, 1]] = np.arange(len(goals))
+        self.next_step = np.full((len(goals), width * height), NO_PATH, dtype=np.uint8)
+
+        for start in range(0, len(goals), batch):
+            dist = _distance_fields(walkable, goals[start:start + batch])
+            padded = np.pad(dist, ((0, 0), (1, 1), (1, 1)), constant_values=-1)
+            codes = np.full(dist.shape, NO_PATH, dtype=np.uint8)
+            codes[dist == 0] = STAY
+
+            # The first neighbour one step closer to the goal, in _OFFSETS order
+            for code in reversed(range(4)):
+                dx, dy = _OFFSETS[code]
+                neighbour = padded[:, 1 + dx:1 + dx + width, 1 + dy:1 + dy + height]
+                codes[(dist > 0) & (neighbour == dist - 1)] = code
+
+            self.next_step[start:start + len(dist)] = codes.reshape(len(dist), -1)
+
+    @classmethod
+    def from_arrays(cls, goal_index, next_step) -> "RoutingTable":
+        """A table saved from ``goal_index`` and ``next_step``, without solving it again."""
+        routes = cls.__new__(cls)
+        routes.goal_index = np.asarray(goal_index, dtype=np.int32)
+        routes.next_step = np.asarray(next_step, dtype=np.uint8)
+        return routes
+
+
+@_jit
+def _step_sequential(order, pos, alive, focus, has_target, goal, previous, claimed, seat, base, thetas, directions,
+                     offsets, is_wall, is_target, is_exit, free, next_step, goal_index, passages, width, height):
+    for i in order:
+        if not alive[i]:
+            continue
+        b = base[i]
+        x = pos[i, 0]
+        y = pos[i, 1]
+
+        if not has_target[i] and focus[i] > 0:
+            dx = directions[thetas[i], 0]
+            dy = directions[thetas[i], 1]
+            cx = x
+            cy = y
+            while 0 <= cx < width and 0 <= cy < height:
+                c = cx * height + cy
+                if is_wall[c]:
+                    break
+                if is_target[c]:
+                    if free[b + c] > 0:
+                        previous[i] = goal[i]
+                        goal[i] = c
+                        has_target[i] = True
+                        claimed[i] = True
+                    break
+                cx += dx
+                cy += dy
+
+        cell = x * height + y
+        code = next_step[goal_index[goal[i]], cell]
+        if code == NO_PATH:
+            # Walled off from a target: drop it, and any seat there, and
+            # search again, as StudentAgent.move does
+            if not is_exit[goal[i]]:
+                goal[i] = previous[i]
+                claimed[i] = False
+                if seat[i] >= 0:
+                    free[seat[i]] += 1
+                    seat[i] = -1
+            has_target[i] = False
+            continue
+
+        x += offsets[code, 0]
+        y += offsets[code, 1]
+        cell = x * height + y
+        passages[b + cell] += 1
+        pos[i, 0] = x
+        pos[i, 1] = y
+
+        if is_exit[cell]:
+            alive[i] = False
+
+
+def march_rays(origins, steps, is_wall, is_target, free, width, height, base=None):
+    """
+    Walk many lines of sight at once until each hits a wall, a target or the
+    edge of the grid.
+
+    Args:
+        origins (NDArray): (n, 2) start cells.
+        steps (NDArray): (n, 2) step per iteration.
+        is_wall, is_target, free (NDArray): Flat bool grids; ``free`` marks
+            targets with room left.
+        width, height (int): Grid size.
+        base (NDArray | None): Per-ray offset into ``free``, for rays in
+            different replicates of an ensemble.
+
+    Returns:
+        NDArray: For each ray, the flat index of the free target it hit, or -1
+        if it hit a wall, a full target or the edge first.
+    """
+    x = origins[:, 0].astype(np.int64)
+    y = origins[:, 1].astype(np.int64)
+    found = np.full(len(origins), -1, dtype=np.int64)
+    active = np.arange(len(origins))
+
+    while len(active):
+        ax, ay = x[active], y[active]
+        inside = (ax >= 0) & (ax < width) & (ay >= 0) & (ay < height)
+        active = active[inside]
+        cells = ax[inside] * height + ay[inside]
+
+        hit = is_target[cells] & ~is_wall[cells]
+        free_cells = cells[hit] if base is None else base[active[hit]] + cells[hit]
+        found[active[hit]] = np.where(free[free_cells], cells[hit], -1)
+
+        active = active[~(hit | is_wall[cells])]
+        x[active] += steps[active, 0]
+        y[active] += steps[active, 1]
+    return found
+
+
+class _ArraySchedule:
+    """The parts of a Mesa schedule that RunController reads."""
+
+    def __init__(self, model):
+        self.model = model
+        self.steps = 0
+        self.time = 0
+
+    def get_agent_count(self):
+        return int(self.model.alive.sum())
+
+
+class KernelModel:
+    """
+    IndoorModel with the population held in arrays.
+
+    Args:
+        attribute_grid (NDArray): Cell types, as loaded by ``parse_block_data``.
+        spawn_points (list): Entrance cells.
+        exit_points (list): Exit cells.
+        num_agents (int): Students placed at the entrances at the start.
+        seed (int | None): Seed for all random draws.
+        backend (str): "numba", "numpy" or "auto".
+        replicates (int | None): Run this many independent copies side by
+            side, with a leading replicate axis on every per-agent and grid
+            array (see ensemble.py).
+        capacity (NDArray | None): Students per cell at targets, as from
+            ``cells.read_capacity``; the defaults of the cell types if None.
+        routes (RoutingTable | None): A table already solved for this plan's
+            targets and exits, e.g. loaded from a compiled plan.
+        acoustics (Acoustics | None): Spread the socializers' noise around
+            walls (see acoustics.py) instead of with the free-space stamp.
+        labels (NDArray | None): Walkable component of every cell, as from
+            ``analysis.label_components`` or a compiled plan; labelled from
+            the grid if None.
+    """
+
+    def __init__(self, attribute_grid, spawn_points, exit_points, num_agents, seed=None, backend="auto",
+                 replicates=None, capacity=None, routes=None, acoustics=None, labels=None):
+        if backend == "auto":
+            backend = "numba" if HAS_NUMBA else "numpy"
+        if backend == "numba" and not HAS_NUMBA:
+            raise ImportError("the numba backend needs numba installed")
+        self.backend = backend
+
+        self.width, self.height = attribute_grid.shape
+        self.rng = np.random.default_rng(seed)
+        self.schedule = _ArraySchedule(self)
+
+        grid = np.asarray(attribute_grid, dtype=np.uint8).ravel()
+        if labels is None:
+            from analysis import label_components
+            labels = label_components(WALKABLE[grid].reshape(self.width, self.height))[0]
+        labels = np.asarray(labels).ravel()
+        spawns = np.array(spawn_points, dtype=np.int32).reshape(-1, 2)
+        spawn_labels = labels[spawns[:, 0] * self.height + spawns[:, 1]]
+
+        # Only targets some entrance reaches are looked for, as in main.install_plan
+        self.is_wall = ~WALKABLE[grid]
+        self.is_target = IS_TARGET[grid] & np.isin(labels, spawn_labels[spawn_labels >= 0])
+        self.is_social = IS_SOCIAL[grid]
+        self.capacity = (CAPACITY[grid] if capacity is None else np.asarray(capacity).ravel()).astype(np.int32)
+
+        # Exits sorted by component, so each agent draws its exits from the
+        # slice of its own component as analysis.exits_for does. The extra
+        # last slice, all exits, serves agents whose component has none and
+        # those off the walkable cells (label -1)
+        exits = np.array([x * self.height + y for x, y in exit_points], dtype=np.int32)
+        exits = exits[np.argsort(labels[exits], kind="stable")]
+        components = np.arange(labels.max(initial=-1) + 1)
+        starts = np.searchsorted(labels[exits], components, side="left")
+        counts = np.searchsorted(labels[exits], components, side="right") - starts
+        self.exits = exits
+        self.exit_start = np.append(np.where(counts > 0, starts, 0), 0)
+        self.exit_count = np.append(np.where(counts > 0, counts, len(exits)), len(exits))
+        self.is_exit = np.zeros_like(self.is_wall)
+        self.is_exit[self.exits] = True
+
+        if routes is None:
+            goals = np.concatenate([np.flatnonzero(self.is_target), self.exits])
+            routes = RoutingTable(~self.is_wall.reshape(self.width, self.height),
+                                  np.stack(np.divmod(goals, self.height), axis=1))
+        self.routes = routes
+        self.directions = look_directions()
+
+        # Agents are stored replicate after replicate; base is each agent's
+        # offset into the flattened (replicate, cell) grids
+        self.replicates = replicates
+        shape = (self.width, self.height) if replicates is None else (replicates, self.width, self.height)
+        total = num_agents * (replicates or 1)
+        self.base = np.repeat(np.arange(replicates or 1) * self.width * self.height, num_agents)
+
+        # Per-agent and per-cell state is kept in the narrowest types that
+        # hold it: cells and counters in int32, noise in float32
+        entrance = self.rng.integers(0, len(spawns), total)
+        self.pos = spawns[entrance]
+        self.component = spawn_labels[entrance]
+        self.alive = np.ones(total, dtype=bool)
+        self.focus = np.full(total, FOCUS, dtype=np.int32)
+        self.has_target = np.zeros(total, dtype=bool)
+        self.goal = self._draw_exits(np.arange(total))
+
+        self.passages = np.zeros(shape, dtype=np.int32)
+        self.noise = np.zeros(shape, dtype=np.float32)
+        self.acoustics = acoustics
+        self.noise_profile = stamp_profile(LOUDNESS)
+
+        # Seats as in seating.py: free seats per (replicate, cell), the seat
+        # each agent holds (-1 for none), and this step's claims
+        self.free = np.tile(self.capacity, replicates or 1)
+        self.seat = np.full(total, -1, dtype=np.int64)
+        self.claimed = np.zeros(total, dtype=bool)
+        self.previous = self.goal.copy()
+
+    @property
+    def cells(self):
+        return self.pos[:, 0] * self.height + self.pos[:, 1]
+
+    def _draw_exits(self, agents):
+        """A random exit for each of ``agents`` among those of its component."""
+        component = self.component[agents]
+        return self.exits[self.exit_start[component] + self.rng.integers(0, self.exit_count[component])]
+
+    def _move_sequential(self, order, thetas):
+        _step_sequential(order, self.pos, self.alive, self.focus, self.has_target, self.goal, self.previous,
+                         self.claimed, self.seat, self.base, thetas, self.directions, _OFFSETS, self.is_wall,
+                         self.is_target, self.is_exit, self.free, self.routes.next_step, self.routes.goal_index,
+                         self.passages.ravel(), self.width, self.height)
+
+    def _move_vectorized(self, order, thetas):
+        active = np.flatnonzero(self.alive)
+
+        looking = active[~self.has_target[active] & (self.focus[active] > 0)]
+        if len(looking):
+            found = march_rays(self.pos[looking], self.directions[thetas[looking]],
+                               self.is_wall, self.is_target, self.free > 0, self.width, self.height,
+                               self.base[looking])
+            hits = looking[found >= 0]
+            self.previous[hits] = self.goal[hits]
+            self.goal[hits] = found[found >= 0]
+            self.has_target[hits] = True
+            self.claimed[hits] = True
+
+        codes = self.routes.next_step[self.routes.goal_index[self.goal[active]], self.cells[active]]
+        stuck = active[codes == NO_PATH]
+        walled_off = stuck[~self.is_exit[self.goal[stuck]]]
+        self.goal[walled_off] = self.previous[walled_off]
+        self.claimed[walled_off] = False
+        giving_up = np.zeros(len(self.seat), dtype=bool)
+        giving_up[walled_off] = True
+        self._release(giving_up)
+        self.has_target[stuck] = False
+
+        moving = active[codes != NO_PATH]
+        self.pos[moving] += _OFFSETS[codes[codes != NO_PATH]]
+        cells = self.cells[moving]
+        np.add.at(self.passages.ravel(), self.base[moving] + cells, 1)
+        self.alive[moving[self.is_exit[cells]]] = False
+
+    def _socialize(self, before, order):
+        """
+        Agents on social cells distract everyone within LOUDNESS cells, except on their own cell,
+        and make noise as ``IndoorModel.emit_noise`` does.
+
+        The Mesa agents act one after another, so a socializer sees the agents that acted before
+        it in ``order`` at the cell they moved to and the others still at ``before``, their cell
+        at the start of the step. Agents walking in step with a socializer are distracted or not
+        depending on that order.
+        """
+        rank = np.empty(len(self.alive), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        active = np.flatnonzero(self.alive)
+        cells = self.cells
+        talkers = active[self.is_social[cells[active]]]
+        if not len(talkers):
+            return
+        social = np.bincount(self.base[talkers] + cells[talkers], minlength=self.passages.size)
+        social = social.reshape(-1, self.width, self.height)
+
+        # Windowed sums over the last two axes from a summed-area table give
+        # the cells within reach of a socializer
+        k = 2 * LOUDNESS + 1
+        table = np.pad(social, ((0, 0), (LOUDNESS + 1, LOUDNESS), (LOUDNESS + 1, LOUDNESS)))
+        table = table.cumsum(1).cumsum(2)
+        near = (table[:, k:, k:] - table[:, :-k, k:] - table[:, k:, :-k] + table[:, :-k, :-k]).ravel() > 0
+        nearby = active[near[self.base[active] + cells[active]] | near[self.base[active] + before[active]]]
+
+        # Pair every socializer with the nearby agents of its own replicate
+        replicate = self.base // (self.width * self.height)
+        starts = np.searchsorted(replicate[nearby], replicate[talkers], side="left")
+        lengths = np.searchsorted(replicate[nearby], replicate[talkers], side="right") - starts
+        talker = np.repeat(talkers, lengths)
+        other = nearby[np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())]
+
+        seen = np.where(rank[other] < rank[talker], cells[other], before[other])
+        dx = seen // self.height - cells[talker] // self.height
+        dy = seen % self.height - cells[talker] % self.height
+        hit = (np.abs(dx) <= LOUDNESS) & (np.abs(dy) <= LOUDNESS) & (seen != cells[talker]) & (other != talker)
+        self.focus -= DISTRACTABILITY * np.bincount(other[hit], minlength=len(self.focus)).astype(np.int32)
+
+        if self.acoustics is None:
+            added = LOUDNESS * _convolve(social.astype(np.float32), self.noise_profile)
+        else:
+            added = np.zeros(social.shape, dtype=np.float32)
+            for r in np.flatnonzero(social.any(axis=(1, 2))):
+                sources = np.argwhere(social[r])
+                added[r] = self.acoustics.response(sources, LOUDNESS * social[r][sources[:, 0], sources[:, 1]])
+        self.noise += added.reshape(self.noise.shape)
+
+    def _resolve_claims(self):
+        """Grant this step's seat claims in random order per cell, as SeatAllocator.resolve."""
+        claimants = np.flatnonzero(self.claimed)
+        if not len(claimants):
+            return
+        self.claimed[claimants] = False
+
+        flat = self.base[claimants] + self.goal[claimants]
+        order = np.lexsort((self.rng.random(len(claimants)), flat))
+        claimants, flat = claimants[order], flat[order]
+
+        first = np.flatnonzero(np.r_[True, flat[1:] != flat[:-1]])
+        rank = np.arange(len(flat)) - np.repeat(first, np.diff(np.r_[first, len(flat)]))
+        granted = rank < self.free[flat]
+        np.subtract.at(self.free, flat[granted], 1)
+        # A new seat replaces the one held, which goes back as in SeatAllocator.release
+        replacing = np.zeros(len(self.seat), dtype=bool)
+        replacing[claimants[granted]] = True
+        self._release(replacing)
+        self.seat[claimants[granted]] = flat[granted]
+
+        denied = claimants[~granted]
+        self.has_target[denied] = False
+        self.goal[denied] = self.previous[denied]
+
+    def _release(self, mask):
+        """Give back the seats held by the agents in ``mask``."""
+        holding = np.flatnonzero(mask & (self.seat >= 0))
+        np.add.at(self.free, self.seat[holding], 1)
+        self.seat[holding] = -1
+
+    def step(self):
+        """Advance the model by one step."""
+        self.noise = np.maximum(self.noise - NOISE_DECAY, 0.0)
+
+        thetas = self.rng.integers(0, 360, len(self.alive))
+        order = self.rng.permutation(np.flatnonzero(self.alive))
+        before = self.cells
+        if self.backend == "numba":
+            self._move_sequential(order, thetas)
+        else:
+            self._move_vectorized(order, thetas)
+
+        self._socialize(before, order)
+        self.focus[self.alive] -= 1
+        self._resolve_claims()
+
+        leaving = np.flatnonzero(self.alive & (self.focus <= 0))
+        self.goal[leaving] = self._draw_exits(leaving)
+        self._release(~self.alive | (self.focus <= 0))
+
+        self.schedule.steps += 1
+        self.schedule.time += 1
+
+    def advance(self, steps):
+        """Skip ahead ``steps`` steps in which nothing moves."""
+        self.noise = np.maximum(self.noise - steps * NOISE_DECAY, 0.0)
+        self.schedule.steps += steps
+        self.schedule.time += steps
+
+
+def check_equivalence(num_agents=50, steps=100, runs=10, backend="auto"):
+    """
+    Run the Mesa IndoorModel and KernelModel ``runs`` times each on the
+    floor plan loaded in main.py and compare them.
+
+    The kernels pass when the mean passage heatmaps are strongly correlated
+    and the totals of passages, of agents still inside and of the final noise
+    field agree within three standard errors.
+
+    Returns:
+        dict: The compared statistics and ``passed``.
+    """
+    import main
+
+    def summarize(totals):
+        totals = np.asarray(totals, dtype=float)
+        return float(totals.mean()), float(totals.std(ddof=1) / np.sqrt(len(totals)))
+
+    results = {}
+    for name in ("mesa", "kernel"):
+        heatmaps, inside, noise = [], [], []
+        started = time.perf_counter()
+        for seed in range(runs):
+            if name == "mesa":
+                main.random.seed(seed)
+                model = main.IndoorModel(num_agents, main.w, main.h, seed=seed)
+            else:
+                model = KernelModel(main.attribute_grid, main.spawn_points, main.exit_points, num_agents,
+                                    seed=seed, backend=backend, capacity=main.cell_masks.capacity,
+                                    labels=main.plan_analysis.labels)
+            with contextlib.redirect_stdout(io.StringIO()):
+                for _ in range(steps):
+                    model.step()
+            heatmaps.append(np.asarray(model.passages, dtype=float))
+            inside.append(model.schedule.get_agent_count())
+            noise.append(float(np.asarray(model.noise, dtype=float).sum()))
+        results[name] = {
+            "seconds": time.perf_counter() - started,
+            "heatmap": np.mean(heatmaps, axis=0),
+            "passages": summarize([h.sum() for h in heatmaps]),
+            "inside": summarize(inside),
+            "noise": summarize(noise),
+        }
+
+    mesa, kernel = results["mesa"], results["kernel"]
+    correlation = np.corrcoef(mesa["heatmap"].ravel(), kernel["heatmap"].ravel())[0, 1]
+
+    def agrees(key):
+        (a, a_err), (b, b_err) = mesa[key], kernel[key]
+        return abs(a - b) <= 3 * np.hypot(a_err, b_err) + 1e-9
+
+    return {
+        "correlation": float(correlation),
+        "passages": (mesa["passages"][0], kernel["passages"][0]),
+        "inside": (mesa["inside"][0], kernel["inside"][0]),
+        "noise": (mesa["noise"][0], kernel["noise"][0]),
+        "speedup": mesa["seconds"] / kernel["seconds"],
+        "passed": bool(correlation > 0.9 and agrees("passages") and agrees("inside") and agrees("noise")),
+    }
+
+
+if __name__ == "__main__":
+    import main
+
+    parser = argparse.ArgumentParser(description="Compare the array kernels with the Mesa model.")
+    parser.add_argument("floor_plan")
+    parser.add_argument("--agents", type=int, default=50)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--backend", default="auto", choices=["auto", "numba", "numpy"])
+    args = parser.parse_args()
+
+    main.load_floor_plan(args.floor_plan)
+    for key, value in check_equivalence(args.agents, args.steps, args.runs, args.backend).items():
+        print(f"{key}: {value}")
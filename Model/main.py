@@ -5,42 +5,29 @@ import mesa
 from mesa.space import MultiGrid
 from mesa.time import RandomActivation
 from numpy.typing import NDArray
-import matplotlib.pyplot as plt
-import json
-import sys
 
-MAX_STUDENTS = 2
+from analysis import analyze
+from cells import CellMasks, read_capacity, read_plan
+from cohorts import Cohort, CohortTracker
+from kernels import look_directions, march_rays
+from noise import DenseNoiseField, TiledNoiseField
+from pathcache import PathCache, VersionedGraph
+from runner import RunController
+from seating import SeatAllocator
 
 def parse_block_data(file_name: str) -> tuple[NDArray, list[tuple[int, int]], list[tuple[int, int]], int]:
     """
-    Parse a JSON-like string into a Python dictionary representing block data.
+    Parse a GridConfig export into a grid of cell type codes (see cells.py).
 
     Args:
-        block_data (JSON): The JSON input.
+        file_name (str): Path to the JSON export.
 
     Returns:
-        dict: Parsed block data.
+        tuple: The uint8 grid, spawn points, their exits and the side length.
     """
 
-    with open(file_name, 'r') as f:
-        block_data = json.load(f)
-        attribute_grid = np.zeros((block_data["gridSize"], block_data["gridSize"]))
-        spawns = []
-        exits = []
-        for key, value in block_data["data"].items():
-            # Convert string keys like "0,0" to tuple keys like (0, 0)
-            x, y = tuple(map(int, key.split(',')))
-            attribute_grid[y, x] = value["type"]
-            if value["associatedExit"] is not None:
-                ex, ey = value["associatedExit"]
-                spawns.append((y, x))
-                exits.append((ey, ex))
+    return read_plan(file_name)
 
-        return attribute_grid, spawns, exits, block_data["gridSize"]
-
-
-# Define attributes for grid locations
-attributes = {'wall': 2, 'open': 0, 'social': 4, 'work': 3, 'both': 5}
 
 # Grid dimensions and layout
 # Would need to reintegrate with the JSON parser
@@ -62,115 +49,280 @@ w, h = 10, 10
 # spawn_points = [(0, 0), (9, 0)]
 # exit_points = [(9, 9), (0, 9)]
 
-attribute_grid, spawn_points, exit_points, side_length = parse_block_data(sys.argv[1])
 
-w = side_length
-h = side_length
+def load_floor_plan(file_name: str) -> None:
+    """
+    Parse a floor plan and install it as the grid used by the model.
+
+    Args:
+        file_name (str): Path to a GridConfig JSON export.
+    """
+    grid, spawns, exits, _ = parse_block_data(file_name)
+    install_plan(grid, spawns, exits, read_capacity(file_name, grid), file_name)
+
+
+def install_plan(grid: NDArray, spawns: list, exits: list, capacity: NDArray | None = None, name="floor plan") -> None:
+    """
+    Install an already loaded floor plan as the grid used by the model.
+
+    Args:
+        grid (NDArray): Square grid of cell types.
+        spawns (list): Entrance cells.
+        exits (list): The exit paired with each entrance.
+        capacity (NDArray | None): Seats per cell, the type defaults if None.
+        name (str): Shown with any repairs made to the plan.
+    """
+    global attribute_grid, cell_masks, plan_analysis, spawn_points, exit_points, exit_mask, w, h
+
+    attribute_grid = grid
+    cell_masks = CellMasks.from_grid(attribute_grid, capacity)
+
+    # Repair or drop entrance/exit pairs that cannot be walked, and leave the
+    # targets nobody can reach out of the look tables (see analysis.py)
+    plan_analysis = analyze(attribute_grid, spawns, exits)
+    for issue in plan_analysis.issues:
+        print(f"{name}: {issue}")
+    spawn_points, exit_points = plan_analysis.spawns, plan_analysis.exits
+    cell_masks.is_target &= plan_analysis.reachable_targets
+
+    exit_mask = np.zeros(attribute_grid.shape, dtype=bool)
+    exit_mask[tuple(np.array(exit_points, dtype=np.intp).reshape(-1, 2).T)] = True
+
+    w, h = attribute_grid.shape
+
+
+def cell_index(cell) -> int:
+    """Flat index of a (row, col) cell, as kept in ``destination_stack``."""
+    return int(cell[0]) * h + int(cell[1])
+
 
-print(attribute_grid, spawn_points, exit_points)
+def cell_at(index: int) -> tuple[int, int]:
+    """The (row, col) cell of a flat index from ``cell_index``."""
+    return divmod(index, h)
 
 NOISE_DECAY = 0.1
 
+# (dx, dy) line of sight for each look angle 0-359
+LOOK_DIRECTIONS = look_directions()
+
 class IndoorModel(mesa.Model):
     """
     A model that simulates student movement, socializing, and studying
     in an indoor environment.
+
+    Pass ``sparse_noise=True`` on large, mostly quiet floors to keep noise
+    only in the tiles where something is audible (see noise.py), and an
+    ``Acoustics`` instance as ``acoustics`` to have noise go around walls
+    instead of through them (see acoustics.py).
     """
 
-    def __init__(self, num_agents, width, height, seed=None):
+    def __init__(self, num_agents, width, height, seed=None, scheduler=RandomActivation, sparse_noise=False,
+                 acoustics=None):
         super().__init__(seed=seed)
         self.num_agents = num_agents
         self.grid = MultiGrid(width, height, torus=False)
-        self.schedule = RandomActivation(self)
+        self.schedule = scheduler(self)
         self.graph = self.build_graph()
+        self.paths = PathCache()
+        self.analysis = plan_analysis
 
-        self.passages = np.zeros((width, height), dtype=int)
-        self.agent_zero_passage = np.zeros((width, height), dtype=int)
+        self.passages = np.zeros((width, height), dtype=np.int32)
 
-        self.noise = np.zeros((width, height))
+        self.noise = TiledNoiseField(width, height) if sparse_noise else DenseNoiseField(width, height)
+        self.acoustics = acoustics
+        self._noise_sources = []
 
         self.width = width
         self.height = height
 
+        # Optional ArrivalScheduler feeding agents in over time (see arrivals.py)
+        self.arrivals = None
+
+        # Seats held at study tables and chairs (see seating.py)
+        self.seats = SeatAllocator(cell_masks.capacity, np.random.default_rng(self.random.getrandbits(64)))
+        self.look_rng = np.random.default_rng(self.random.getrandbits(64))
+
+        # Agents on the grid without a target, in the order they started
+        # searching; a dict so ``look`` casts for them in a reproducible order
+        self.searching = {}
+
+        # Traced groups of agents (see cohorts.py); agent zero is the first student
+        self.cohorts = CohortTracker(self, [Cohort("agent_zero", ids={1})])
+
         # Create agents and place them at spawn points
         for _ in range(self.num_agents):
             agent = StudentAgent(self.next_id(), self)
             spawn_point = random.choice(spawn_points)
-            exit_point = random.choice(exit_points)
-            agent.destination_stack.append(exit_point)
+            exit_point = random.choice(plan_analysis.exits_for(spawn_point))
+            agent.destination_stack.append(cell_index(exit_point))
 
-            self.grid.place_agent(agent, spawn_point)
-            self.schedule.add(agent)
+            self.place_agent(agent, spawn_point)
 
     def build_graph(self):
         """Converts the grid to a NetworkX graph for pathfinding."""
-        G = nx.grid_2d_graph(w, h)
-        for x in range(w):
-            for y in range(h):
-                if attribute_grid[x, y] == attributes['wall']:
-                    G.remove_node((x, y))
+        G = VersionedGraph(nx.grid_2d_graph(w, h))
+        G.remove_nodes_from((int(x), int(y)) for x, y in np.argwhere(~cell_masks.walkable))
         return G
 
     def step(self):
         """Advance the model by one step."""
         # Noise decay
-        self.noise = np.maximum(self.noise - NOISE_DECAY, 0.0)
+        self.noise.decay(NOISE_DECAY)
+
+        if self.arrivals is not None:
+            self.arrivals.step()
 
+        self.look()
         self.schedule.step()
+        self.seats.resolve()
+        self.apply_noise()
+        self.cohorts.record()
+
+    def look(self, agents=None):
+        """
+        Cast one line of sight for every agent searching for a target. The
+        angles are drawn in one call and all rays are marched together (see
+        ``kernels.march_rays``), each until it hits a wall, a target or the
+        edge. A target counts if the seat grid has a seat free there at the
+        start of the step; the agent then claims it and heads for it.
+
+        Args:
+            agents (list | None): Agents to look for; by default every agent
+                on the grid without a target and with focus left, as kept in
+                ``searching``.
+        """
+        if agents is None:
+            # Out of focus an agent only heads for an exit, so it stops searching
+            for agent in [a for a in self.searching if a.focus <= 0]:
+                del self.searching[agent]
+            agents = list(self.searching)
+        agents = [a for a in agents if a.pos is not None]
+        if not agents:
+            return
+
+        thetas = self.look_rng.integers(0, 360, len(agents))
+        found = march_rays(np.array([a.pos for a in agents]), LOOK_DIRECTIONS[thetas],
+                           ~cell_masks.walkable.ravel(), cell_masks.is_target.ravel(),
+                           self.seats.free.ravel() > 0, self.width, self.height)
+        for agent, cell in zip(agents, found.tolist()):
+            if cell >= 0:
+                agent.destination_stack.append(cell)
+                agent.has_target = True
+                self.searching.pop(agent, None)
+                self.seats.claim(agent, cell_at(cell))
+
+    @property
+    def agent_zero_passage(self):
+        """Passages of the first student alone."""
+        return self.cohorts.passages["agent_zero"]
+
+    def advance(self, steps):
+        """
+        Skip ahead ``steps`` steps in which no agent is due to act, applying
+        the noise decay of all of them at once. The schedule's ``steps`` and
+        ``time`` are the model's clock and move on with it.
+        """
+        self.noise.decay(steps * NOISE_DECAY)
+        self.schedule.steps += steps
+        self.schedule.time += steps
+        self.cohorts.record(steps)
+
+    def place_agent(self, agent, cell):
+        """Put an agent entering the building on the grid and schedule."""
+        self.grid.place_agent(agent, cell)
+        self.schedule.add(agent)
+        self.cohorts.add(agent)
+        if not agent.has_target:
+            self.searching[agent] = None
+
+    def remove_agent(self, agent):
+        """Take an agent that has left the building off the grid and schedule."""
+        self.cohorts.remove(agent)
+        self.seats.release(agent)
+        self.searching.pop(agent, None)
+        self.grid.remove_agent(agent)
+        self.schedule.remove(agent)
+        if self.arrivals is not None:
+            self.arrivals.release(agent)
+
+    def search(self, agent):
+        """Clear an agent's target and have ``look`` cast for it again."""
+        agent.has_target = False
+        self.searching[agent] = None
+
+    def wake(self, agent):
+        """Tell an event-driven schedule that something outside changed an agent."""
+        wake = getattr(self.schedule, "wake", None)
+        if wake is not None:
+            wake(agent)
 
     def add_noise(self, cx: int, cy: int, noise: float = 1.0):
-        center = [cx, cy]
-        sigma = [noise * 3, noise * 3]
-        x = np.arange(self.width)
-        y = np.arange(self.height)
-        x_grid, y_grid = np.meshgrid(x, y)
+        self.noise.stamp(cx, cy, noise)
 
-        # Gaussian equation
-        gaussian = noise * np.exp(
-            -((x_grid - center[1])**2 / (2 * sigma[1]**2) + (y_grid - center[0])**2 / (2 * sigma[0]**2))
-        )
+    def emit_noise(self, cell, loudness):
+        """Queue a noise source for ``apply_noise`` at the end of the step."""
+        self._noise_sources.append((cell, loudness))
 
-        self.noise += gaussian
+    def apply_noise(self):
+        """Add the noise of every source queued this step."""
+        if not self._noise_sources:
+            return
+        sources, self._noise_sources = self._noise_sources, []
+        if self.acoustics is not None:
+            cells, loudness = zip(*sources)
+            self.noise.add(self.acoustics.response(np.array(cells), np.array(loudness)))
+        else:
+            for (cx, cy), loudness in sources:
+                self.add_noise(cx, cy, loudness)
 
 
 class StudentAgent(mesa.Agent):
     """
     A student agent that can look for goals, move towards them, and perform
     socializing or studying behaviors.
+
+    Destinations are kept as flat cell indices (see ``cell_index``), and the
+    agent's own state lives in slots. Mesa's ``Agent`` has no slots, so
+    ``unique_id``, ``model`` and ``pos`` still sit in an instance dict.
     """
 
+    __slots__ = ("focus", "has_target", "destination_stack", "loudness", "distractability", "slot")
+
     def __init__(self, unique_id, model, loudness=2):
         super().__init__(unique_id, model)
-        self.focus = 50
-        self.has_target = False
-        self.destination_stack = []
+        self.reset()
 
         self.loudness = loudness
         self.distractability = 2
 
+    def reset(self):
+        """
+        Restore the per-visit state so the agent can enter the building again.
+        """
+        self.focus = 50
+        self.has_target = False
+        self.destination_stack = []
+
     def look(self):
         """
         Scan the environment for a target (e.g., a social or work area)
-        and update the destination stack if a goal is found.
+        and update the destination stack if a goal is found. The model looks
+        for all searching agents at once at the start of each step; this
+        looks for this agent alone.
         """
-        theta = random.randint(0, 359)
-        y_direction = np.sin(np.radians(theta))
-        x_direction = np.cos(np.radians(theta))
-        mult = min(y_direction, x_direction)
-        if y_direction != 0:
-            if x_direction != 0:
-                y_direction = int(y_direction / mult)
-                x_direction = int(x_direction / mult)
-            else:
-                x_direction = 0
-                y_direction = 1
-        else:
-            x_direction = 1
-            y_direction = 0
-        result = plot_line(self.pos, (x_direction, y_direction), self)
-        if result:
-            self.destination_stack.append(result)
-            self.has_target = True
+        self.model.look([self])
+
+    def seat_granted(self, cell):
+        """The seat claimed at ``cell`` is ours; keep heading for it unless already leaving."""
+        if self.focus <= 0 or self.pos is None:
+            self.model.seats.release(self)
+
+    def seat_denied(self, cell):
+        """Someone else got the seat at ``cell``; look for another target."""
+        if self.destination_stack and self.destination_stack[-1] == cell_index(cell):
+            self.destination_stack.pop()
+        self.model.search(self)
+        self.model.wake(self)
 
     def move(self):
         """
@@ -179,7 +331,13 @@ class StudentAgent(mesa.Agent):
         if not self.destination_stack:
             return  # No target to move towards
 
-        target = self.destination_stack[-1]
+        target = cell_at(self.destination_stack[-1])
+        if not self.model.analysis.connected(self.pos, target):
+            # Walled off from here; give it up without searching the graph
+            self.destination_stack.pop()
+            self.model.seats.release(self)
+            self.model.search(self)
+            return
         try:
             cur_best = float('inf')
             next_move = self.pos
@@ -200,28 +358,21 @@ class StudentAgent(mesa.Agent):
             #     else:
             #         continue
 
-                # nx.astar_path
-            path = nx.dijkstra_path(self.model.graph, self.pos, target)
-
-            if len(path) < 2:
-                next_move = path[0]
-            else:
-                next_move = path[1]
+            # Shortest paths are cached per (cell, target), so this only
+            # searches when the target changes
+            next_move = self.model.paths.next_step(self.model.graph, self.pos, target)
 
             self.model.grid.move_agent(self, next_move)
 
             # Track the space passed through
             x, y = next_move
             self.model.passages[x, y] += 1
-            if self.unique_id == 1:
-                self.model.agent_zero_passage[x, y] += 1
 
-            if next_move in exit_points:
-                self.model.grid.remove_agent(self)  # Remove from the grid
-                self.model.schedule.remove(self)
+            if exit_mask[next_move]:
+                self.model.remove_agent(self)
 
         except nx.NetworkXNoPath:
-            self.has_target = False  # Clear target if no path exists
+            self.model.search(self)  # Clear target if no path exists
 
     def perform_action(self):
         """
@@ -230,9 +381,9 @@ class StudentAgent(mesa.Agent):
         if self.pos is None:
             return
 
-        cell_type = attribute_grid[self.pos[0], self.pos[1]]
-        if cell_type == attributes['social']:
+        if cell_masks.is_social[self.pos]:
            # print(f"Agent {self.unique_id} is socializing at {self.pos}")
+            self.model.emit_noise(self.pos, self.loudness)
             # reduce other agents nearby
             neighbors = self.model.grid.get_neighbors(
                 self.pos,  # Position of the agent
@@ -243,57 +394,83 @@ class StudentAgent(mesa.Agent):
             for neighbor in neighbors:
              #   print(f"Agent {self.unique_id} is distracting agent {neighbor.unique_id}")
                 neighbor.focus -= neighbor.distractability
+                self.model.wake(neighbor)
 
-        elif cell_type == attributes['work']:
+        elif cell_masks.is_work[self.pos]:
             print(f"Agent {self.unique_id} is studying at {self.pos}")
 
-    def step(self):
+    def idle_steps(self):
         """
-        The agent's behavior at each step: look, move, perform action, and deplete focus.
+        Number of upcoming steps in which the agent only sits at its target
+        losing focus, which an event-driven schedule may skip.
         """
+        if self.pos is None or not self.has_target or not self.destination_stack:
+            return 0
+        if self.destination_stack[-1] != cell_index(self.pos) or exit_mask[self.pos]:
+            return 0
+        if cell_masks.is_social[self.pos]:
+            return 0  # Socializing distracts the neighbors every step
+
+        # The step that takes focus to zero has to run to send the agent to an exit
+        return max(self.focus - 1, 0)
 
-        if not self.has_target and self.focus > 0:
-            self.look()
+    def catch_up(self, skipped):
+        """
+        Apply the bookkeeping of steps skipped while idle: the passage counts
+        for staying put and the focus lost.
+        """
+        if self.pos is None:
+            return
+
+        x, y = self.pos
+        self.model.passages[x, y] += skipped
+
+        self.focus -= skipped
+        if self.focus <= 0:
+            self.model.seats.release(self)
+            self.head_for_exit()
+
+    def head_for_exit(self):
+        """
+        Make a random exit the current destination. An exit already on top of
+        the stack is replaced rather than stacked on, so the stack stays at
+        most three entries deep however long the agent takes to leave.
+        """
+        exits = exit_points if self.pos is None else self.model.analysis.exits_for(self.pos)
+        exit_point = cell_index(exits[random.randint(0, len(exits) - 1)])
+        if self.destination_stack and exit_mask[cell_at(self.destination_stack[-1])]:
+            self.destination_stack[-1] = exit_point
+        else:
+            self.destination_stack.append(exit_point)
+
+    def step(self):
+        """
+        The agent's behavior at each step: move, perform action, and deplete
+        focus. Looking for a target happens in ``IndoorModel.look`` before the
+        agents step.
+        """
         self.move()
         self.perform_action()
         self.focus -= 1
         if self.focus <= 0:
         #    print(f"Agent {self.unique_id} is heading to exit.")
-            self.destination_stack.append(exit_points[random.randint(0, len(exit_points) - 1)])  # Go to exit
+            self.model.seats.release(self)
+            self.head_for_exit()
 
 
-def plot_line(location, direction, agent):
-    """
-    Simulate a line of sight to find a target goal in a given direction.
-
-    Args:
-        location: Current position of the agent.
-        direction: Tuple representing direction (dx, dy).
+if __name__ == "__main__":
+    import sys
 
-    Returns:
-        Coordinates of the target goal if found, otherwise None.
-    """
-    x, y = location
-    dx, dy = direction
-    while 0 <= x < w and 0 <= y < h:
-        loc_type = attribute_grid[x, y]
-        if loc_type == attributes['wall']:
-            return None
-        if loc_type in [attributes['social'], attributes['work']]:
-            if len(agent.model.grid.get_cell_list_contents((x, y))) < MAX_STUDENTS:
-                return x, y
-            else:
-                return None
-        x += dx
-        y += dy
-    return None
+    import matplotlib.pyplot as plt
 
+    load_floor_plan(sys.argv[1])
+    print(attribute_grid, spawn_points, exit_points)
 
-if __name__ == "__main__":
     model = IndoorModel(num_agents=20, width=w, height=h)
-    for i in range(100):  # Simulate 100 steps
-        print(f"Step {i + 1}")
-        model.step()
+    controller = RunController(model, max_steps=100, verbose=True)
+    controller.run()
+    print(f"Stopped after {model.schedule.steps} steps: {controller.reason}")
+    print(f"Path cache: {model.paths.hits} hits, {model.paths.misses} misses ({model.paths.hit_rate:.1%})")
 
     print(model.passages)
     print(model.agent_zero_passage)
@@ -6,24 +6,26 @@ from mesa.space import MultiGrid
 from mesa.time import RandomActivation
 import matplotlib.pyplot as plt
 
-# Define attributes for grid locations
-attributes = {'wall': 1, 'open': 0, 'social': 2, 'work': 3, 'both': 4}
+from cells import CellMasks
+from runner import RunController
 
 # Grid dimensions and layout
 # Would need to reintegrate with the JSON parser
+# Cell codes as in cells.py: 3 wall, 4 study table, 5 chair
 w, h = 10, 10
 attribute_grid = np.array([
-    [0, 0, 0, 0, 0, 1, 3, 3, 3, 3],
-    [0, 3, 3, 3, 0, 1, 3, 0, 0, 3],
-    [0, 3, 3, 3, 0, 1, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 1, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 1, 0, 0, 0, 0],
+    [0, 0, 0, 0, 0, 3, 4, 4, 4, 4],
+    [0, 4, 4, 4, 0, 3, 4, 0, 0, 4],
+    [0, 4, 4, 4, 0, 3, 0, 0, 0, 0],
+    [0, 0, 0, 0, 0, 3, 0, 0, 0, 0],
+    [0, 0, 0, 0, 0, 3, 0, 0, 0, 0],
     [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
     [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 2, 2, 2, 2, 0, 0, 0],
-    [0, 0, 0, 2, 2, 2, 2, 0, 0, 0],
+    [0, 0, 0, 5, 5, 5, 5, 0, 0, 0],
+    [0, 0, 0, 5, 5, 5, 5, 0, 0, 0],
     [0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-])
+], dtype=np.uint8)
+cell_masks = CellMasks.from_grid(attribute_grid)
 spawn_points = [(0, 0), (9, 0)]
 exit_points = [(9, 9), (0, 9)]
 
@@ -56,10 +58,7 @@ class IndoorModel(mesa.Model):
     def build_graph(self):
         """Converts the grid to a NetworkX graph for pathfinding."""
         G = nx.grid_2d_graph(w, h)
-        for x in range(w):
-            for y in range(h):
-                if attribute_grid[x, y] == attributes['wall']:
-                    G.remove_node((x, y))
+        G.remove_nodes_from((int(x), int(y)) for x, y in np.argwhere(~cell_masks.walkable))
         return G
 
     def step(self):
@@ -73,16 +72,19 @@ class StudentAgent(mesa.Agent):
     socializing or studying behaviors.
     """
 
+    __slots__ = ("focus", "has_target", "destination_stack", "social", "study",
+                 "friendship_group", "loudness", "leave_need")
+
     def __init__(self, unique_id, model):
         super().__init__(unique_id, model)
         self.focus = 100
         self.has_target = False
         self.destination_stack = []
-        self.social=random.randint(0,100),               #added by NBC
-        self.study=bool(random.randint(0,1)),            #added by NBC
-        self.friendship_group=random.randint(0,10),      #added by NBC
-        self.loudness=random.randint(0,100),             #added by NBC
-        self.leave_need=random.randint(0,100),           #added by NBC
+        self.social = random.randint(0, 100)             #added by NBC
+        self.study = bool(random.randint(0, 1))          #added by NBC
+        self.friendship_group = random.randint(0, 10)    #added by NBC
+        self.loudness = random.randint(0, 100)           #added by NBC
+        self.leave_need = random.randint(0, 100)         #added by NBC
 
     def look(self):
         """
@@ -151,10 +153,12 @@ class StudentAgent(mesa.Agent):
         """
         Perform socializing or studying if at a valid location.
         """
-        cell_type = attribute_grid[self.pos[0], self.pos[1]]
-        if cell_type == attributes['social']:
+        if self.pos is None:
+            return
+
+        if cell_masks.is_social[self.pos]:
             print(f"Agent {self.unique_id} is socializing at {self.pos}")
-        elif cell_type == attributes['work']:
+        elif cell_masks.is_work[self.pos]:
             print(f"Agent {self.unique_id} is studying at {self.pos}")
 
     def step(self):
@@ -165,11 +169,14 @@ class StudentAgent(mesa.Agent):
         if not self.has_target or self.study == True:
             self.look()
         self.move()
+        if self.pos is None:
+            return  # Left through an exit during the move
         self.perform_action()
         self.focus -= 1
         if self.focus <= 0 or self.study == False:
             print(f"Agent {self.unique_id} is heading to exit.")
-            self.destination_stack.append(spawn_points[1])  # Go to exit
+            if self.destination_stack[-1:] != [spawn_points[1]]:
+                self.destination_stack.append(spawn_points[1])  # Go to exit
 
 
 def plot_line(location, direction):
@@ -186,10 +193,9 @@ def plot_line(location, direction):
     x, y = location
     dx, dy = direction
     while 0 <= x < w and 0 <= y < h:
-        loc_type = attribute_grid[x, y]
-        if loc_type == attributes['wall']:
+        if not cell_masks.walkable[x, y]:
             return None
-        if loc_type in [attributes['social'], attributes['work']]:
+        if cell_masks.is_target[x, y]:
             return (x, y)
         x += dx
         y += dy
@@ -198,9 +204,9 @@ def plot_line(location, direction):
 
 if __name__ == "__main__":
     model = IndoorModel(num_agents=40, width=w, height=h)
-    for i in range(100):  # Simulate 10 steps
-        print(f"Step {i + 1}")
-        model.step()
+    controller = RunController(model, max_steps=100, verbose=True)
+    controller.run()
+    print(f"Stopped after {model.schedule.steps} steps: {controller.reason}")
 
     print(model.passages)
 
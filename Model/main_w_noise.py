@@ -6,42 +6,29 @@ from mesa.space import MultiGrid
 from mesa.time import RandomActivation
 from numpy.typing import NDArray
 import matplotlib.pyplot as plt
-import json
 import sys
 
+from cells import CellMasks, read_plan
+from noise import DenseNoiseField
+from runner import RunController
+
 def parse_block_data(file_name: str) -> tuple[NDArray, list[tuple[int, int]], list[tuple[int, int]], int]:
     """
-    Parse a JSON-like string into a Python dictionary representing block data.
+    Parse a GridConfig export into a grid of cell type codes (see cells.py).
 
     Args:
-        block_data (JSON): The JSON input.
+        file_name (str): Path to the JSON export.
 
     Returns:
-        dict: Parsed block data.
+        tuple: The uint8 grid, spawn points, their exits and the side length.
     """
 
-    with open(file_name, 'r') as f:
-        block_data = json.load(f)
-        attribute_grid = np.zeros((block_data["gridSize"], block_data["gridSize"]))
-        spawns = []
-        exits = []
-        for key, value in block_data["data"].items():
-            # Convert string keys like "0,0" to tuple keys like (0, 0)
-            x, y = tuple(map(int, key.split(',')))
-            attribute_grid[y, x] = value["type"]
-            if value["associatedExit"] is not None:
-                ex, ey = value["associatedExit"]
-                spawns.append((y, x))
-                exits.append((ey, ex))
-
-        return attribute_grid, spawns, exits, block_data["gridSize"]
+    return read_plan(file_name)
 
 
-# Define attributes for grid locations
-attributes = {'wall': 2, 'open': 0, 'social': 4, 'work': 3, 'both': 5}
-
 file_name = r"C:\Users\nickc\OneDrive\Desktop\Purdue Files\4_Senior Year\Fall 2024\HONR 313\Final_pres\WALC_map.json"
 attribute_grid, spawn_points, exit_points, side_length = parse_block_data(file_name) #sys.argv[1]
+cell_masks = CellMasks.from_grid(attribute_grid)
 
 width = side_length
 height = side_length
@@ -63,7 +50,7 @@ class IndoorModel(mesa.Model):
         self.grid = MultiGrid(width, height, torus=False)
         self.schedule = RandomActivation(self)
         self.graph = self.build_graph()
-        self.noise = np.zeros((width, height))
+        self.noise = DenseNoiseField(width, height)
         self.width = width
         self.height = height
 
@@ -82,32 +69,17 @@ class IndoorModel(mesa.Model):
     def build_graph(self):
         """Converts the grid to a NetworkX graph for pathfinding."""
         G = nx.grid_2d_graph(width, height)
-        for x in range(width):
-            for y in range(height):
-                if attribute_grid[x, y] == attributes['wall']:
-                    G.remove_node((x, y))
+        G.remove_nodes_from((int(x), int(y)) for x, y in np.argwhere(~cell_masks.walkable))
         return G
 
     def step(self):
         """Advance the model by one step."""
-        self.noise = np.maximum(self.noise - NOISE_DECAY, 0.0)
+        self.noise.decay(NOISE_DECAY)
         self.schedule.step()
 
     def add_noise(self, cx: int, cy: int, noise: float = 1.0):
-        center = [cx, cy]
-        sigma = [noise * 3, noise * 3]
-        x = np.arange(self.width)
-        y = np.arange(self.height)
-        x_grid, y_grid = np.meshgrid(x, y)
-
-        # clamp example, for my notes
-        #max(0, min(1, value))  # Clamp to 0-1
-
-        # Gaussian equation
-        gaussian = noise * np.exp(
-            -((x_grid - center[1])**2 / (2 * sigma[1]**2) + (y_grid - center[0])**2 / (2 * sigma[0]**2))
-        )
-        self.noise = np.clip(self.noise + gaussian, 0, 1)
+        # Clamp to 0-1
+        self.noise.stamp(cx, cy, noise, ceiling=1.0)
 
     def get_noise_at(self, pos):
         x, y = map(int, pos) 
@@ -206,7 +178,6 @@ class StudentAgent(mesa.Agent):
         """
         if self.pos is None:
             return
-        cell_type = attribute_grid[self.pos[0], self.pos[1]]
         neighbors = self.model.grid.get_neighbors(
                 self.pos,  # Position of the agent
                 moore=True,
@@ -265,10 +236,9 @@ def plot_line(location, direction):
     x, y = location
     dx, dy = direction
     while 0 <= x < width and 0 <= y < height:
-        loc_type = attribute_grid[x, y]
-        if loc_type == attributes['wall']:
+        if not cell_masks.walkable[x, y]:
             return None
-        if loc_type in [attributes['social'], attributes['work']]:
+        if cell_masks.is_target[x, y]:
             return (x, y)
         x += dx
         y += dy
@@ -277,9 +247,9 @@ def plot_line(location, direction):
 
 if __name__ == "__main__":
     model = IndoorModel(num_agents=40, width=width, height=height)
-    for i in range(100):  # Simulate 10 steps
-        print(f"Step {i + 1}")
-        model.step()
+    controller = RunController(model, max_steps=100, verbose=True)
+    controller.run()
+    print(f"Stopped after {model.schedule.steps} steps: {controller.reason}")
 
     print(model.passages)
 
@@ -0,0 +1,130 @@
+"""
+Memory footprint of the indoor models.
+
+Reports bytes per agent and bytes per cell for the Mesa IndoorModel and the
+array KernelModel on a floor plan, so the cost of a larger population or a
+larger floor can be read off before starting a long run.
+
+For the Mesa model the Python heap is traced: the per-agent figure is the
+difference between a model with 2N agents and one with N, divided by N, and
+what is left of the N-agent model over the cell count is the per-cell
+figure (grid, walking graph, passage and noise arrays). For the kernels the
+arrays are counted directly.
+
+Usage:
+    python membench.py floor_plan.json [--agents N] [--steps N] [--replicates R]
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import tracemalloc
+
+import main
+from kernels import KernelModel
+
+# KernelModel arrays with one entry per agent; everything else is per cell
+_AGENT_ARRAYS = ("pos", "alive", "focus", "has_target", "goal", "previous", "seat", "claimed", "base",
+                 "component")
+
+
+def _traced(build):
+    """Python heap bytes held by what ``build()`` returns, and the object itself."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        obj = build()
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0] - before, obj
+    finally:
+        tracemalloc.stop()
+
+
+def mesa_footprint(num_agents, steps=0) -> dict:
+    """
+    Traced memory of IndoorModel on the loaded floor plan.
+
+    Args:
+        num_agents (int): Agents in the smaller of the two models built.
+        steps (int): Steps run before measuring, so destination stacks and
+            path caches have filled in.
+
+    Returns:
+        dict: ``bytes_per_agent``, ``bytes_per_cell`` and the per-cell
+        breakdown of the model's arrays and graph.
+    """
+    def build(n):
+        def run():
+            main.random.seed(0)
+            model = main.IndoorModel(n, main.w, main.h, seed=0)
+            with contextlib.redirect_stdout(io.StringIO()):
+                for _ in range(steps):
+                    model.step()
+            return model
+        return run
+
+    small, model = _traced(build(num_agents))
+    large, _ = _traced(build(2 * num_agents))
+    per_agent = (large - small) / num_agents
+    cells = main.w * main.h
+
+    graph, _ = _traced(model.build_graph)
+    arrays = {
+        "passages": model.passages.nbytes,
+        "noise": model.noise.nbytes,
+        "seats": model.seats.free.nbytes + model.seats.capacity.nbytes,
+        "grid": main.attribute_grid.nbytes,
+    }
+    return {
+        "bytes_per_agent": per_agent,
+        "bytes_per_cell": (small - per_agent * num_agents) / cells,
+        "graph_per_cell": graph / cells,
+        **{f"{name}_per_cell": nbytes / cells for name, nbytes in arrays.items()},
+    }
+
+
+def kernel_footprint(num_agents, replicates=None) -> dict:
+    """
+    Array memory of KernelModel on the loaded floor plan.
+
+    Args:
+        num_agents (int): Agents per replicate.
+        replicates (int | None): Replicates, or None for a single model.
+
+    Returns:
+        dict: ``bytes_per_agent``, ``bytes_per_cell`` (per replicate cell for
+        the state, plus the shared routing table over the plan's cells).
+    """
+    model = KernelModel(main.attribute_grid, main.spawn_points, main.exit_points, num_agents,
+                        seed=0, replicates=replicates, capacity=main.cell_masks.capacity,
+                        labels=main.plan_analysis.labels)
+    agents = len(model.alive)
+    cells = main.w * main.h
+    per_agent = sum(getattr(model, name).nbytes for name in _AGENT_ARRAYS)
+    state = model.passages.nbytes + model.noise.nbytes + model.free.nbytes
+    shared = sum(a.nbytes for a in (model.is_wall, model.is_target, model.is_exit, model.is_social,
+                                    model.capacity, model.routes.next_step, model.routes.goal_index))
+    return {
+        "bytes_per_agent": per_agent / agents,
+        "bytes_per_cell": state / (cells * (replicates or 1)),
+        "shared_per_cell": shared / cells,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report bytes per agent and per cell of the models.")
+    parser.add_argument("floor_plan")
+    parser.add_argument("--agents", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--replicates", type=int, default=None)
+    args = parser.parse_args()
+
+    main.load_floor_plan(args.floor_plan)
+    print(f"{main.w} x {main.h} cells, {args.agents} agents")
+    for name, report in (("mesa", mesa_footprint(args.agents, args.steps)),
+                         ("kernel", kernel_footprint(args.agents, args.replicates))):
+        print(name)
+        for key, value in report.items():
+            print(f"  {key}: {value:,.1f}")
@@ -0,0 +1,209 @@
+"""
+Noise fields for the indoor models.
+
+Both fields hold float32 noise levels per cell and share one interface:
+
+    decay(amount)                 lower every cell by ``amount``, not below 0
+    stamp(cx, cy, loudness)       add a Gaussian centred on a cell
+    add(values)                   add a whole (width, height) array
+    field[x, y]                   noise at one cell
+    dense()                       the whole field as a (width, height) array
+
+DenseNoiseField is a plain array. TiledNoiseField splits the floor into
+square tiles and only stores tiles with a cell above ``epsilon``, so a large
+floor with a few noisy rooms costs memory and decay time for those rooms
+only. ``np.asarray(field)`` gives the dense view of either, for plotting and
+for code that expects the old array.
+"""
+
+import numpy as np
+from numpy.typing import NDArray
+
+# Noise levels at or below this count as silence
+NOISE_EPSILON = 1e-3
+
+
+def _stamp_bounds(cx, cy, loudness, width, height, epsilon):
+    """The cells a stamp reaches above ``epsilon``, and its values there."""
+    if loudness <= epsilon:
+        return None
+    sigma = 3 * loudness
+    radius = int(np.ceil(sigma * np.sqrt(2 * np.log(loudness / epsilon))))
+    x0, x1 = max(cx - radius, 0), min(cx + radius + 1, width)
+    y0, y1 = max(cy - radius, 0), min(cy + radius + 1, height)
+    if x0 >= x1 or y0 >= y1:
+        return None
+
+    dx = np.arange(x0, x1) - cx
+    dy = np.arange(y0, y1) - cy
+    values = loudness * np.exp(-(dx[:, np.newaxis] ** 2 + dy[np.newaxis, :] ** 2) / (2 * sigma ** 2))
+    return x0, x1, y0, y1, values.astype(np.float32)
+
+
+class DenseNoiseField:
+    """
+    Noise over every cell of the floor.
+
+    Args:
+        width (int): Grid width.
+        height (int): Grid height.
+        epsilon (float): Stamps are cut off where they fall below this.
+    """
+
+    def __init__(self, width, height, epsilon=NOISE_EPSILON):
+        self.shape = (width, height)
+        self.epsilon = epsilon
+        self.values = np.zeros(self.shape, dtype=np.float32)
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes
+
+    def decay(self, amount):
+        np.maximum(self.values - amount, 0.0, out=self.values)
+
+    def stamp(self, cx, cy, loudness, ceiling=None):
+        """
+        Add a Gaussian of peak ``loudness`` and spread ``3 * loudness`` at
+        (cx, cy), capping the result at ``ceiling`` if given.
+        """
+        bounds = _stamp_bounds(cx, cy, loudness, *self.shape, self.epsilon)
+        if bounds is None:
+            return
+        x0, x1, y0, y1, values = bounds
+        block = self.values[x0:x1, y0:y1]
+        block += values
+        if ceiling is not None:
+            np.minimum(block, ceiling, out=block)
+
+    def add(self, values, ceiling=None):
+        """Add a (width, height) array, capping the result at ``ceiling`` if given."""
+        self.values += values
+        if ceiling is not None:
+            np.minimum(self.values, ceiling, out=self.values)
+
+    def __getitem__(self, cell):
+        return self.values[cell]
+
+    def dense(self) -> NDArray:
+        return self.values.copy()
+
+    def __array__(self, dtype=None, copy=None):
+        return self.values.astype(dtype or self.values.dtype, copy=True)
+
+
+class TiledNoiseField:
+    """
+    Noise stored only in tiles where something is audible.
+
+    Live tiles sit in one (slots, tile, tile) pool, so decay is a single
+    array operation over the live slots; tiles whose loudest cell has decayed
+    to ``epsilon`` or below are zeroed and their slots reused.
+
+    Args:
+        width (int): Grid width.
+        height (int): Grid height.
+        tile (int): Side length of a tile in cells.
+        epsilon (float): Stamps are cut off, and tiles dropped, at this level.
+    """
+
+    def __init__(self, width, height, tile=32, epsilon=NOISE_EPSILON):
+        self.shape = (width, height)
+        self.tile = tile
+        self.epsilon = epsilon
+
+        self.pool = np.zeros((4, tile, tile), dtype=np.float32)
+        self.slots = {}  # (tile x, tile y) -> slot in pool
+        self._keys = {}  # slot -> (tile x, tile y)
+        self._free = list(reversed(range(len(self.pool))))
+
+    @property
+    def nbytes(self) -> int:
+        return self.pool.nbytes
+
+    @property
+    def live_tiles(self) -> int:
+        return len(self.slots)
+
+    def _slot(self, key):
+        slot = self.slots.get(key)
+        if slot is not None:
+            return slot
+        if not self._free:
+            grown = len(self.pool)
+            self.pool = np.concatenate([self.pool, np.zeros_like(self.pool)])
+            self._free = list(reversed(range(grown, len(self.pool))))
+        slot = self._free.pop()
+        self.slots[key] = slot
+        self._keys[slot] = key
+        return slot
+
+    def decay(self, amount):
+        if not self.slots:
+            return
+        live = np.fromiter(self.slots.values(), dtype=np.intp, count=len(self.slots))
+        tiles = np.maximum(self.pool[live] - amount, 0.0)
+        self.pool[live] = tiles
+
+        quiet = live[tiles.reshape(len(live), -1).max(axis=1) <= self.epsilon]
+        if len(quiet):
+            self.pool[quiet] = 0.0
+            for slot in quiet.tolist():
+                del self.slots[self._keys.pop(slot)]
+                self._free.append(slot)
+
+    def stamp(self, cx, cy, loudness, ceiling=None):
+        """
+        Add a Gaussian of peak ``loudness`` and spread ``3 * loudness`` at
+        (cx, cy), capping the result at ``ceiling`` if given.
+        """
+        bounds = _stamp_bounds(cx, cy, loudness, *self.shape, self.epsilon)
+        if bounds is None:
+            return
+        x0, x1, y0, y1, values = bounds
+        t = self.tile
+        for tx in range(x0 // t, (x1 - 1) // t + 1):
+            for ty in range(y0 // t, (y1 - 1) // t + 1):
+                # Overlap of the stamp with this tile, in grid coordinates
+                gx0, gx1 = max(x0, tx * t), min(x1, (tx + 1) * t)
+                gy0, gy1 = max(y0, ty * t), min(y1, (ty + 1) * t)
+                slot = self._slot((tx, ty))
+                block = self.pool[slot, gx0 - tx * t:gx1 - tx * t, gy0 - ty * t:gy1 - ty * t]
+                block += values[gx0 - x0:gx1 - x0, gy0 - y0:gy1 - y0]
+                if ceiling is not None:
+                    np.minimum(block, ceiling, out=block)
+
+    def add(self, values, ceiling=None):
+        """
+        Add a (width, height) array, capping the result at ``ceiling`` if
+        given. Only tiles where ``values`` exceeds ``epsilon`` are touched.
+        """
+        t = self.tile
+        width, height = self.shape
+        padded = np.zeros((-(-width // t) * t, -(-height // t) * t), dtype=np.float32)
+        padded[:width, :height] = values
+        tiles = padded.reshape(padded.shape[0] // t, t, padded.shape[1] // t, t).swapaxes(1, 2)
+        for tx, ty in np.argwhere(tiles.max(axis=(2, 3)) > self.epsilon).tolist():
+            slot = self._slot((tx, ty))
+            self.pool[slot] += tiles[tx, ty]
+            if ceiling is not None:
+                np.minimum(self.pool[slot], ceiling, out=self.pool[slot])
+
+    def __getitem__(self, cell):
+        x, y = cell
+        slot = self.slots.get((x // self.tile, y // self.tile))
+        if slot is None:
+            return np.float32(0.0)
+        return self.pool[slot, x % self.tile, y % self.tile]
+
+    def dense(self) -> NDArray:
+        t = self.tile
+        width, height = self.shape
+        out = np.zeros((-(-width // t) * t, -(-height // t) * t), dtype=np.float32)
+        for (tx, ty), slot in self.slots.items():
+            out[tx * t:(tx + 1) * t, ty * t:(ty + 1) * t] = self.pool[slot]
+        return out[:width, :height]
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self.dense()
+        return dense if dtype is None else dense.astype(dtype)
@@ -0,0 +1,159 @@
+"""
+Cached shortest paths on the NetworkX walking graph.
+
+An agent walking to its target asks for the next cell on every tick. Every
+cell along a shortest path is itself the start of a shortest path to the same
+target, so one Dijkstra search answers the lookups for the whole walk:
+PathCache stores each computed path once and indexes every suffix of it by
+(cell, target). Lookups afterwards are a dictionary hit.
+
+The cache is emptied whenever the graph changes. VersionedGraph counts its
+own mutations so the cache can tell; with a plain ``nx.Graph`` call ``clear``
+after editing it.
+"""
+
+from collections import OrderedDict
+
+import networkx as nx
+
+
+class VersionedGraph(nx.Graph):
+    """An ``nx.Graph`` whose ``version`` goes up on every change to its nodes or edges."""
+
+    def __init__(self, incoming_graph_data=None, **attr):
+        self.version = 0
+        super().__init__(incoming_graph_data, **attr)
+
+    def _changed(self):
+        self.version += 1
+
+    def add_node(self, node_for_adding, **attr):
+        super().add_node(node_for_adding, **attr)
+        self._changed()
+
+    def add_nodes_from(self, nodes_for_adding, **attr):
+        super().add_nodes_from(nodes_for_adding, **attr)
+        self._changed()
+
+    def remove_node(self, n):
+        super().remove_node(n)
+        self._changed()
+
+    def remove_nodes_from(self, nodes):
+        super().remove_nodes_from(nodes)
+        self._changed()
+
+    def add_edge(self, u_of_edge, v_of_edge, **attr):
+        super().add_edge(u_of_edge, v_of_edge, **attr)
+        self._changed()
+
+    def add_edges_from(self, ebunch_to_add, **attr):
+        super().add_edges_from(ebunch_to_add, **attr)
+        self._changed()
+
+    def remove_edge(self, u, v):
+        super().remove_edge(u, v)
+        self._changed()
+
+    def remove_edges_from(self, ebunch):
+        super().remove_edges_from(ebunch)
+        self._changed()
+
+    def update(self, edges=None, nodes=None):
+        super().update(edges, nodes)
+        self._changed()
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def clear_edges(self):
+        super().clear_edges()
+        self._changed()
+
+
+class PathCache:
+    """
+    Bounded LRU of shortest paths keyed by (cell, target).
+
+    Args:
+        maxsize (int): Most (cell, target) entries kept.
+    """
+
+    def __init__(self, maxsize=65536):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        # (cell, target) -> (path, index of cell in path), or (None, 0) if unreachable
+        self._entries = OrderedDict()
+        self._graph = None
+        self._version = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self):
+        """Forget every cached path."""
+        self._entries.clear()
+
+    def _lookup(self, graph, source, target):
+        version = getattr(graph, "version", None)
+        if graph is not self._graph or version != self._version:
+            self.clear()
+            self._graph = graph
+            self._version = version
+
+        key = (source, target)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        try:
+            path = tuple(nx.dijkstra_path(graph, source, target))
+        except nx.NetworkXNoPath:
+            self._store(key, (None, 0))
+            return None, 0
+
+        for i, cell in enumerate(path):
+            self._store((cell, target), (path, i))
+        return path, 0
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def path(self, graph, source, target) -> list:
+        """
+        A shortest path from ``source`` to ``target``, both included.
+
+        Raises:
+            nx.NetworkXNoPath: If ``target`` cannot be reached.
+        """
+        path, i = self._lookup(graph, source, target)
+        if path is None:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        return list(path[i:])
+
+    def next_step(self, graph, source, target):
+        """
+        The cell after ``source`` on a shortest path to ``target``, or
+        ``source`` itself once there.
+
+        Raises:
+            nx.NetworkXNoPath: If ``target`` cannot be reached.
+        """
+        path, i = self._lookup(graph, source, target)
+        if path is None:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        return path[i + 1] if i + 1 < len(path) else path[i]
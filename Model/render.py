@@ -0,0 +1,325 @@
+"""
+Batch rendering of heatmaps and noise animations without Matplotlib figures.
+
+Arrays are mapped to colours through a 256-entry lookup table: values are
+scaled to 0..255 with fixed limits, so every frame of an animation shares one
+colour scale, and a single indexing operation turns the grid into RGB. Walls
+of the floor plan are drawn in a fixed grey. Frames are enlarged by repeating
+cells and written as PNGs with zlib, so a frame costs a few array passes plus
+its compression. A replay's upper limit defaults to the largest value over
+the steps drawn (``replay_limit``), so no frame is clipped; ``--vmax`` sets
+it instead.
+
+Work is spread over a process pool. Every worker opens the replay on its own
+and renders a contiguous range of steps, so a worker only reconstructs a
+keyframe once per range and the main process does nothing but hand out
+ranges. Heatmap files are rendered one per task.
+
+Inputs are
+    - replay files from ``replay.py``, rendered frame by frame (``frames``),
+    - .npy arrays, either one heatmap or a stack of frames,
+    - .npz files holding ``passages`` (``cli.py run``) or a SweepAggregator
+      (the per-cell mean of ``passages``).
+Stacks are memory-mapped, so nothing is loaded before it is rendered.
+
+The numbered PNGs of ``frames`` make a video with, for example,
+``ffmpeg -framerate 30 -i frames/frame-%06d.png noise.mp4``.
+
+Usage:
+    python render.py heatmaps OUTPUT_DIR run1.npy run2.npz ... [--floor-plan floor_plan.json] [--vmax V] [--log]
+    python render.py frames run.abmr OUTPUT_DIR [--field noise|passages] [--every K] [--scale N]
+    python render.py frames stack.npy OUTPUT_DIR [--vmax V]
+"""
+
+import argparse
+import functools
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.typing import NDArray
+
+from cells import CellType
+
+# Colours at 17 evenly spaced points of Matplotlib's maps, interpolated
+# linearly; within a few levels of the originals
+COLORMAPS = {
+    "viridis": [(68, 1, 84), (72, 24, 106), (71, 45, 123), (66, 64, 134), (59, 82, 139), (51, 99, 141),
+                (44, 114, 142), (38, 130, 142), (33, 145, 140), (31, 160, 136), (40, 174, 128),
+                (63, 188, 115), (94, 201, 98), (132, 212, 75), (173, 220, 48), (216, 226, 25), (253, 231, 37)],
+    "inferno": [(0, 0, 4), (11, 7, 36), (33, 12, 74), (61, 9, 101), (87, 16, 110), (113, 25, 110),
+                (138, 34, 106), (163, 44, 97), (188, 55, 84), (210, 70, 68), (228, 90, 49),
+                (241, 115, 29), (249, 142, 9), (252, 172, 17), (249, 203, 53), (242, 234, 105), (252, 255, 164)],
+}
+
+WALL_COLOR = (96, 96, 96)
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def colormap_lut(name: str = "viridis") -> NDArray:
+    """
+    A colour lookup table.
+
+    Args:
+        name (str): One of ``COLORMAPS``, or any Matplotlib colormap if
+            Matplotlib is installed.
+
+    Returns:
+        NDArray: uint8 array of shape (256, 3).
+    """
+    positions = np.linspace(0.0, 1.0, 256)
+    if name in COLORMAPS:
+        anchors = np.array(COLORMAPS[name], dtype=np.float64)
+        stops = np.linspace(0.0, 1.0, len(anchors))
+        lut = np.stack([np.interp(positions, stops, anchors[:, c]) for c in range(3)], axis=1)
+    else:
+        import matplotlib
+
+        lut = matplotlib.colormaps[name](positions)[:, :3] * 255
+    return np.round(lut).astype(np.uint8)
+
+
+def encode_png(rgb: NDArray, level: int = 6) -> bytes:
+    """
+    Encode an image as an 8-bit RGB PNG.
+
+    Args:
+        rgb (NDArray): uint8 array of shape (rows, columns, 3).
+        level (int): zlib compression level.
+    """
+    rows, columns, _ = rgb.shape
+    # Every scanline starts with its filter type, 0 for none
+    raw = np.zeros((rows, 1 + columns * 3), dtype=np.uint8)
+    raw[:, 1:] = rgb.reshape(rows, columns * 3)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", columns, rows, 8, 2, 0, 0, 0)
+    return (_PNG_SIGNATURE + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw.tobytes(), level))
+            + chunk(b"IEND", b""))
+
+
+@dataclass
+class Renderer:
+    """
+    Maps grids to images with fixed colour limits.
+
+    Args:
+        lut (NDArray): Colour table from ``colormap_lut``.
+        vmin (float): Value drawn in the first colour.
+        vmax (float | None): Value drawn in the last colour; each array's own
+            maximum if None.
+        log (bool): Scale by ``log1p`` of the values, for heavy-tailed counts.
+        scale (int): Pixels per cell.
+        walls (NDArray | None): Bool grid of cells drawn as walls.
+        level (int): zlib compression level.
+    """
+
+    lut: NDArray
+    vmin: float = 0.0
+    vmax: float | None = None
+    log: bool = False
+    scale: int = 10
+    walls: NDArray | None = None
+    level: int = 6
+
+    def rgb(self, values: NDArray) -> NDArray:
+        """The image of a grid, shape (rows * scale, columns * scale, 3)."""
+        values = np.asarray(values, dtype=np.float32)
+        vmin = self.vmin
+        vmax = float(values.max()) if self.vmax is None else self.vmax
+        if self.log:
+            values, vmin, vmax = np.log1p(values), np.log1p(vmin), np.log1p(vmax)
+
+        span = vmax - vmin if vmax > vmin else 1.0
+        levels = np.clip((values - vmin) * (255.0 / span), 0, 255).astype(np.uint8)
+        image = self.lut[levels]
+        if self.walls is not None:
+            image[self.walls] = WALL_COLOR
+        if self.scale > 1:
+            image = image.repeat(self.scale, axis=0).repeat(self.scale, axis=1)
+        return image
+
+    def png(self, values: NDArray) -> bytes:
+        return encode_png(self.rgb(values), self.level)
+
+    def write(self, values: NDArray, path: str):
+        with open(path, "wb") as f:
+            f.write(self.png(values))
+
+
+def load_heatmap(path: str) -> NDArray:
+    """The passages heatmap stored in a .npy or .npz file."""
+    if path.endswith(".npy"):
+        return np.load(path)
+    with np.load(path) as data:
+        for key in ("passages", "stats/passages/mean"):
+            if key in data.files:
+                return data[key]
+    raise ValueError(f"{path} holds no passages heatmap")
+
+
+def _render_heatmap(renderer: Renderer, source: str, output: str):
+    renderer.write(load_heatmap(source), output)
+    return output
+
+
+def _render_replay_steps(renderer: Renderer, path: str, field: str, steps: list, output_dir: str):
+    from replay import ReplayReader
+
+    reader = ReplayReader(path)
+    try:
+        for number, step in steps:
+            frame = reader.frame(step)
+            renderer.write(getattr(frame, field), os.path.join(output_dir, f"frame-{number:06d}.png"))
+    finally:
+        reader.close()
+    return len(steps)
+
+
+def _render_stack_frames(renderer: Renderer, path: str, frames: list, output_dir: str):
+    stack = np.load(path, mmap_mode="r")
+    for number, index in frames:
+        renderer.write(stack[index], os.path.join(output_dir, f"frame-{number:06d}.png"))
+    return len(frames)
+
+
+def _ranges(items: list, parts: int) -> list:
+    """Split ``items`` into at most ``parts`` contiguous ranges."""
+    size = max(1, -(-len(items) // parts))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def render_heatmaps(renderer: Renderer, sources: list, output_dir: str, workers=None) -> list:
+    """
+    Render one PNG per heatmap file, named after the file.
+
+    Returns:
+        list: Paths of the written images.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = [os.path.join(output_dir, os.path.splitext(os.path.basename(s))[0] + ".png") for s in sources]
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(_render_heatmap, [renderer] * len(sources), sources, outputs, chunksize=16))
+
+
+def render_frames(renderer: Renderer, path: str, output_dir: str, field="noise", every=1,
+                  start=None, stop=None, workers=None) -> int:
+    """
+    Render the frames of a replay file or a .npy stack as numbered PNGs.
+
+    Args:
+        renderer (Renderer): Colouring; set ``vmax`` so frames share a scale.
+        path (str): Replay file or .npy array of shape (frames, width, height).
+        output_dir (str): Directory for ``frame-000000.png`` onwards.
+        field (str): ``noise`` or ``passages``, for replays.
+        every (int): Render every ``every``-th step.
+        start, stop (int | None): Range of steps or stack indices.
+        workers (int | None): Processes, one per CPU if None.
+
+    Returns:
+        int: Number of frames written.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    if path.endswith(".npy"):
+        count = len(np.load(path, mmap_mode="r"))
+        indices = range(count)[start:stop:every]
+        task = functools.partial(_render_stack_frames, renderer, path)
+    else:
+        from replay import ReplayReader
+
+        reader = ReplayReader(path)
+        indices = _replay_steps(reader, every, start, stop)
+        reader.close()
+        task = functools.partial(_render_replay_steps, renderer, path, field)
+
+    # A few ranges per worker keep the pool busy until the end
+    ranges = _ranges(list(enumerate(indices)), workers * 4)
+    with ProcessPoolExecutor(workers) as pool:
+        return sum(pool.map(task, ranges, [output_dir] * len(ranges)))
+
+
+def _replay_steps(reader, every=1, start=None, stop=None) -> range:
+    """The steps of a replay that ``render_frames`` draws."""
+    first, last = reader.keyframe_steps[0], reader.last_step
+    return range(first if start is None else start, last + 1 if stop is None else stop, every)
+
+
+def replay_limit(path: str, field: str, every=1, start=None, stop=None) -> float:
+    """
+    A colour limit for a replay's field over the steps ``render_frames``
+    draws with the same ``every``, ``start`` and ``stop``: the largest noise
+    at any of them, or the passages at the last, since passages only grow.
+    Reading every step replays the deltas in order, which is cheap next to
+    rendering them.
+    """
+    from replay import ReplayReader
+
+    reader = ReplayReader(path)
+    try:
+        steps = _replay_steps(reader, every, start, stop)
+        if not len(steps):
+            return 0.0
+        if field == "passages":
+            return float(reader.frame(steps[-1]).passages.max())
+        return max(float(reader.frame(step).noise.max()) for step in steps)
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    import time
+
+    parser = argparse.ArgumentParser(description="Render heatmaps and noise frames to PNG.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_style(command, cmap):
+        command.add_argument("--cmap", default=cmap)
+        command.add_argument("--vmin", type=float, default=0.0)
+        command.add_argument("--vmax", type=float, default=None)
+        command.add_argument("--log", action="store_true", help="colour by log(1 + value)")
+        command.add_argument("--scale", type=int, default=10, help="pixels per cell")
+        command.add_argument("--workers", type=int, default=None)
+
+    heatmaps = commands.add_parser("heatmaps", help="one image per heatmap file")
+    heatmaps.add_argument("output_dir")
+    heatmaps.add_argument("sources", nargs="+")
+    heatmaps.add_argument("--floor-plan", default=None, help="draw the walls of this plan")
+    add_style(heatmaps, "viridis")
+
+    frames = commands.add_parser("frames", help="numbered frames of a replay or a .npy stack")
+    frames.add_argument("source")
+    frames.add_argument("output_dir")
+    frames.add_argument("--field", default="noise", choices=["noise", "passages"])
+    frames.add_argument("--every", type=int, default=1)
+    frames.add_argument("--start", type=int, default=None)
+    frames.add_argument("--stop", type=int, default=None)
+    add_style(frames, "inferno")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    renderer = Renderer(colormap_lut(args.cmap), args.vmin, args.vmax, args.log, args.scale)
+    if args.command == "heatmaps":
+        if args.floor_plan:
+            from cells import read_plan
+            renderer.walls = read_plan(args.floor_plan)[0] == CellType.WALL
+        count = len(render_heatmaps(renderer, args.sources, args.output_dir, args.workers))
+    else:
+        if not args.source.endswith(".npy"):
+            from replay import ReplayReader
+            reader = ReplayReader(args.source)
+            renderer.walls = reader.attribute_grid == CellType.WALL
+            reader.close()
+            if renderer.vmax is None:
+                renderer.vmax = replay_limit(args.source, args.field, args.every, args.start, args.stop)
+        count = render_frames(renderer, args.source, args.output_dir, args.field, args.every,
+                              args.start, args.stop, args.workers)
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {count} images to {args.output_dir} in {elapsed:.2f} s ({count / elapsed:.0f} per second)")
@@ -0,0 +1,328 @@
+"""
+Replay files for IndoorModel runs.
+
+A replay stores the floor plan and the initial state once, then one record per
+step holding only what changed. Every ``keyframe_interval`` steps a keyframe
+with the full state is written so a viewer can seek without replaying from
+the start. All integers are little-endian.
+
+    header     magic "ABMR", version u16, 2 pad bytes, width u32, height u32,
+               keyframe_interval u32, noise_threshold f32,
+               attribute grid u8[width * height]
+    record     kind u8, 3 pad bytes, step u32, payload length u32, payload
+
+    keyframe   agents   count u32, ids u32[n], x u16[n], y u16[n]
+               noise    count u32, cells u32[n], values f32[n]
+               passages count u32, cells u32[n], values u32[n]
+    delta      moves    count u32, ids u32[n], dx i8[n], dy i8[n]
+               spawns   count u32, ids u32[n], x u16[n], y u16[n]
+               exits    count u32, ids u32[n]
+               noise    count u32, cells u32[n], values f32[n]
+
+    index      steps u32[k], offsets u64[k]
+    trailer    magic "ABMI", index offset u64, k u32
+
+Noise is only recorded where it moved by more than ``noise_threshold`` since
+it was last written. Passages are exact at keyframes; in between they are
+rebuilt by counting the cell of every agent on the grid once per step, which
+is how ``StudentAgent.move`` accumulates them (the final cell of an agent
+leaving through an exit is not counted until the next keyframe).
+
+Usage:
+    python replay.py record floor_plan.json run.abmr [--agents N] [--steps N]
+    python replay.py info run.abmr
+"""
+
+import argparse
+import bisect
+import mmap
+import struct
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.typing import NDArray
+
+from frames import Snapshot, diff, take_snapshot
+
+REPLAY_MAGIC = b"ABMR"
+INDEX_MAGIC = b"ABMI"
+REPLAY_VERSION = 1
+
+KIND_KEYFRAME = 1
+KIND_DELTA = 2
+
+_HEADER = struct.Struct("<4sHxxIIIf")
+_RECORD = struct.Struct("<BxxxII")
+_TRAILER = struct.Struct("<4sQI")
+_COUNT = struct.Struct("<I")
+
+
+@dataclass
+class ReplayFrame:
+    """The state of a recorded run at one step."""
+
+    step: int
+    ids: NDArray          # uint32, sorted
+    positions: NDArray    # int32, shape (n, 2)
+    noise: NDArray        # float32, shape (width, height)
+    passages: NDArray     # uint32, shape (width, height)
+
+
+def _section(*arrays: NDArray) -> list[bytes]:
+    return [_COUNT.pack(len(arrays[0]))] + [np.ascontiguousarray(a).tobytes() for a in arrays]
+
+
+class ReplayWriter:
+    """
+    Streams a model run to a replay file, one call to ``record`` per step.
+
+    Args:
+        path (str): File to write.
+        model: The model being run.
+        attribute_grid: The floor plan's cell types.
+        keyframe_interval (int): Steps between full keyframes.
+        noise_threshold (float): Smallest noise change written to a delta.
+    """
+
+    def __init__(self, path, model, attribute_grid, keyframe_interval=100, noise_threshold=1e-3):
+        self.model = model
+        self.keyframe_interval = keyframe_interval
+        self.noise_threshold = noise_threshold
+        self.index_steps: list[int] = []
+        self.index_offsets: list[int] = []
+
+        self.reference = take_snapshot(model)
+        width, height = self.reference.noise.shape
+
+        self.file = open(path, "wb")
+        self.file.write(_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, width, height, keyframe_interval, noise_threshold))
+        self.file.write(np.asarray(attribute_grid, dtype=np.uint8).tobytes())
+        self._write_keyframe()
+
+    def _write_record(self, kind: int, step: int, parts: list[bytes]):
+        payload = b"".join(parts)
+        self.file.write(_RECORD.pack(kind, step, len(payload)))
+        self.file.write(payload)
+
+    def _write_keyframe(self):
+        snapshot = self.reference
+        noise_cells = np.flatnonzero(snapshot.noise).astype(np.uint32)
+        passage_cells = np.flatnonzero(snapshot.passages).astype(np.uint32)
+
+        self.index_steps.append(snapshot.step)
+        self.index_offsets.append(self.file.tell())
+        self._write_record(KIND_KEYFRAME, snapshot.step, [
+            *_section(snapshot.ids, snapshot.positions[:, 0], snapshot.positions[:, 1]),
+            *_section(noise_cells, snapshot.noise.ravel()[noise_cells]),
+            *_section(passage_cells, snapshot.passages.ravel()[passage_cells]),
+        ])
+
+    def record(self):
+        """Append the model's latest step."""
+        delta = diff(self.reference, take_snapshot(self.model), self.noise_threshold)
+
+        # Moves too long for an i8 (teleports) are stored as an exit and a spawn
+        offsets = delta.positions.astype(np.int32) - delta.previous
+        spawned = (delta.previous[:, 0] < 0) | np.any(np.abs(offsets) > 127, axis=1)
+        teleported = delta.ids[spawned & (delta.previous[:, 0] >= 0)]
+
+        self._write_record(KIND_DELTA, delta.step, [
+            *_section(delta.ids[~spawned], offsets[~spawned, 0].astype(np.int8), offsets[~spawned, 1].astype(np.int8)),
+            *_section(delta.ids[spawned], delta.positions[spawned, 0], delta.positions[spawned, 1]),
+            *_section(np.concatenate([delta.removed, teleported]).astype(np.uint32)),
+            *_section(delta.noise_cells, delta.noise_values),
+        ])
+
+        if delta.step - self.index_steps[-1] >= self.keyframe_interval:
+            self._write_keyframe()
+
+    def close(self):
+        """Write the keyframe index and close the file."""
+        index_offset = self.file.tell()
+        self.file.write(np.array(self.index_steps, dtype="<u4").tobytes())
+        self.file.write(np.array(self.index_offsets, dtype="<u8").tobytes())
+        self.file.write(_TRAILER.pack(INDEX_MAGIC, index_offset, len(self.index_steps)))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ReplayReader:
+    """
+    Memory-maps a replay file for random access by step.
+
+    Args:
+        path (str): File to read.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, width, height, interval, threshold = _HEADER.unpack_from(self.buffer, 0)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"{path} is not a version {REPLAY_VERSION} replay file")
+
+        self.width = width
+        self.height = height
+        self.keyframe_interval = interval
+        self.noise_threshold = threshold
+        # A copy, since close() cannot unmap the file while views into it exist
+        grid = np.frombuffer(self.buffer, np.uint8, width * height, _HEADER.size)
+        self.attribute_grid = grid.reshape(width, height).copy()
+        self._records_start = _HEADER.size + width * height
+
+        trailer_magic, index_offset, count = _TRAILER.unpack_from(self.buffer, len(self.buffer) - _TRAILER.size)
+        if trailer_magic == INDEX_MAGIC:
+            self._records_end = index_offset
+            self.keyframe_steps = np.frombuffer(self.buffer, "<u4", count, index_offset).tolist()
+            self.keyframe_offsets = np.frombuffer(self.buffer, "<u8", count, index_offset + 4 * count).tolist()
+        else:
+            # The writer never finished, so rebuild the index by walking the records
+            self._records_end = len(self.buffer)
+            self.keyframe_steps, self.keyframe_offsets = [], []
+            for offset, kind, step in self._walk(self._records_start):
+                if kind == KIND_KEYFRAME:
+                    self.keyframe_steps.append(step)
+                    self.keyframe_offsets.append(offset)
+
+        self.last_step = self.keyframe_steps[-1]
+        for _, _, step in self._walk(self.keyframe_offsets[-1]):
+            self.last_step = step
+
+        self._state: Snapshot | None = None
+        self._next_offset = 0
+
+    def _walk(self, offset: int):
+        """Yield (offset, kind, step) for every complete record from ``offset``."""
+        while offset + _RECORD.size <= self._records_end:
+            kind, step, length = _RECORD.unpack_from(self.buffer, offset)
+            if offset + _RECORD.size + length > self._records_end:
+                return
+            yield offset, kind, step
+            offset += _RECORD.size + length
+
+    def _arrays(self, offset: int, *dtypes) -> tuple[int, list[NDArray]]:
+        (n,) = _COUNT.unpack_from(self.buffer, offset)
+        offset += _COUNT.size
+        arrays = []
+        for dtype in dtypes:
+            arrays.append(np.frombuffer(self.buffer, dtype, n, offset))
+            offset += n * np.dtype(dtype).itemsize
+        return offset, arrays
+
+    def _load_keyframe(self, offset: int):
+        _, step, length = _RECORD.unpack_from(self.buffer, offset)
+        pos = offset + _RECORD.size
+        pos, (ids, xs, ys) = self._arrays(pos, "<u4", "<u2", "<u2")
+        pos, (noise_cells, noise_values) = self._arrays(pos, "<u4", "<f4")
+        pos, (passage_cells, passage_values) = self._arrays(pos, "<u4", "<u4")
+
+        noise = np.zeros(self.width * self.height, dtype=np.float32)
+        noise[noise_cells] = noise_values
+        passages = np.zeros(self.width * self.height, dtype=np.uint32)
+        passages[passage_cells] = passage_values
+
+        self._state = Snapshot(
+            step=step,
+            ids=ids.copy(),
+            positions=np.stack([xs, ys], axis=1).astype(np.int32),
+            noise=noise.reshape(self.width, self.height),
+            passages=passages.reshape(self.width, self.height),
+        )
+        self._next_offset = offset + _RECORD.size + length
+
+    def _apply_delta(self, offset: int):
+        state = self._state
+        _, step, length = _RECORD.unpack_from(self.buffer, offset)
+        pos = offset + _RECORD.size
+        pos, (move_ids, dx, dy) = self._arrays(pos, "<u4", "i1", "i1")
+        pos, (spawn_ids, xs, ys) = self._arrays(pos, "<u4", "<u2", "<u2")
+        pos, (exit_ids,) = self._arrays(pos, "<u4")
+        pos, (noise_cells, noise_values) = self._arrays(pos, "<u4", "<f4")
+
+        moved = np.searchsorted(state.ids, move_ids)
+        state.positions[moved, 0] += dx
+        state.positions[moved, 1] += dy
+
+        leaving = np.isin(state.ids, exit_ids)
+        ids = np.concatenate([state.ids[~leaving], spawn_ids])
+        positions = np.concatenate([state.positions[~leaving], np.stack([xs, ys], axis=1).astype(np.int32)])
+        order = np.argsort(ids)
+        state.ids = ids[order]
+        state.positions = positions[order]
+        np.add.at(state.passages, (state.positions[:, 0], state.positions[:, 1]), 1)
+
+        state.noise.ravel()[noise_cells] = noise_values
+        state.step = step
+        self._next_offset = offset + _RECORD.size + length
+
+    def _frame(self) -> ReplayFrame:
+        state = self._state
+        return ReplayFrame(state.step, state.ids.copy(), state.positions.copy(), state.noise.copy(), state.passages.copy())
+
+    def frame(self, step: int) -> ReplayFrame:
+        """
+        Reconstruct the state at ``step``.
+
+        Args:
+            step (int): Step to seek to, clamped to the recorded range.
+
+        Returns:
+            ReplayFrame: The state at that step.
+        """
+        step = min(max(step, self.keyframe_steps[0]), self.last_step)
+
+        # Carry on from the current state when seeking forward within a keyframe interval
+        i = bisect.bisect_right(self.keyframe_steps, step) - 1
+        if self._state is None or not (self.keyframe_steps[i] <= self._state.step <= step):
+            self._load_keyframe(self.keyframe_offsets[i])
+
+        for offset, kind, record_step in self._walk(self._next_offset):
+            if record_step > step:
+                break
+            if kind == KIND_DELTA:
+                self._apply_delta(offset)
+            else:
+                self._next_offset = offset + _RECORD.size + _RECORD.unpack_from(self.buffer, offset)[2]
+
+        return self._frame()
+
+    def __iter__(self):
+        for step in range(self.keyframe_steps[0], self.last_step + 1):
+            yield self.frame(step)
+
+    def close(self):
+        self.buffer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record or inspect IndoorModel replay files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record")
+    record.add_argument("floor_plan")
+    record.add_argument("output")
+    record.add_argument("--agents", type=int, default=20)
+    record.add_argument("--steps", type=int, default=100)
+    record.add_argument("--keyframe-interval", type=int, default=100)
+    info = commands.add_parser("info")
+    info.add_argument("replay")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        import main
+
+        main.load_floor_plan(args.floor_plan)
+        model = main.IndoorModel(num_agents=args.agents, width=main.w, height=main.h)
+        with ReplayWriter(args.output, model, main.attribute_grid, args.keyframe_interval) as writer:
+            for i in range(args.steps):
+                model.step()
+                writer.record()
+    else:
+        reader = ReplayReader(args.replay)
+        print(f"{reader.width}x{reader.height} grid, steps {reader.keyframe_steps[0]}-{reader.last_step}, "
+              f"{len(reader.keyframe_steps)} keyframes, {len(reader.buffer)} bytes")
@@ -0,0 +1,135 @@
+"""
+Run control for the indoor models.
+
+RunController replaces the fixed ``for i in range(100)`` loops: it steps a
+model until the step limit or one of the stop conditions is hit, and skips
+ahead in one go through stretches where nothing can happen.
+"""
+
+import time
+
+import numpy as np
+
+
+class RunController:
+    """
+    Steps a model until a stop condition is met.
+
+    Stop conditions, checked after every step:
+        - ``max_steps`` steps have been simulated
+        - the building is empty and nobody else is due to arrive
+        - passages and noise have stopped changing (``steady_window`` > 0)
+        - ``time_budget`` seconds of wall-clock time have been used
+
+    If the model has an ``advance(k)`` method, stretches in which no agent is
+    due to act (an empty building waiting for the next arrival, or every agent
+    asleep under EventActivation) are covered by one ``advance`` call instead
+    of one ``step`` per simulated step.
+
+    Args:
+        model: The model to run.
+        max_steps (int): Most steps to simulate.
+        stop_when_empty (bool): Stop once no agents are left or expected.
+        steady_window (int): Steps between steady-state checks, 0 to disable.
+        steady_tolerance (float): Largest change between two checks, in both
+            the share of passages per cell (L1) and noise (max), that still
+            counts as steady.
+        time_budget (float | None): Wall-clock seconds allowed.
+        verbose (bool): Print each step.
+    """
+
+    def __init__(self, model, max_steps=100, stop_when_empty=True, steady_window=0,
+                 steady_tolerance=1e-3, time_budget=None, verbose=False):
+        self.model = model
+        self.max_steps = max_steps
+        self.stop_when_empty = stop_when_empty
+        self.steady_window = steady_window
+        self.steady_tolerance = steady_tolerance
+        self.time_budget = time_budget
+        self.verbose = verbose
+
+        self.reason = None
+        self.steps_skipped = 0
+        self._last_check = None
+        self._next_check = None
+
+    @property
+    def steps(self) -> int:
+        return self.model.schedule.steps
+
+    def _next_arrival(self):
+        arrivals = getattr(self.model, "arrivals", None)
+        return arrivals.next_arrival(self.steps) if arrivals is not None else None
+
+    def _next_event(self):
+        """The first step at which anything can happen, or None if nothing ever will."""
+        events = [self._next_arrival()]
+        if self.model.schedule.get_agent_count():
+            events.append(getattr(self.model.schedule, "next_wake", self.steps))
+        return min((e for e in events if e is not None), default=None)
+
+    def _is_steady(self) -> bool:
+        # Lazy schedulers hold back the passages of sleeping agents
+        flush = getattr(self.model.schedule, "flush", None)
+        if flush is not None:
+            flush()
+
+        passages = np.asarray(self.model.passages, dtype=float)
+        total = passages.sum()
+        share = passages / total if total else passages
+        noise = np.array(self.model.noise, dtype=float)
+
+        last, self._last_check = self._last_check, (share, noise)
+        if last is None:
+            return False
+        return (np.abs(share - last[0]).sum() <= self.steady_tolerance
+                and np.abs(noise - last[1]).max(initial=0.0) <= self.steady_tolerance)
+
+    def run(self) -> str:
+        """
+        Run the model.
+
+        Returns:
+            str: Why the run stopped; also kept in ``reason``.
+        """
+        started = time.perf_counter()
+        coarse = hasattr(self.model, "advance")
+        # Due step of the next steady-state check; an advance may jump past it
+        self._next_check = self.steps + self.steady_window
+
+        while True:
+            if self.steps >= self.max_steps:
+                self.reason = "max_steps"
+                break
+
+            next_event = self._next_event()
+            if next_event is None and self.stop_when_empty:
+                self.reason = "empty"
+                break
+
+            # Nothing is due for a while, jump straight to the next event
+            if coarse:
+                skip = (self.max_steps if next_event is None else min(next_event, self.max_steps)) - self.steps
+                if skip > 0:
+                    self.model.advance(skip)
+                    self.steps_skipped += skip
+                    continue
+
+            if self.verbose:
+                print(f"Step {self.steps + 1}")
+            self.model.step()
+
+            if self.steady_window and self.steps >= self._next_check:
+                self._next_check = self.steps + self.steady_window
+                if self._is_steady():
+                    self.reason = "steady"
+                    break
+
+            if self.time_budget is not None and time.perf_counter() - started > self.time_budget:
+                self.reason = "time_budget"
+                break
+
+        flush = getattr(self.model.schedule, "flush", None)
+        if flush is not None:
+            flush()
+        return self.reason
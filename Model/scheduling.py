@@ -0,0 +1,124 @@
+"""
+Event-driven activation for IndoorModel.
+
+RandomActivation steps every agent on every tick, even a student who is just
+sitting at a study table waiting for their focus to run out. EventActivation
+keeps the agents on a priority queue keyed by the next step at which they
+have something to do and only steps the ones that are due, so the cost of a
+step follows the number of busy agents rather than the population.
+
+Agents opt in with two methods:
+
+    idle_steps()       how many upcoming steps the agent can sleep through
+    catch_up(skipped)  apply the bookkeeping of the steps it slept through
+
+Agents without them are stepped every tick. Anything that changes a sleeping
+agent from outside must call ``wake`` so its schedule is recomputed.
+"""
+
+import heapq
+import itertools
+
+from mesa.time import BaseScheduler
+
+
+class EventActivation(BaseScheduler):
+    """
+    A scheduler that only activates agents whose next event is due, in a
+    random order each step.
+    """
+
+    def __init__(self, model, agents=None):
+        super().__init__(model, agents)
+        self._queue = []
+        self._entry = {}      # agent -> (wake step, sequence) of its live queue entry
+        self._last = {}       # agent -> last step it was brought up to date
+        self._sequence = itertools.count()
+
+        for agent in self._agents:
+            self._track(agent)
+
+    def _track(self, agent):
+        self._last[agent] = self.steps - 1
+        self._push(agent, self.steps)
+
+    def _push(self, agent, step):
+        entry = (step, next(self._sequence))
+        self._entry[agent] = entry
+        heapq.heappush(self._queue, (*entry, agent))
+
+    def add(self, agent):
+        super().add(agent)
+        self._track(agent)
+
+    def remove(self, agent):
+        super().remove(agent)
+        self._entry.pop(agent, None)
+        self._last.pop(agent, None)
+
+    def wake(self, agent, step=None):
+        """
+        Bring an agent's next activation forward.
+
+        Args:
+            agent: A scheduled agent.
+            step (int | None): Step to wake at, defaults to the next one.
+        """
+        if agent not in self._entry:
+            return
+
+        step = self.steps + 1 if step is None else step
+        if step < self._entry[agent][0]:
+            self._push(agent, step)
+
+    def _bring_up_to_date(self, agent, step):
+        skipped = step - self._last[agent] - 1
+        if skipped > 0:
+            catch_up = getattr(agent, "catch_up", None)
+            if catch_up is not None:
+                catch_up(skipped)
+        self._last[agent] = step
+
+    def step(self):
+        """Execute the step of every agent that is due, in random order."""
+        due = []
+        while self._queue and self._queue[0][0] <= self.steps:
+            step, sequence, agent = heapq.heappop(self._queue)
+            if self._entry.get(agent) == (step, sequence):
+                due.append(agent)
+        self.model.random.shuffle(due)
+
+        for agent in due:
+            # An agent earlier in the order may have removed this one
+            if agent not in self._entry:
+                continue
+
+            self._bring_up_to_date(agent, self.steps)
+            agent.step()
+
+            if agent in self._entry:
+                idle_steps = getattr(agent, "idle_steps", None)
+                self._push(agent, self.steps + 1 + (idle_steps() if idle_steps is not None else 0))
+
+        self.steps += 1
+        self.time += 1
+
+    def flush(self):
+        """
+        Apply the pending bookkeeping of every sleeping agent, e.g. before
+        reading ``passages`` at the end of a run.
+        """
+        for agent in list(self._last):
+            self._bring_up_to_date(agent, self.steps)
+            self._last[agent] = self.steps - 1
+
+    @property
+    def next_wake(self):
+        """The earliest step at which any agent is due, or None if none are."""
+        while self._queue and self._entry.get(self._queue[0][2]) != self._queue[0][:2]:
+            heapq.heappop(self._queue)
+        return self._queue[0][0] if self._queue else None
+
+    def get_active_count(self):
+        """Number of agents due on the next step."""
+        return sum(1 for entry in self._entry.values() if entry[0] <= self.steps)
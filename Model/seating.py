@@ -0,0 +1,82 @@
+"""
+Seat allocation at study tables and chairs.
+
+SeatAllocator keeps a grid of free seats per cell. Agents that spot a target
+during the step file a claim on it; at the end of the step all claims are
+resolved together: each cell hands out its free seats to its claimants in a
+random order, and the rest are turned away to look for another target. A
+granted seat stays held, so nobody else heads for it, until the agent leaves
+for an exit or is removed.
+"""
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+class SeatAllocator:
+    """
+    Free-capacity grid with batched claim resolution.
+
+    Agents taking part need ``seat_granted(cell)`` and ``seat_denied(cell)``
+    methods, called from ``resolve``.
+
+    Args:
+        capacity (NDArray): Seats per cell, 0 for cells without seats.
+        rng (np.random.Generator): Source of the claim priorities.
+    """
+
+    def __init__(self, capacity: NDArray, rng: np.random.Generator):
+        self.capacity = np.asarray(capacity, dtype=np.int32)
+        self.free = self.capacity.copy()
+        self.rng = rng
+
+        self.held = {}  # unique_id -> cell
+        self._agents = []
+        self._cells = []
+
+        self.granted = 0
+        self.denied = 0
+
+    def is_free(self, cell) -> bool:
+        """Whether ``cell`` has a seat nobody holds."""
+        return self.free[cell] > 0
+
+    def claim(self, agent, cell):
+        """File a claim for a seat at ``cell``, decided at the next ``resolve``."""
+        self._agents.append(agent)
+        self._cells.append(cell)
+
+    def resolve(self):
+        """Grant this step's claims, in random order within each cell, up to the free seats."""
+        if not self._agents:
+            return
+        agents, self._agents = self._agents, []
+        cells = np.array(self._cells, dtype=np.intp)
+        self._cells = []
+
+        flat = np.ravel_multi_index((cells[:, 0], cells[:, 1]), self.free.shape)
+        order = np.lexsort((self.rng.random(len(agents)), flat))
+        flat = flat[order]
+
+        # Rank of each claim within its cell, and whether a seat is left for it
+        first = np.flatnonzero(np.r_[True, flat[1:] != flat[:-1]])
+        rank = np.arange(len(flat)) - np.repeat(first, np.diff(np.r_[first, len(flat)]))
+        granted = rank < self.free.ravel()[flat]
+        np.subtract.at(self.free.ravel(), flat[granted], 1)
+
+        for i, ok in zip(order, granted):
+            agent, cell = agents[i], tuple(cells[i])
+            if ok:
+                self.release(agent)
+                self.held[agent.unique_id] = cell
+                agent.seat_granted(cell)
+                self.granted += 1
+            else:
+                agent.seat_denied(cell)
+                self.denied += 1
+
+    def release(self, agent):
+        """Give back the seat ``agent`` holds, if any."""
+        cell = self.held.pop(agent.unique_id, None)
+        if cell is not None:
+            self.free[cell] += 1
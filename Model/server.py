@@ -0,0 +1,133 @@
+"""
+Live simulation server.
+
+Runs an IndoorModel in a background thread and streams binary frames (see
+frames.py) to every WebSocket client. The GridConfig app connects to it and
+draws the agents, noise and passages on top of its grid.
+
+The simulation never waits for the UI: each client has a small queue of
+frames, and a client that falls behind has its backlog dropped and is
+resynchronised with a keyframe.
+
+Usage:
+    python server.py floor_plan.json [--agents N] [--port 8765] [--rate 30]
+"""
+
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import websockets
+
+import main
+from frames import FrameEncoder
+
+
+class _Client:
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue(queue_size)
+        self.needs_keyframe = True
+
+
+class SimulationServer:
+    """
+    Steps a model and broadcasts the resulting frames.
+
+    Args:
+        model: The model to run.
+        steps (int | None): Stop after this many steps; run forever if None.
+        rate (float): Maximum steps per second, 0 for as fast as possible.
+        queue_size (int): Frames buffered per client before it is resynced.
+        noise_epsilon (float): Smallest noise change sent to clients.
+    """
+
+    def __init__(self, model, steps=None, rate=30.0, queue_size=8, noise_epsilon=1e-3):
+        self.model = model
+        self.steps = steps
+        self.rate = rate
+        self.queue_size = queue_size
+        self.encoder = FrameEncoder(model, noise_epsilon)
+        self.clients: set[_Client] = set()
+        self.finished = False
+
+    def _advance(self, need_keyframe: bool) -> tuple[bytes, bytes | None]:
+        """Run one step and encode it. Called on the simulation thread."""
+        self.model.step()
+        delta = self.encoder.delta()
+        return delta, self.encoder.keyframe() if need_keyframe else None
+
+    def _broadcast(self, delta: bytes, keyframe: bytes | None):
+        for client in self.clients:
+            if client.needs_keyframe:
+                if keyframe is None:
+                    continue
+                frame = keyframe
+                client.needs_keyframe = False
+            else:
+                frame = delta
+
+            try:
+                client.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Too slow to keep up, drop the backlog and start over from a keyframe
+                while not client.queue.empty():
+                    client.queue.get_nowait()
+                client.needs_keyframe = True
+
+    async def handler(self, websocket):
+        """Send frames to one connected client until it disconnects."""
+        client = _Client(self.queue_size)
+        if self.finished:
+            client.queue.put_nowait(self.encoder.keyframe())
+            client.needs_keyframe = False
+        self.clients.add(client)
+        try:
+            while True:
+                await websocket.send(await client.queue.get())
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.clients.discard(client)
+
+    async def simulate(self):
+        """Step the model until ``steps`` is reached."""
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            while self.steps is None or self.model.schedule.steps < self.steps:
+                started = loop.time()
+                need_keyframe = any(client.needs_keyframe for client in self.clients)
+                delta, keyframe = await loop.run_in_executor(executor, self._advance, need_keyframe)
+                self._broadcast(delta, keyframe)
+
+                delay = 1 / self.rate - (loop.time() - started) if self.rate > 0 else 0
+                await asyncio.sleep(max(delay, 0))
+
+        self.finished = True
+
+    async def serve(self, host: str, port: int):
+        """Serve clients while the simulation runs, then keep serving the final state."""
+        async with websockets.serve(self.handler, host, port):
+            print(f"Streaming simulation on ws://{host}:{port}")
+            await self.simulate()
+            print(f"Simulation finished after {self.model.schedule.steps} steps")
+            await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream an IndoorModel run over WebSocket.")
+    parser.add_argument("floor_plan", help="GridConfig JSON export")
+    parser.add_argument("--agents", type=int, default=20)
+    parser.add_argument("--steps", type=int, default=None)
+    parser.add_argument("--rate", type=float, default=30.0, help="steps per second, 0 for unthrottled")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    main.load_floor_plan(args.floor_plan)
+    model = main.IndoorModel(num_agents=args.agents, width=main.w, height=main.h)
+    server = SimulationServer(model, steps=args.steps, rate=args.rate)
+
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,163 @@
+"""
+Uniform spatial hash for neighbour queries over points in the plane.
+
+The area is cut into square buckets as wide as the largest query radius, so
+every neighbour of a point lies in the 3 x 3 buckets around its own. Each
+rebuild sorts the points by bucket with a counting sort: a histogram of the
+bucket ids, its prefix sum as the start of each bucket, and one scatter pass
+that writes every point to the next free slot of its bucket. The points of a
+bucket are then one contiguous slice of ``order``.
+
+Queries are answered for all points at once. The candidate pairs of the nine
+surrounding buckets are expanded with array arithmetic, filtered by distance
+and handed out in batches of bounded size, so the memory stays flat however
+crowded the buckets get.
+
+The scatter pass is compiled with numba when it is installed; otherwise a
+stable argsort yields the same order.
+
+Usage:
+    python spatialhash.py [--points N] [--size S] [--radius R]
+"""
+
+import argparse
+
+import numpy as np
+from numpy.typing import NDArray
+
+from kernels import HAS_NUMBA, _jit
+
+# Offsets of the 3 x 3 buckets searched around a point's own bucket
+_NEIGHBOURHOOD = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=np.int64)
+
+
+@_jit
+def _scatter(buckets, starts):
+    order = np.empty(buckets.size, dtype=np.int64)
+    fill = starts[:-1].copy()
+    for i in range(buckets.size):
+        order[fill[buckets[i]]] = i
+        fill[buckets[i]] += 1
+    return order
+
+
+def counting_sort(buckets: NDArray, count: int) -> tuple[NDArray, NDArray]:
+    """
+    Order items by bucket, keeping the original order within a bucket.
+
+    Args:
+        buckets (NDArray): Bucket id of every item, 0 <= id < ``count``.
+        count (int): Number of buckets.
+
+    Returns:
+        tuple: ``order``, the item indices grouped by bucket, and ``starts``,
+        where bucket ``b`` is ``order[starts[b]:starts[b + 1]]``.
+    """
+    starts = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(buckets, minlength=count), out=starts[1:])
+    if HAS_NUMBA:
+        order = _scatter(buckets, starts)
+    else:
+        order = np.argsort(buckets, kind="stable")
+    return order, starts
+
+
+class SpatialHash:
+    """
+    Buckets of points over a ``width`` x ``height`` area.
+
+    Args:
+        width (float): Extent along the first coordinate.
+        height (float): Extent along the second coordinate.
+        cell_size (float): Bucket side; at least the largest query radius.
+    """
+
+    def __init__(self, width, height, cell_size):
+        self.cell_size = float(cell_size)
+        self.columns = max(1, int(np.ceil(width / self.cell_size)))
+        self.rows = max(1, int(np.ceil(height / self.cell_size)))
+        self.positions = np.zeros((0, 2))
+        self.cells = np.zeros((0, 2), dtype=np.int64)
+        self.order = np.zeros(0, dtype=np.int64)
+        self.starts = np.zeros(self.columns * self.rows + 1, dtype=np.int64)
+
+    def rebuild(self, positions: NDArray):
+        """Bucket ``positions``, an (n, 2) array, for the following queries."""
+        self.positions = np.asarray(positions, dtype=np.float64)
+        cells = np.floor(self.positions / self.cell_size).astype(np.int64)
+        cells[:, 0] = np.clip(cells[:, 0], 0, self.columns - 1)
+        cells[:, 1] = np.clip(cells[:, 1], 0, self.rows - 1)
+        self.cells = cells
+        self.order, self.starts = counting_sort(cells[:, 0] * self.rows + cells[:, 1], self.columns * self.rows)
+
+    def pairs(self, radius: float, batch: int = 1 << 20):
+        """
+        Yield every ordered pair of distinct points closer than ``radius``.
+
+        Args:
+            radius (float): Query radius, at most ``cell_size``.
+            batch (int): Rough upper bound on candidate pairs per batch.
+
+        Yields:
+            tuple: Arrays ``i``, ``j``, ``delta`` (position of ``j`` minus
+            that of ``i``, shape (k, 2)) and ``distance``, one entry per pair.
+        """
+        if radius > self.cell_size:
+            raise ValueError(f"radius {radius} exceeds the bucket size {self.cell_size}")
+        n = len(self.positions)
+        if n == 0:
+            return
+
+        # Bucket of each of the nine neighbourhoods of every point, -1 off the area
+        around = self.cells[:, None, :] + _NEIGHBOURHOOD[None, :, :]
+        inside = ((around[..., 0] >= 0) & (around[..., 0] < self.columns)
+                  & (around[..., 1] >= 0) & (around[..., 1] < self.rows))
+        bucket = np.where(inside, around[..., 0] * self.rows + around[..., 1], 0)
+        first = np.where(inside, self.starts[bucket], 0)
+        sizes = np.where(inside, self.starts[bucket + 1] - self.starts[bucket], 0)
+
+        # Whole points per batch, so every batch is self-contained
+        candidates = sizes.sum(axis=1)
+        ends = np.searchsorted(np.cumsum(candidates), np.arange(1, candidates.sum() // batch + 2) * batch)
+        bounds = np.unique(np.concatenate([[0], np.minimum(ends + 1, n), [n]]))
+
+        radius2 = radius * radius
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            lengths = sizes[lo:hi].ravel()
+            total = int(lengths.sum())
+            if total == 0:
+                continue
+            # Expand every (point, bucket) range into one candidate per point in it
+            i = np.repeat(np.repeat(np.arange(lo, hi), len(_NEIGHBOURHOOD)), lengths)
+            offset = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            j = self.order[np.repeat(first[lo:hi].ravel(), lengths) + offset]
+
+            delta = self.positions[j] - self.positions[i]
+            distance2 = np.einsum("ij,ij->i", delta, delta)
+            keep = (distance2 < radius2) & (i != j)
+            yield i[keep], j[keep], delta[keep], np.sqrt(distance2[keep])
+
+
+if __name__ == "__main__":
+    import time
+
+    parser = argparse.ArgumentParser(description="Check and time the spatial hash against brute force.")
+    parser.add_argument("--points", type=int, default=5000)
+    parser.add_argument("--size", type=float, default=200.0)
+    parser.add_argument("--radius", type=float, default=5.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    points = rng.random((args.points, 2)) * args.size
+    grid = SpatialHash(args.size, args.size, args.radius)
+    grid.rebuild(points)
+    started = time.perf_counter()
+    grid.rebuild(points)
+    found = sum(len(i) for i, _, _, _ in grid.pairs(args.radius))
+    elapsed = time.perf_counter() - started
+
+    sample = points[:500]
+    distance = np.linalg.norm(sample[:, None, :] - points[None, :, :], axis=2)
+    expected = int(((distance < args.radius).sum(axis=1) - 1).sum())
+    sampled = sum(int((i < 500).sum()) for i, _, _, _ in grid.pairs(args.radius))
+    print(f"{found} pairs in {elapsed * 1e3:.1f} ms; first 500 points {'match' if sampled == expected else 'DIFFER'}")
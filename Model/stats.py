@@ -0,0 +1,293 @@
+"""
+Streaming statistics over sweep results.
+
+A sweep feeds each finished run's arrays (the passages heatmap, focus
+metrics, ...) into a SweepAggregator instead of keeping them. The aggregator
+holds, per cell:
+
+    RunningStats    count, mean and variance by Welford's method
+    QuantileSketch  counts in logarithmic buckets for approximate quantiles,
+                    only when asked for, as it keeps one count per bucket
+
+Both merge exactly, so every worker process can aggregate its own runs and
+the results are combined at the end, and ``summary`` can be read at any time
+while the sweep is still running.
+
+Usage:
+    python stats.py merge worker0.npz worker1.npz ... [--output merged.npz]
+"""
+
+import argparse
+import math
+import os
+
+import numpy as np
+
+
+class RunningStats:
+    """
+    Running per-cell mean and variance.
+
+    Args:
+        shape (tuple): Shape of one sample, () for scalars.
+    """
+
+    def __init__(self, shape=()):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+
+    def update(self, sample):
+        """Add one sample."""
+        self.update_batch(np.asarray(sample, dtype=float)[np.newaxis])
+
+    def update_batch(self, samples):
+        """Add several samples stacked along the first axis."""
+        samples = np.asarray(samples, dtype=float)
+        batch = RunningStats(samples.shape[1:])
+        batch.count = len(samples)
+        batch.mean = samples.mean(axis=0)
+        batch._m2 = ((samples - batch.mean) ** 2).sum(axis=0)
+        self.merge(batch)
+
+    def merge(self, other: "RunningStats"):
+        """Fold in the samples summarized by ``other`` (Chan et al.)."""
+        if other.count == 0:
+            return
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / n
+        self._m2 = self._m2 + other._m2 + delta ** 2 * self.count * other.count / n
+        self.count = n
+
+    @property
+    def variance(self):
+        """Sample variance, zero until there are two samples."""
+        if self.count < 2:
+            return np.zeros_like(self._m2)
+        return self._m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+
+class QuantileSketch:
+    """
+    Per-cell approximate quantiles with a bounded relative error.
+
+    Values are counted in buckets whose bounds grow geometrically, as in
+    DDSketch, so any quantile is returned within ``relative_accuracy`` of a
+    true sample value. Magnitudes below ``min_value`` share one zero bucket
+    and magnitudes above ``max_value`` are clamped into the last bucket.
+    Negative values get their own mirrored buckets when ``signed`` is set and
+    fall into the zero bucket otherwise.
+
+    Args:
+        shape (tuple): Shape of one sample.
+        relative_accuracy (float): Error bound on returned quantiles.
+        min_value (float): Smallest magnitude told apart from zero.
+        max_value (float): Largest magnitude tracked.
+        signed (bool): Track negative values.
+    """
+
+    def __init__(self, shape=(), relative_accuracy=0.05, min_value=1.0, max_value=1e6, signed=False):
+        self.shape = tuple(shape)
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self.signed = signed
+
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.buckets = math.ceil(math.log(max_value / min_value, self.gamma)) + 1
+
+        # Layout along the first axis: negative buckets (largest magnitude
+        # first) when signed, the zero bucket, then positive buckets
+        self.zero = self.buckets if signed else 0
+        self.counts = np.zeros((self.zero + 1 + self.buckets, *self.shape), dtype=np.uint32)
+        self.count = 0
+
+    def _bucket(self, values):
+        magnitude = np.clip(np.abs(values), self.min_value, self.max_value)
+        index = np.ceil(np.log(magnitude / self.min_value) / math.log(self.gamma)).astype(np.int64)
+        index = np.minimum(index, self.buckets - 1)
+
+        bucket = np.full(values.shape, self.zero, dtype=np.int64)
+        positive = values >= self.min_value
+        bucket[positive] = self.zero + 1 + index[positive]
+        if self.signed:
+            negative = values <= -self.min_value
+            bucket[negative] = self.zero - 1 - index[negative]
+        return bucket
+
+    def _value(self, bucket):
+        offset = np.abs(bucket - self.zero) - 1
+        value = self.min_value * 2 * self.gamma ** offset / (self.gamma + 1)
+        value = np.where(bucket == self.zero, 0.0, value)
+        return np.where(bucket < self.zero, -value, value)
+
+    def update(self, sample):
+        """Add one sample."""
+        sample = np.asarray(sample, dtype=float).reshape(self.shape)
+        bucket = self._bucket(sample).reshape(-1)
+        flat = self.counts.reshape(len(self.counts), -1)
+        flat[bucket, np.arange(flat.shape[1])] += 1
+        self.count += 1
+
+    def merge(self, other: "QuantileSketch"):
+        """Fold in the samples counted by ``other``; both must share a configuration."""
+        if self.counts.shape != other.counts.shape or self.gamma != other.gamma or self.min_value != other.min_value:
+            raise ValueError("can only merge sketches with the same configuration")
+        self.counts += other.counts
+        self.count += other.count
+
+    def copy(self) -> "QuantileSketch":
+        """An independent sketch with the same configuration and counts."""
+        sketch = QuantileSketch(self.shape, self.relative_accuracy, self.min_value, self.max_value, self.signed)
+        sketch.counts = self.counts.copy()
+        sketch.count = self.count
+        return sketch
+
+    def quantile(self, q):
+        """
+        Approximate ``q``-quantile per cell.
+
+        Args:
+            q (float): Between 0 and 1.
+
+        Returns:
+            NDArray: Array of the sample shape.
+        """
+        if self.count == 0:
+            return np.full(self.shape, np.nan)
+        rank = q * (self.count - 1)
+        cumulative = np.cumsum(self.counts, axis=0)
+        return self._value(np.argmax(cumulative > rank, axis=0))
+
+
+class SweepAggregator:
+    """
+    Summaries of named per-run metrics over a sweep.
+
+    Args:
+        quantiles (tuple): Quantiles reported by ``summary``.
+        sketch (dict | None): Keyword arguments for a QuantileSketch per
+            metric, ``{}`` for the defaults; None, the default, skips
+            quantiles. A sketch keeps a uint32 count per bucket and cell:
+            141 buckets, about 560 bytes a cell, at the default 5% accuracy
+            over 1..1e6, and 37 at ``relative_accuracy=0.2``.
+    """
+
+    def __init__(self, quantiles=(0.05, 0.5, 0.95), sketch=None):
+        self.quantiles = tuple(quantiles)
+        self.sketch = sketch
+        self.runs = 0
+        self.stats: dict[str, RunningStats] = {}
+        self.sketches: dict[str, QuantileSketch] = {}
+
+    def add(self, **metrics):
+        """
+        Record one finished run.
+
+        Args:
+            **metrics: Arrays or scalars by name, e.g. ``passages=model.passages``.
+        """
+        for name, value in metrics.items():
+            value = np.asarray(value, dtype=float)
+            if name not in self.stats:
+                self.stats[name] = RunningStats(value.shape)
+                if self.sketch is not None:
+                    self.sketches[name] = QuantileSketch(value.shape, **self.sketch)
+            self.stats[name].update(value)
+            if name in self.sketches:
+                self.sketches[name].update(value)
+        self.runs += 1
+
+    def merge(self, other: "SweepAggregator"):
+        """Fold in the runs recorded by another aggregator, e.g. from a worker process."""
+        for name, stats in other.stats.items():
+            self.stats.setdefault(name, RunningStats(stats.mean.shape)).merge(stats)
+        for name, sketch in other.sketches.items():
+            if name in self.sketches:
+                self.sketches[name].merge(sketch)
+            else:
+                self.sketches[name] = sketch.copy()
+        self.runs += other.runs
+
+    def summary(self) -> dict:
+        """
+        The current summaries, keyed ``<metric>_mean``, ``<metric>_variance``
+        and ``<metric>_q<percent>``.
+        """
+        summary = {}
+        for name, stats in self.stats.items():
+            summary[f"{name}_count"] = np.asarray(stats.count)
+            summary[f"{name}_mean"] = stats.mean
+            summary[f"{name}_variance"] = stats.variance
+            if name in self.sketches:
+                for q in self.quantiles:
+                    summary[f"{name}_q{q * 100:g}"] = self.sketches[name].quantile(q)
+        return summary
+
+    def save(self, path):
+        """
+        Write the aggregator state so another process can merge or read it.
+        The file is replaced atomically, so readers never see a partial write.
+        """
+        arrays = {"runs": np.asarray(self.runs)}
+        for name, stats in self.stats.items():
+            arrays[f"stats/{name}/count"] = np.asarray(stats.count)
+            arrays[f"stats/{name}/mean"] = stats.mean
+            arrays[f"stats/{name}/m2"] = stats._m2
+        for name, sketch in self.sketches.items():
+            arrays[f"sketch/{name}/counts"] = sketch.counts
+            arrays[f"sketch/{name}/count"] = np.asarray(sketch.count)
+            arrays[f"sketch/{name}/config"] = np.array(
+                [sketch.relative_accuracy, sketch.min_value, sketch.max_value, sketch.signed])
+
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path, quantiles=(0.05, 0.5, 0.95)) -> "SweepAggregator":
+        """Read an aggregator written by ``save``."""
+        aggregator = cls(quantiles)
+        with np.load(path) as data:
+            aggregator.runs = int(data["runs"])
+            for key in data.files:
+                kind, _, rest = key.partition("/")
+                name, _, field = rest.rpartition("/")
+                if kind == "stats" and field == "count":
+                    stats = RunningStats(data[f"stats/{name}/mean"].shape)
+                    stats.count = int(data[key])
+                    stats.mean = data[f"stats/{name}/mean"]
+                    stats._m2 = data[f"stats/{name}/m2"]
+                    aggregator.stats[name] = stats
+                elif kind == "sketch" and field == "counts":
+                    accuracy, min_value, max_value, signed = data[f"sketch/{name}/config"]
+                    sketch = QuantileSketch(data[key].shape[1:], accuracy, min_value, max_value, bool(signed))
+                    sketch.counts = data[key].copy()
+                    sketch.count = int(data[f"sketch/{name}/count"])
+                    aggregator.sketches[name] = sketch
+        return aggregator
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge sweep aggregates written by SweepAggregator.save.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    merge = commands.add_parser("merge")
+    merge.add_argument("inputs", nargs="+")
+    merge.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    merged = SweepAggregator()
+    for path in args.inputs:
+        merged.merge(SweepAggregator.load(path))
+
+    print(f"{merged.runs} runs")
+    for name, stats in merged.stats.items():
+        print(f"{name}: mean {stats.mean.mean():.3f}, std {stats.std.mean():.3f} (averaged over cells)")
+    if args.output:
+        merged.save(args.output)
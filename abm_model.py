@@ -7,34 +7,33 @@ w = 10
 h = 10
 attribute_grid = np.zeros((w, h))
 
+# cell codes as in Model/cells.py
 # 0 is open space
-# 1 is wall
-# 2 is social space
-# 3 is work space
-# 4 is both
+# 3 is wall
+# 4 is work space (study table)
+# 5 is social space (chair)
 attribute_grid = np.array([
-    [0, 0, 0, 0, 0, 1, 3, 3, 3, 3],
-    [0, 3, 3, 3, 0, 1, 3, 0, 0, 3],
-    [0, 3, 3, 3, 0, 1, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 1, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 1, 0, 0, 0, 0],
+    [0, 0, 0, 0, 0, 3, 4, 4, 4, 4],
+    [0, 4, 4, 4, 0, 3, 4, 0, 0, 4],
+    [0, 4, 4, 4, 0, 3, 0, 0, 0, 0],
+    [0, 0, 0, 0, 0, 3, 0, 0, 0, 0],
+    [0, 0, 0, 0, 0, 3, 0, 0, 0, 0],
     [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
     [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 2, 2, 2, 2, 0, 0, 0],
-    [0, 0, 0, 2, 2, 2, 2, 0, 0, 0],
+    [0, 0, 0, 5, 5, 5, 5, 0, 0, 0],
+    [0, 0, 0, 5, 5, 5, 5, 0, 0, 0],
     [0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-])
+], dtype=np.uint8)
 
 # spawn points for agents to start (entrances)
 spawn_points = [(9, 0), (9, 9)]
 
 # should be adjusted based off of what different features are labeled as
 attributes = {
-    'wall': 1,
+    'wall': 3,
     'open': 0,
-    'social': 2,
-    'work': 3,
-    'both': 4
+    'social': 5,
+    'work': 4
 }
 
 